@@ -0,0 +1,101 @@
+"""同期/非同期DBモードの同時リクエストスループット比較
+
+一時的なSQLiteファイルにタスクを投入し、DB_MODE=sync と DB_MODE=async の
+それぞれでアプリを起動して、同時実行数を指定した GET /tasks/{id} を計測します。
+DB_MODE はインポート時に読み込まれるため、モードごとに子プロセスで計測します。
+
+注意: 同期モードではコネクションプール（既定 5+10）を超える同時実行数にすると、
+プール待ちがイベントループ自体を止めてしまい、セッションの解放処理が進まず
+タイムアウトまで停止します。これ自体が同期モードの問題点のため、
+既定の同時実行数はプールサイズ以下にしています。
+
+実行方法:
+    python benchmarks/bench_async_db.py --requests 2000 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+app_dir = os.path.join(os.path.dirname(__file__),"..")
+sys.path.append(app_dir)
+
+
+def seed(url :str,tasks :int):
+    """ベンチマーク用のユーザーとタスクを投入"""
+    from sqlalchemy import create_engine,insert
+    from models import Base,Item,User
+
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User),[{"id":1,"username":"bench","password":"x","salt":"x"}])
+        conn.execute(insert(Item),[
+            {"title":f"task{i}","content":"bench","completed":False,"user_id":1}
+            for i in range(tasks)
+        ])
+    engine.dispose()
+
+
+async def drive(total :int,concurrency :int,tasks :int):
+    """子プロセス側: アプリに対して同時リクエストを送り、秒間リクエスト数を返す"""
+    import httpx
+    from main import app
+    from cruds.auth import get_current_user
+    from schemas import DecodedToken
+    from database import async_engine
+
+    app.dependency_overrides[get_current_user] = lambda: DecodedToken(username="bench",user_id=1)
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i % tasks + 1)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),base_url="http://bench") as client:
+        async def worker():
+            while not queue.empty():
+                id = queue.get_nowait()
+                response = await client.get(f"/tasks/{id}")
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    if async_engine is not None:
+        await async_engine.dispose()
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests",type=int,default=2000)
+    parser.add_argument("--concurrency",type=int,default=10)
+    parser.add_argument("--tasks",type=int,default=1000)
+    parser.add_argument("--child",action="store_true",help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        rps = asyncio.run(drive(args.requests,args.concurrency,args.tasks))
+        print(json.dumps({"rps":rps}))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp,'bench.db')}"
+        seed(url,args.tasks)
+        for mode in ("sync","async"):
+            env = dict(os.environ,DATABASE_URL=url,DB_MODE=mode,FASTAPI_SECRET_KEY="bench")
+            out = subprocess.run(
+                [sys.executable,__file__,"--child",
+                 "--requests",str(args.requests),"--concurrency",str(args.concurrency),"--tasks",str(args.tasks)],
+                env=env,capture_output=True,text=True,check=True
+            )
+            rps = json.loads(out.stdout.strip().splitlines()[-1])["rps"]
+            print(f"DB_MODE={mode:<5} concurrency={args.concurrency:<4} {rps:10.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""パスワードハッシュのスレッドプール実行のベンチマーク
+
+同時ログイン中に GET /tasks/{id} を送り続け、次の2つを比較します。
+- inline: ハッシュ計算をその場で実行（イベントループをブロック）
+- offload: ハッシュ計算を専用スレッドプールで実行
+
+ログインのスループット（件/秒）と、同時に流した /tasks リクエストのレイテンシを出力します。
+
+実行方法:
+    python benchmarks/bench_password_hash.py --logins 40 --concurrency 8 --iterations 600000
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+app_dir = os.path.join(os.path.dirname(__file__),"..")
+sys.path.append(app_dir)
+
+
+async def run(logins :int,concurrency :int):
+    """ログインと /tasks の同時実行を計測"""
+    import httpx
+    from main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),base_url="http://bench") as client:
+        done = asyncio.Event()
+        latencies = []
+
+        async def login_worker(count :int):
+            for _ in range(count):
+                response = await client.post("/auth/login",data={"username":"bench","password":"bench1234"})
+                response.raise_for_status()
+
+        async def tasks_probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                response = await client.get("/tasks/1")
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0)
+
+        probe = asyncio.create_task(tasks_probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login_worker(logins // concurrency) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe
+    return (logins // concurrency * concurrency) / elapsed,latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins",type=int,default=40)
+    parser.add_argument("--concurrency",type=int,default=8)
+    parser.add_argument("--iterations",type=int,default=600000)
+    parser.add_argument("--workers",type=int,default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp,'bench.db')}"
+        os.environ["DATABASE_URL"] = url
+        os.environ["DB_MODE"] = "sync"
+        os.environ.setdefault("FASTAPI_SECRET_KEY","bench")
+
+        from sqlalchemy import create_engine,insert
+        from models import Base,Item,User
+        from cruds import auth as auth_cruds
+        from schemas import DecodedToken
+        from main import app
+
+        auth_cruds.PASSWORD_HASH_ITERATIONS = args.iterations
+        engine = create_engine(url)
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            salt = "YmVuY2g="
+            conn.execute(insert(User),[{"id":1,"username":"bench","password":auth_cruds.hash_password("bench1234",salt),"salt":salt}])
+            conn.execute(insert(Item),[{"title":"task","content":"bench","completed":False,"user_id":1}])
+        engine.dispose()
+        app.dependency_overrides[auth_cruds.get_current_user] = lambda: DecodedToken(username="bench",user_id=1)
+
+        for mode in ("inline","offload"):
+            auth_cruds._hash_executor = ThreadPoolExecutor(max_workers=args.workers) if mode == "offload" else None
+            rps,latencies = asyncio.run(run(args.logins,args.concurrency))
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+            print(f"{mode:<8} login {rps:7.1f}/s  /tasks during logins: n={len(latencies):<5} "
+                  f"p50={statistics.median(latencies):8.1f}ms p95={p95:8.1f}ms max={latencies[-1]:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""全文検索（FTS5）と部分一致検索（LIKE）のベンチマーク
+
+一時ファイルのSQLiteにランダムな単語からなるタスクを投入し、同じ単語の検索1回あたりの時間を比較します。
+
+- like_all: tasks 全体を走査する LIKE '%q%'（インデックスを使わない素朴な検索）
+- like_user: cruds.task.find_filtered(q=...)（(user_id, ...) のインデックスでユーザーの行のみ走査）
+- fts: cruds.task.search（tasks_fts の索引で検索し、一致した行のみ主キーで読み込む）
+- fts_prefix: cruds.task.search の前方一致（先頭3文字 + *）
+
+実行方法:
+    python benchmarks/bench_search.py --tasks 1000000 --users 100
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+app_dir = os.path.join(os.path.dirname(__file__),"..")
+sys.path.append(app_dir)
+
+from sqlalchemy import create_engine,insert,text
+from sqlalchemy.orm import Session
+from models import Base,Item,User
+from cruds import task as task_cruds
+
+
+def make_words(count :int,rng :random.Random):
+    """検索対象のランダムな単語（英小文字6〜10文字）を作成"""
+    return ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz",k=rng.randint(6,10))) for _ in range(count)]
+
+
+def populate(engine,tasks :int,users :int,words :list[str],rng :random.Random):
+    """usersユーザーにtasks件のタスクを均等に投入（トリガーで全文検索の索引も作成される）"""
+    with engine.begin() as conn:
+        conn.execute(insert(User),[{"id":i,"username":f"user{i}","password":"x","salt":"x"} for i in range(1,users + 1)])
+        batch = []
+        for i in range(tasks):
+            title = " ".join(rng.choices(words,k=3))
+            content = " ".join(rng.choices(words,k=8))
+            batch.append((title,content,i % users + 1,0))
+            if len(batch) == 10000:
+                conn.exec_driver_sql(f"INSERT INTO {Item.__tablename__} (title,content,user_id,completed) VALUES (?,?,?,?)",batch)
+                batch = []
+        if batch:
+            conn.exec_driver_sql(f"INSERT INTO {Item.__tablename__} (title,content,user_id,completed) VALUES (?,?,?,?)",batch)
+
+
+def measure(fn,queries :list):
+    """queriesの各要素でfnを呼び出し、1回あたりのミリ秒と平均件数を返す"""
+    found = 0
+    start = time.perf_counter()
+    for query in queries:
+        found += len(fn(*query))
+    return (time.perf_counter() - start) / len(queries) * 1000,found / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks",type=int,default=200000)
+    parser.add_argument("--users",type=int,default=100)
+    parser.add_argument("--words",type=int,default=20000,help="語彙数（少ないほど1語に一致するタスクが増える）")
+    parser.add_argument("--queries",type=int,default=50)
+    parser.add_argument("--limit",type=int,default=50)
+    parser.add_argument("--seed",type=int,default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = make_words(args.words,rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp,'bench.db')}")
+        Base.metadata.create_all(engine)
+        start = time.perf_counter()
+        populate(engine,args.tasks,args.users,words,rng)
+        print(f"{args.tasks:,} tasks / {args.users} users inserted in {time.perf_counter() - start:.1f}s")
+
+        queries = [(rng.randint(1,args.users),rng.choice(words)) for _ in range(args.queries)]
+        with Session(engine) as db:
+            def like_all(user_id,word):
+                pattern = f"%{word}%"
+                return db.execute(text("SELECT * FROM tasks NOT INDEXED WHERE user_id = :u AND (title LIKE :p OR content LIKE :p) LIMIT :limit"),{"u":user_id,"p":pattern,"limit":args.limit}).all()
+
+            def like_user(user_id,word):
+                return db.scalars(task_cruds.build_query(user_id,q=word).limit(args.limit)).all()
+
+            def fts(user_id,word):
+                return task_cruds.search(db,user_id,word,limit=args.limit)
+
+            def fts_prefix(user_id,word):
+                return task_cruds.search(db,user_id,word[:3] + "*",limit=args.limit)
+
+            for name,fn in (("like_all",like_all),("like_user",like_user),("fts",fts),("fts_prefix",fts_prefix)):
+                ms,found = measure(fn,queries)
+                print(f"{name:<10} {ms:9.3f} ms/query  hits/query={found:.1f}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""タスク一覧のJSON変換ベンチマーク
+
+10,000件のタスク一覧を返す処理について、次の方法の1回あたりの時間と
+tracemallocで計測したメモリ確保量（ピーク）を比較します。
+
+- orm: Itemを読み込み、ItemResponseで検証してからJSONにする（TASK_FAST_JSON=off）
+- fast: 列の値だけをSELECTし、行から直接JSONにする（TASK_FAST_JSON=on、orjson使用）
+- fast_stdlib: fast と同じで、orjsonの代わりに標準のjsonを使用
+
+また、GET /tasks（キャッシュを通らない絞り込み付き）をTestClientで呼び出したときの
+レスポンス時間も比較します。
+
+実行方法:
+    python benchmarks/bench_serialization.py --tasks 10000 --repeat 20
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date,timedelta
+
+app_dir = os.path.join(os.path.dirname(__file__),"..")
+sys.path.append(app_dir)
+
+from sqlalchemy import create_engine,insert
+from sqlalchemy.orm import sessionmaker
+from fastapi.testclient import TestClient
+from models import Base,Item,User
+from schemas import DecodedToken
+from database import get_db
+from main import app
+from cruds import task as task_cruds
+from cruds.auth import get_current_user
+import fast_json
+
+
+def orm(db):
+    items = task_cruds.find_filtered(db,1,completed=False)
+    return task_cruds.ItemListAdapter.dump_json(task_cruds.ItemListAdapter.validate_python(items,from_attributes=True))
+
+
+def fast(db):
+    return task_cruds.find_filtered_json(db,1,completed=False)
+
+
+def measure(fn,db,repeat :int):
+    """fn(db)をrepeat回実行し、1回あたりのミリ秒とメモリ確保量のピーク（KiB）を返す"""
+    fn(db)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        db.expunge_all()
+        fn(db)
+    ms = (time.perf_counter() - start) / repeat * 1000
+    db.expunge_all()
+    tracemalloc.start()
+    fn(db)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ms,peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks",type=int,default=10000)
+    parser.add_argument("--repeat",type=int,default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp,'bench.db')}",connect_args={"check_same_thread":False})
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(insert(User),[{"id":1,"username":"bench","password":"x","salt":"x"}])
+            conn.execute(insert(Item),[
+                {"title":f"タスク{i}","content":"ベンチマーク用の内容","due_date":date(2025,1,1) + timedelta(days=i % 365),"completed":False,"user_id":1}
+                for i in range(args.tasks)
+            ])
+        db = sessionmaker(bind=engine,autoflush=False)()
+        assert orm(db) == fast(db),"wire format mismatch"
+
+        orjson = fast_json.orjson
+        results = [("orm",orm),("fast",fast)]
+        for name,fn in results:
+            ms,peak = measure(fn,db,args.repeat)
+            print(f"{name:<12} {ms:8.2f} ms  peak {peak:9.0f} KiB")
+        fast_json.orjson = None
+        ms,peak = measure(fast,db,args.repeat)
+        print(f"{'fast_stdlib':<12} {ms:8.2f} ms  peak {peak:9.0f} KiB")
+        fast_json.orjson = orjson
+
+        app.dependency_overrides[get_db] = lambda: db
+        app.dependency_overrides[get_current_user] = lambda: DecodedToken(username="bench",user_id=1)
+        client = TestClient(app)
+        for enabled in (False,True):
+            task_cruds.FAST_JSON_ENABLED = enabled
+            client.get("/tasks?completed=false")
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                db.expunge_all()
+                response = client.get("/tasks?completed=false")
+            ms = (time.perf_counter() - start) / args.repeat * 1000
+            print(f"GET /tasks TASK_FAST_JSON={'on' if enabled else 'off':<3} {ms:8.2f} ms  {len(response.content):,} bytes")
+        app.dependency_overrides.clear()
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""SQLiteプロファイル別の同時書き込みベンチマーク
+
+複数のプロセス（uvicornのワーカーを想定）から同じSQLiteファイルに対して
+cruds.task.create を同時に実行し、SQLITE_PROFILE ごとの書き込み件数/秒と
+"database is locked" などで失敗した件数を比較します。
+
+実行方法:
+    python benchmarks/bench_sqlite_profile.py --workers 4 --writes 500
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+app_dir = os.path.join(os.path.dirname(__file__),"..")
+sys.path.append(app_dir)
+
+
+def child(writes :int):
+    """子プロセス側: writes件のタスクを1件ずつ作成し、成功数と失敗数を返す"""
+    from sqlalchemy.exc import OperationalError
+    from database import SessionLocal
+    from cruds import task as task_cruds
+    from schemas import ItemCreate
+
+    ok = failed = 0
+    db = SessionLocal()
+    for i in range(writes):
+        try:
+            task_cruds.create(ItemCreate(title=f"task{i}",content="bench",completed=False),db=db,user_id=1)
+            ok += 1
+        except OperationalError:
+            db.rollback()
+            failed += 1
+    db.close()
+    return {"ok":ok,"failed":failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers",type=int,default=4)
+    parser.add_argument("--writes",type=int,default=500,help="1プロセスあたりの書き込み件数")
+    parser.add_argument("--profiles",default="default,production")
+    parser.add_argument("--child",action="store_true",help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args.writes)))
+        return
+
+    from sqlalchemy import create_engine,insert
+    from models import Base,User
+
+    for profile in args.profiles.split(","):
+        with tempfile.TemporaryDirectory() as tmp:
+            url = f"sqlite:///{os.path.join(tmp,'bench.db')}"
+            engine = create_engine(url)
+            Base.metadata.create_all(engine)
+            with engine.begin() as conn:
+                conn.execute(insert(User),[{"id":1,"username":"bench","password":"x","salt":"x"}])
+            engine.dispose()
+
+            env = dict(os.environ,DATABASE_URL=url,SQLITE_PROFILE=profile,FASTAPI_SECRET_KEY="bench")
+            start = time.perf_counter()
+            procs = [
+                subprocess.Popen([sys.executable,__file__,"--child","--writes",str(args.writes)],env=env,stdout=subprocess.PIPE,text=True)
+                for _ in range(args.workers)
+            ]
+            results = [json.loads(proc.communicate()[0].strip().splitlines()[-1]) for proc in procs]
+            elapsed = time.perf_counter() - start
+            ok = sum(result["ok"] for result in results)
+            failed = sum(result["failed"] for result in results)
+            print(f"SQLITE_PROFILE={profile:<10} workers={args.workers} {ok / elapsed:8.1f} writes/s  ok={ok} failed={failed}")
+
+
+if __name__ == "__main__":
+    main()
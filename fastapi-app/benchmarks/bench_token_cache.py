@@ -0,0 +1,46 @@
+"""認証依存関数（get_current_user）のマイクロベンチマーク
+
+同じトークンで get_current_user を繰り返し呼び出し、
+検証済みトークンのキャッシュを有効にした場合と無効にした場合の1回あたりの時間を比較します。
+
+実行方法:
+    python benchmarks/bench_token_cache.py --calls 50000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import timedelta
+
+app_dir = os.path.join(os.path.dirname(__file__),"..")
+sys.path.append(app_dir)
+
+from cruds import auth as auth_cruds
+
+
+def measure(token :str,calls :int,enabled :bool):
+    """calls回呼び出して1回あたりのマイクロ秒を返す"""
+    auth_cruds.TOKEN_CACHE_ENABLED = enabled
+    auth_cruds.token_cache.clear()
+    start = time.perf_counter()
+    for _ in range(calls):
+        auth_cruds.get_current_user(token)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls",type=int,default=50000)
+    args = parser.parse_args()
+
+    auth_cruds.SECRET_KEY = auth_cruds.SECRET_KEY or "bench-secret"
+    token = auth_cruds.create_access_token("bench",1,timedelta(minutes=20))
+    for enabled in (False,True):
+        us = measure(token,args.calls,enabled)
+        label = "on " if enabled else "off"
+        print(f"token cache {label}: {us:8.2f} us/call  {1e6 / us:12,.0f} calls/s  {auth_cruds.token_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
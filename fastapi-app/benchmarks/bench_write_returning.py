@@ -0,0 +1,70 @@
+"""タスク更新・削除の書き込みベンチマーク
+
+cruds.task.update / cruds.task.delete を1件ずつ実行し、
+UPDATE/DELETE ... RETURNING の1文で行う場合（returning）と、
+SELECTしてからORMで更新・削除する場合（select）の1秒あたりの件数を比較します。
+
+実行方法:
+    python benchmarks/bench_write_returning.py --writes 5000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+app_dir = os.path.join(os.path.dirname(__file__),"..")
+sys.path.append(app_dir)
+
+from sqlalchemy import create_engine,insert,event
+from sqlalchemy.orm import sessionmaker
+from models import Base,Item,User
+from schemas import ItemUpdate
+from cruds import task as task_cruds
+
+
+def run(writes :int,returning :bool,synchronous :str):
+    """新しいDBにwrites件のタスクを作成し、全件の更新と削除にかかった時間を計測"""
+    task_cruds.WRITE_RETURNING_ENABLED = returning
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp,'bench.db')}")
+
+        @event.listens_for(engine,"connect")
+        def set_sqlite_pragma(dbapi_connection,connection_record):
+            dbapi_connection.execute(f"PRAGMA synchronous={synchronous}")
+
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(insert(User),[{"id":1,"username":"bench","password":"x","salt":"x"}])
+            conn.execute(insert(Item),[{"title":f"task{i}","content":"bench","completed":False,"user_id":1} for i in range(writes)])
+        db = sessionmaker(bind=engine,autoflush=False)()
+        ids = [id for (id,) in db.query(Item.id).order_by(Item.id)]
+        db.expunge_all()
+
+        start = time.perf_counter()
+        for id in ids:
+            task_cruds.update(ItemUpdate(completed=True),id,db=db,user_id=1)
+        update_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        for id in ids:
+            task_cruds.delete(id,db=db,user_id=1)
+        delete_elapsed = time.perf_counter() - start
+        db.close()
+        engine.dispose()
+    return writes / update_elapsed,writes / delete_elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writes",type=int,default=5000)
+    parser.add_argument("--synchronous",default="OFF",help="PRAGMA synchronous（OFFでfsyncの影響を除いて比較）")
+    args = parser.parse_args()
+
+    for name,returning in (("select",False),("returning",True)):
+        updates,deletes = run(args.writes,returning,args.synchronous)
+        print(f"{name:<10} update {updates:9.1f} writes/s  delete {deletes:9.1f} writes/s")
+
+
+if __name__ == "__main__":
+    main()
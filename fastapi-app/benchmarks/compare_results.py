@@ -0,0 +1,105 @@
+"""負荷試験の結果の比較
+
+load_test.py が保存した2つのJSON（比較元・比較先）のシナリオごとに、レイテンシ（既定はp95）と
+RPSの変化率を表示します。しきい値を超えて悪化したシナリオ、またはエラーが増えたシナリオがあれば
+終了コード1で終了するため、CIでのコミット間の回帰検出に使えます。
+件数・同時実行数・アプリの設定が異なる場合は警告を表示します。
+
+実行方法:
+    python benchmarks/compare_results.py results/before.json results/after.json
+    python benchmarks/compare_results.py before.json after.json --metric p99_ms --threshold 0.1
+"""
+
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms","p95_ms","p99_ms","mean_ms")
+
+
+def change(before,after):
+    """before から after への変化率（計算できない場合はNone）"""
+    if not before or after is None:
+        return None
+    return (after - before) / before
+
+
+def compare(before :dict,after :dict,metric :str = "p95_ms",threshold :float = 0.2):
+    """2つの結果をシナリオごとに比較
+
+    Args:
+        before: 比較元の結果（load_test.py のJSON）
+        after: 比較先の結果
+        metric: 比較するレイテンシ（p50_ms / p95_ms / p99_ms / mean_ms）
+        threshold: 悪化とみなす変化率（0.2 の場合、レイテンシ+20%以上またはRPS-20%以上）
+
+    Returns:
+        list[dict]: シナリオごとの scenario, before, after, latency_change, rps_change, regressed
+    """
+    rows = []
+    for name,current in after["scenarios"].items():
+        previous = before["scenarios"].get(name)
+        if previous is None:
+            continue
+        latency_change = change(previous.get(metric),current.get(metric))
+        rps_change = change(previous.get("rps"),current.get("rps"))
+        regressed = (
+            (latency_change is not None and latency_change > threshold)
+            or (rps_change is not None and rps_change < -threshold)
+            or current.get("errors",0) > previous.get("errors",0)
+        )
+        rows.append({
+            "scenario":name,"before":previous,"after":current,
+            "latency_change":latency_change,"rps_change":rps_change,"regressed":regressed,
+        })
+    return rows
+
+
+def differences(before :dict,after :dict):
+    """条件（params・config）が異なる項目の説明のリスト"""
+    lines = []
+    for section in ("params","config"):
+        old = before["meta"].get(section,{})
+        new = after["meta"].get(section,{})
+        for key in sorted(set(old) | set(new)):
+            if old.get(key) != new.get(key):
+                lines.append(f"{section}.{key}: {old.get(key)} -> {new.get(key)}")
+    return lines
+
+
+def percent(value):
+    return "     -" if value is None else f"{value * 100:+6.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before",help="比較元の結果のJSON")
+    parser.add_argument("after",help="比較先の結果のJSON")
+    parser.add_argument("--metric",choices=METRICS,default="p95_ms",help="比較するレイテンシ")
+    parser.add_argument("--threshold",type=float,default=0.2,help="悪化とみなす変化率")
+    args = parser.parse_args()
+
+    with open(args.before,encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after,encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"{(before['meta'].get('commit') or 'unknown')[:7]} -> {(after['meta'].get('commit') or 'unknown')[:7]}")
+    for line in differences(before,after):
+        print(f"warning: {line}",file=sys.stderr)
+    rows = compare(before,after,args.metric,args.threshold)
+    print(f"{'scenario':<12} {args.metric:>19} {'change':>8} {'rps':>17} {'change':>8} {'errors':>9}")
+    for row in rows:
+        old,new = row["before"],row["after"]
+        print(
+            f"{row['scenario']:<12} {old.get(args.metric) or 0:>9.2f}{new.get(args.metric) or 0:>10.2f} {percent(row['latency_change']):>8} "
+            f"{old.get('rps') or 0:>8.1f}{new.get('rps') or 0:>9.1f} {percent(row['rps_change']):>8} "
+            f"{old.get('errors',0):>4}{new.get('errors',0):>5}"
+            + ("  REGRESSED" if row["regressed"] else "")
+        )
+    if any(row["regressed"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""FastAPI・Flaskアプリの負荷試験
+
+一時的なSQLiteファイル（または --db で指定したファイル）に、多数のユーザーとタスクを
+importer と同じ一括INSERTで投入し、uvicorn（FastAPI）と Flask をローカルで起動して
+指定した同時実行数でリクエストを送ります。シナリオごとに p50/p95/p99 のレイテンシと
+1秒あたりのリクエスト数（RPS）を集計し、結果をJSONファイルに保存します。
+保存したJSONは compare_results.py でコミット間の比較に使えます。
+
+シナリオ（--scenarios で選択、この順に実行）:
+    login        POST /auth/login
+    refresh      POST /auth/refresh（パスワードを検証しないトークン更新）
+    list         GET /tasks
+    get          GET /tasks/{id}
+    create       POST /tasks
+    update       PUT /tasks/{id}（create で作成したタスク）
+    delete       DELETE /tasks/{id}（create で作成したタスク、実行後のタスク数は元に戻る）
+    flask_login  POST /login（Flask）
+    flask_list   GET /task_list（Flask）
+    flask_edit   GET /{id}/edit（Flask）
+
+ユーザーは load1 〜 loadN（パスワードは共通）で、タスクはユーザーへ順番に割り当てます。
+ログインはパスワードハッシュ（PBKDF2）の計算が重いため、回数を --login-requests で別に指定します。
+DB_MODE・SQLITE_PROFILE・TASK_CACHE などの環境変数はそのまま起動するアプリに渡し、結果のJSONにも記録します。
+
+注意: 負荷をかける側とアプリが同じマシンのCPUを取り合うため、結果の比較は同じマシン・同じ条件で行ってください。
+
+実行方法:
+    python benchmarks/load_test.py --users 1000 --tasks 100000 --requests 2000 --concurrency 20
+    python benchmarks/load_test.py --db /tmp/load.db --users 5000 --tasks 1000000 --output results/after.json
+    python benchmarks/load_test.py --fastapi-url http://localhost:8000 --no-flask --users 1000 --tasks 100000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import date,datetime,timedelta
+
+app_dir = os.path.abspath(os.path.join(os.path.dirname(__file__),".."))
+flask_dir = os.path.abspath(os.path.join(app_dir,"..","flask-app"))
+sys.path.append(app_dir)
+
+import httpx
+
+PASSWORD = "load-test-password"
+SCENARIOS = ("login","refresh","list","get","create","update","delete","flask_login","flask_list","flask_edit")
+# 結果に記録するアプリの設定（環境変数）
+CONFIG_KEYS = (
+    "DB_MODE","SQLITE_PROFILE","TOKEN_CACHE","PASSWORD_HASH_ITERATIONS","PASSWORD_HASH_WORKERS",
+    "TASK_CACHE","TASK_FAST_JSON","TASK_WRITE_RETURNING","METRICS_ENABLED","QUERY_GUARD",
+    "RATE_LIMIT","MAX_CONCURRENT_REQUESTS",
+)
+
+
+def seed(url :str,users :int,tasks :int,batch_size :int = 10000):
+    """負荷試験用のユーザーとタスクを一括投入
+
+    パスワードのハッシュは1回だけ計算して全ユーザーで共有します。
+    タスクはユーザーへ順番に割り当てるため、id のタスクは user_id = (id - 1) % users + 1 のユーザーのものになります。
+
+    Args:
+        url: 投入先のデータベースURL（新しいDB）
+        users: ユーザー数
+        tasks: タスク数
+        batch_size: 1回のINSERTで追加する件数
+
+    Returns:
+        float: 投入にかかった秒数
+    """
+    from sqlalchemy import create_engine,insert
+    from models import Base,Item,User
+    from cruds.auth import hash_password
+    from importer import COLUMNS
+
+    start = time.perf_counter()
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    salt = "load-test"
+    password = hash_password(PASSWORD,salt)
+    today = date.today()
+    with engine.begin() as conn:
+        conn.execute(insert(User),[
+            {"id":i,"username":f"load{i}","password":password,"salt":salt}
+            for i in range(1,users + 1)
+        ])
+        sql = f"INSERT INTO {Item.__tablename__} ({','.join(COLUMNS)}) VALUES ({','.join(['?'] * len(COLUMNS))})"
+        for offset in range(0,tasks,batch_size):
+            conn.exec_driver_sql(sql,[
+                (f"task{i}","load test",(today + timedelta(days=i % 60 - 30)).isoformat(),int(i % 3 == 0),i % users + 1)
+                for i in range(offset,min(offset + batch_size,tasks))
+            ])
+    engine.dispose()
+    return time.perf_counter() - start
+
+
+def percentile(values :list,p :float):
+    """昇順に並んだ値の p パーセンタイル（線形補間、値がない場合はNone）"""
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100
+    f = int(k)
+    c = min(f + 1,len(values) - 1)
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+
+def summarize(latencies :list,statuses :Counter,errors :int,elapsed :float):
+    """1シナリオ分の計測値を集計
+
+    Returns:
+        dict: requests, errors, statuses, seconds, rps, mean_ms, p50_ms, p95_ms, p99_ms, max_ms
+    """
+    values = sorted(latencies)
+
+    def ms(value):
+        return None if value is None else round(value * 1000,3)
+
+    return {
+        "requests":len(values),
+        "errors":errors,
+        "statuses":{str(status):count for status,count in sorted(statuses.items())},
+        "seconds":round(elapsed,3),
+        "rps":round(len(values) / elapsed,1) if elapsed > 0 else None,
+        "mean_ms":ms(sum(values) / len(values)) if values else None,
+        "p50_ms":ms(percentile(values,50)),
+        "p95_ms":ms(percentile(values,95)),
+        "p99_ms":ms(percentile(values,99)),
+        "max_ms":ms(values[-1]) if values else None,
+    }
+
+
+async def run_scenario(total :int,concurrency :int,send,expect :tuple = (200,)):
+    """send(i) を total 回、concurrency 並列で実行して計測
+
+    Args:
+        total: リクエスト数
+        concurrency: 同時実行数
+        send: 0〜total-1 の番号を受け取り httpx.Response を返すコルーチン関数
+        expect: 成功とみなすステータスコード（それ以外と接続エラーはerrorsに数える）
+
+    Returns:
+        dict: summarize の結果
+    """
+    latencies = []
+    statuses = Counter()
+    errors = 0
+    indexes = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in indexes:
+            start = time.perf_counter()
+            try:
+                status = (await send(i)).status_code
+            except httpx.HTTPError:
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            if status not in expect:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies,statuses,errors,time.perf_counter() - start)
+
+
+async def drive(args,fastapi_url :str,flask_url :str = None):
+    """各シナリオを順に実行
+
+    Returns:
+        dict: シナリオ名ごとの集計結果
+    """
+    users,tasks,concurrency = args.users,args.tasks,args.concurrency
+    scenarios = args.scenarios
+    active = [i % users + 1 for i in range(min(users,args.active_users))]
+    results = {}
+
+    def seeded_id(user_id :int,i :int):
+        """user_id のユーザーの i 番目（ユーザー内の件数で循環）の投入済みタスクのid"""
+        count = tasks // users + (1 if user_id - 1 < tasks % users else 0)
+        return user_id + users * ((i * 7919) % count)
+
+    limits = httpx.Limits(max_connections=concurrency,max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=fastapi_url,limits=limits,timeout=args.timeout) as client:
+        tokens = {}
+        refresh_tokens = {}
+
+        async def login(user_id :int):
+            response = await client.post("/auth/login",data={"username":f"load{user_id}","password":PASSWORD})
+            if response.status_code == 200:
+                tokens[user_id] = response.json()["access_token"]
+                refresh_tokens[user_id] = response.json()["refresh_token"]
+            return response
+
+        async def refresh(i :int):
+            # 同じユーザーのトークンを同時に使わないよう、同時実行数は active-users 以下にする
+            user_id = active[i % len(active)]
+            response = await client.post("/auth/refresh",json={"refresh_token":refresh_tokens[user_id]})
+            if response.status_code == 200:
+                tokens[user_id] = response.json()["access_token"]
+                refresh_tokens[user_id] = response.json()["refresh_token"]
+            return response
+
+        def auth(user_id :int):
+            return {"Authorization":f"Bearer {tokens[user_id]}"}
+
+        if "login" in scenarios:
+            results["login"] = await run_scenario(args.login_requests,concurrency,lambda i: login(active[i % len(active)]))
+        missing = [user_id for user_id in active if user_id not in tokens]
+        await run_scenario(len(missing),concurrency,lambda i: login(missing[i])) # 計測しない準備
+        active = [user_id for user_id in active if user_id in tokens]
+        if not active:
+            raise RuntimeError("ログインできるユーザーがいません（--db のデータと --users/--tasks が一致しているか確認してください）")
+        if "refresh" in scenarios:
+            results["refresh"] = await run_scenario(args.requests,min(concurrency,len(active)),refresh)
+
+        async def list_tasks(i :int):
+            user_id = active[i % len(active)]
+            return await client.get("/tasks",headers=auth(user_id))
+
+        async def get_task(i :int):
+            user_id = active[i % len(active)]
+            return await client.get(f"/tasks/{seeded_id(user_id,i // len(active))}",headers=auth(user_id))
+
+        created = []
+
+        async def create_task(i :int):
+            user_id = active[i % len(active)]
+            response = await client.post("/tasks",headers=auth(user_id),json={
+                "title":f"load{i}","content":"load test create","due_date":date.today().isoformat(),"completed":False
+            })
+            if response.status_code == 201:
+                created.append((user_id,response.json()["id"]))
+            return response
+
+        async def update_task(i :int):
+            user_id,id = created[i % len(created)]
+            return await client.put(f"/tasks/{id}",headers=auth(user_id),json={"completed":True})
+
+        async def delete_task(i :int):
+            user_id,id = created[i]
+            return await client.delete(f"/tasks/{id}",headers=auth(user_id))
+
+        if "list" in scenarios:
+            results["list"] = await run_scenario(args.requests,concurrency,list_tasks)
+        if "get" in scenarios:
+            results["get"] = await run_scenario(args.requests,concurrency,get_task)
+        if "create" in scenarios:
+            results["create"] = await run_scenario(args.requests,concurrency,create_task,expect=(201,))
+        if created and "update" in scenarios:
+            results["update"] = await run_scenario(args.requests,concurrency,update_task)
+        if created and "delete" in scenarios:
+            results["delete"] = await run_scenario(len(created),concurrency,delete_task)
+
+    if flask_url is None or not any(name.startswith("flask_") for name in scenarios):
+        return results
+
+    # Flaskのセッション（Cookie）はユーザーごとに保持し、リクエストごとに Cookie ヘッダーで送る
+    async with httpx.AsyncClient(base_url=flask_url,limits=limits,timeout=args.timeout) as client:
+        cookies = {}
+
+        async def flask_login(user_id :int):
+            response = await client.post("/login",data={"username":f"load{user_id}","password":PASSWORD})
+            if response.status_code == 302 and "session" in response.cookies:
+                cookies[user_id] = response.cookies["session"]
+            return response
+
+        def session(user_id :int):
+            return {"Cookie":f"session={cookies[user_id]}"}
+
+        async def flask_list(i :int):
+            user_id = active[i % len(active)]
+            return await client.get("/task_list",headers=session(user_id))
+
+        async def flask_edit(i :int):
+            user_id = active[i % len(active)]
+            return await client.get(f"/{seeded_id(user_id,i // len(active))}/edit",headers=session(user_id))
+
+        if "flask_login" in scenarios:
+            results["flask_login"] = await run_scenario(args.login_requests,concurrency,lambda i: flask_login(active[i % len(active)]),expect=(302,))
+        missing = [user_id for user_id in active if user_id not in cookies]
+        await run_scenario(len(missing),concurrency,lambda i: flask_login(missing[i]))
+        active = [user_id for user_id in active if user_id in cookies]
+        if not active:
+            raise RuntimeError("Flaskにログインできるユーザーがいません")
+        if "flask_list" in scenarios:
+            results["flask_list"] = await run_scenario(args.requests,concurrency,flask_list)
+        if "flask_edit" in scenarios:
+            results["flask_edit"] = await run_scenario(args.requests,concurrency,flask_edit)
+    return results
+
+
+def free_port():
+    """空いているTCPポートの番号"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1",0))
+        return s.getsockname()[1]
+
+
+def start_server(command :list,cwd :str,env :dict,ready_url :str,log_path :str,timeout :float = 60):
+    """サーバーを子プロセスで起動し、ready_url に応答するまで待つ
+
+    Returns:
+        subprocess.Popen: 起動したプロセス
+
+    Raises:
+        RuntimeError: 起動に失敗した場合（ログの末尾を含む）
+    """
+    log = open(log_path,"wb")
+    process = subprocess.Popen(command,cwd=cwd,env=env,stdout=log,stderr=subprocess.STDOUT)
+    log.close()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            httpx.get(ready_url,timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    with open(log_path,"rb") as f:
+        tail = f.read()[-2000:].decode(errors="replace")
+    raise RuntimeError(f"{' '.join(command)} の起動に失敗しました\n{tail}")
+
+
+def stop_server(process):
+    """サーバーのプロセスを終了"""
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def git_revision():
+    """コミットのハッシュと未コミットの変更の有無（gitがない場合はNone）"""
+    try:
+        commit = subprocess.run(["git","rev-parse","HEAD"],cwd=app_dir,capture_output=True,text=True,check=True).stdout.strip()
+        status = subprocess.run(["git","status","--porcelain","--untracked-files=no"],cwd=app_dir,capture_output=True,text=True,check=True).stdout
+    except (OSError,subprocess.CalledProcessError):
+        return None,None
+    return commit,bool(status.strip())
+
+
+def count_seeded(url :str):
+    """既存のDBの負荷試験用ユーザー数とタスク数"""
+    from sqlalchemy import create_engine,text
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        users = conn.execute(text("SELECT count(*) FROM users WHERE username LIKE 'load%'")).scalar()
+        tasks = conn.execute(text("SELECT count(*) FROM tasks WHERE content = 'load test'")).scalar()
+    engine.dispose()
+    return users,tasks
+
+
+def print_results(results :dict):
+    print(f"{'scenario':<12} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name,result in results.items():
+        print(f"{name:<12} {result['requests']:>8} {result['errors']:>6} {result['rps'] or 0:>8.1f} "
+              f"{result['p50_ms'] or 0:>9.2f} {result['p95_ms'] or 0:>9.2f} {result['p99_ms'] or 0:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users",type=int,default=1000,help="ユーザー数")
+    parser.add_argument("--tasks",type=int,default=100000,help="タスク数（ユーザー数以上）")
+    parser.add_argument("--requests",type=int,default=2000,help="シナリオごとのリクエスト数")
+    parser.add_argument("--login-requests",type=int,default=100,help="login / flask_login のリクエスト数")
+    parser.add_argument("--concurrency",type=int,default=20,help="同時実行数")
+    parser.add_argument("--active-users",type=int,default=100,help="リクエストを送るユーザー数")
+    parser.add_argument("--scenarios",default=",".join(SCENARIOS),help="実行するシナリオ（カンマ区切り）")
+    parser.add_argument("--workers",type=int,default=1,help="uvicornのワーカー数")
+    parser.add_argument("--timeout",type=float,default=30,help="リクエストのタイムアウト秒数")
+    parser.add_argument("--db",help="SQLiteファイルのパス（存在する場合は投入せずに使用）")
+    parser.add_argument("--fastapi-url",help="起動済みのFastAPIのURL（指定時は起動しない）")
+    parser.add_argument("--flask-url",help="起動済みのFlaskのURL（指定時は起動しない）")
+    parser.add_argument("--no-flask",action="store_true",help="Flaskのシナリオを実行しない")
+    parser.add_argument("--output",help="結果のJSONファイル（省略時は benchmarks/results/ に作成）")
+    args = parser.parse_args()
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.tasks < args.users:
+        parser.error("--tasks must be >= --users")
+    if args.no_flask:
+        args.scenarios = [name for name in args.scenarios if not name.startswith("flask_")]
+
+    commit,dirty = git_revision()
+    processes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.abspath(args.db or os.path.join(tmp,"load.db"))
+        url = f"sqlite:///{db_path}"
+        seed_seconds = None
+        if args.fastapi_url is None or args.db:
+            if os.path.exists(db_path):
+                args.users,args.tasks = count_seeded(url)
+                print(f"{db_path} のユーザー {args.users:,} 人・タスク {args.tasks:,} 件を使用します",file=sys.stderr)
+            else:
+                seed_seconds = seed(url,args.users,args.tasks)
+                print(f"ユーザー {args.users:,} 人・タスク {args.tasks:,} 件を {seed_seconds:.1f} 秒で投入しました",file=sys.stderr)
+        try:
+            fastapi_url = args.fastapi_url
+            if fastapi_url is None:
+                port = free_port()
+                fastapi_url = f"http://127.0.0.1:{port}"
+                os.environ.setdefault("RATE_LIMIT","off") # 少数のユーザー・1つのIPアドレスから送るため（結果の設定にも記録）
+                env = dict(os.environ,DATABASE_URL=url)
+                env.setdefault("FASTAPI_SECRET_KEY","load-test")
+                processes.append(start_server(
+                    [sys.executable,"-m","uvicorn","main:app","--host","127.0.0.1","--port",str(port),
+                     "--workers",str(args.workers),"--log-level","warning","--no-access-log"],
+                    app_dir,env,f"{fastapi_url}/docs",os.path.join(tmp,"fastapi.log")
+                ))
+            flask_url = args.flask_url
+            if flask_url is None and any(name.startswith("flask_") for name in args.scenarios):
+                port = free_port()
+                flask_url = f"http://127.0.0.1:{port}"
+                env = dict(os.environ,FASTAPI_URL=fastapi_url,API_POOL_MAXSIZE=str(max(args.concurrency,20)))
+                env.setdefault("FLASK_SECRET_KEY","load-test")
+                processes.append(start_server(
+                    [sys.executable,"-m","flask","--app","app","run","--host","127.0.0.1","--port",str(port),"--no-reload","--no-debugger"],
+                    flask_dir,env,f"{flask_url}/login",os.path.join(tmp,"flask.log")
+                ))
+            results = asyncio.run(drive(args,fastapi_url,flask_url))
+        finally:
+            for process in processes:
+                stop_server(process)
+
+    report = {
+        "meta":{
+            "commit":commit,
+            "dirty":dirty,
+            "timestamp":datetime.now().astimezone().isoformat(timespec="seconds"),
+            "python":platform.python_version(),
+            "platform":platform.platform(),
+            "cpu_count":os.cpu_count(),
+            "params":{
+                "users":args.users,"tasks":args.tasks,"requests":args.requests,"login_requests":args.login_requests,
+                "concurrency":args.concurrency,"active_users":args.active_users,"workers":args.workers,
+            },
+            "config":{key:os.environ.get(key) for key in CONFIG_KEYS},
+            "seed_seconds":None if seed_seconds is None else round(seed_seconds,3),
+        },
+        "scenarios":results,
+    }
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(os.path.dirname(os.path.abspath(__file__)),"results",f"load_test-{stamp}-{(commit or 'unknown')[:7]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)),exist_ok=True)
+    with open(output,"w",encoding="utf-8") as f:
+        json.dump(report,f,ensure_ascii=False,indent=2)
+    print_results(results)
+    print(f"結果を {output} に保存しました")
+
+
+if __name__ == "__main__":
+    main()
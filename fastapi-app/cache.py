@@ -0,0 +1,224 @@
+"""キャッシュ
+
+- TTLCache: 件数・バイト数上限付きのLRUに、エントリごとの有効期限（TTL）を組み合わせたインプロセスキャッシュ
+- RedisCache: Redis互換クライアント（get / set(ex=) / delete）を使う共有キャッシュ
+- SingleFlight: 同じキーの読み込みを同時に1回だけ実行するためのガード
+
+TTLCacheは複数スレッド（同期の依存関数はスレッドプールで実行される）から安全に使えるようロックで保護しています。
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+  """有効期限付きLRUキャッシュ
+
+    maxsize件（またはmaxbytes）を超えると最も長く使われていないエントリから破棄します。
+    各エントリは expires_at（UNIX時刻）を過ぎると取得できなくなります。
+
+    Attributes:
+        maxsize: 保持する最大件数
+        ttl: expires_at を指定しない場合の有効秒数
+        maxbytes: 保持する値の合計サイズの上限（Noneの場合は制限なし）
+        sizeof: 値のサイズを求める関数（maxbytes指定時に使用）
+        hits: キャッシュヒット数
+        misses: キャッシュミス数
+        evictions: 件数・サイズ上限により破棄した件数
+        expirations: 有効期限切れで破棄した件数
+  """
+
+  def __init__(self,maxsize :int = 1024,ttl :float = 300,maxbytes :int = None,sizeof = len):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.maxbytes = maxbytes
+    self.sizeof = sizeof
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self.expirations = 0
+    self.nbytes = 0
+    self._data = OrderedDict()
+    self._lock = threading.Lock()
+
+  def _pop(self,key):
+    value,_ = self._data.pop(key)
+    if self.maxbytes is not None:
+      self.nbytes -= self.sizeof(value)
+
+  def get(self,key,default = None):
+    """キーに対応する値を取得（期限切れ・未登録の場合はdefault）"""
+    with self._lock:
+      entry = self._data.get(key)
+      if entry is not None:
+        value,expires_at = entry
+        if expires_at > time.time():
+          self._data.move_to_end(key)
+          self.hits += 1
+          return value
+        self._pop(key)
+        self.expirations += 1
+      self.misses += 1
+      return default
+
+  def set(self,key,value,expires_at :float = None):
+    """値を登録
+
+    Args:
+        key: キー
+        value: 値
+        expires_at: 有効期限（UNIX時刻）。Noneの場合は現在時刻+ttl
+    """
+    if expires_at is None:
+      expires_at = time.time() + self.ttl
+    with self._lock:
+      if key in self._data:
+        self._pop(key)
+      self._data[key] = (value,expires_at)
+      if self.maxbytes is not None:
+        self.nbytes += self.sizeof(value)
+      while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes and len(self._data) > 1):
+        self._pop(next(iter(self._data)))
+        self.evictions += 1
+
+  def delete(self,key):
+    """キーを削除（存在しない場合は何もしない）"""
+    with self._lock:
+      if key in self._data:
+        self._pop(key)
+
+  def clear(self):
+    """全エントリを削除"""
+    with self._lock:
+      self._data.clear()
+      self.nbytes = 0
+
+  def __len__(self):
+    return len(self._data)
+
+  def stats(self):
+    """ヒット数・ミス数などの統計情報を取得
+
+    Returns:
+        dict: size, maxsize, bytes, hits, misses, evictions, expirations
+    """
+    return {"size":len(self._data),"maxsize":self.maxsize,"bytes":self.nbytes,"hits":self.hits,"misses":self.misses,"evictions":self.evictions,"expirations":self.expirations}
+
+
+class RedisCache:
+  """Redis互換の共有キャッシュ
+
+    複数のワーカープロセスで同じキャッシュを共有する場合に使用します。
+    値はbytesのみ扱い、有効期限はRedisのEXで設定します。
+    件数・メモリの上限と破棄はRedis側（maxmemory / maxmemory-policy）に任せます。
+
+    Attributes:
+        client: get / set(ex=) / delete を持つRedis互換クライアント
+        ttl: 有効秒数
+        prefix: キーの接頭辞
+  """
+
+  def __init__(self,client,ttl :float = 300,prefix :str = "task_app:"):
+    self.client = client
+    self.ttl = ttl
+    self.prefix = prefix
+    self.hits = 0
+    self.misses = 0
+
+  def get(self,key,default = None):
+    """キーに対応する値を取得（未登録の場合はdefault）"""
+    value = self.client.get(self.prefix + key)
+    if value is None:
+      self.misses += 1
+      return default
+    self.hits += 1
+    return value
+
+  def set(self,key,value :bytes,expires_at :float = None):
+    """値を登録（expires_at指定時はその時刻まで、それ以外はttl秒）"""
+    ttl = self.ttl if expires_at is None else max(1,int(expires_at - time.time()))
+    self.client.set(self.prefix + key,value,ex=int(ttl))
+
+  def delete(self,key):
+    """キーを削除"""
+    self.client.delete(self.prefix + key)
+
+  def clear(self):
+    """接頭辞に一致するキーを全て削除"""
+    for key in self.client.scan_iter(self.prefix + "*"):
+      self.client.delete(key)
+
+  def stats(self):
+    """ヒット数・ミス数の統計情報を取得"""
+    return {"hits":self.hits,"misses":self.misses}
+
+
+def create_cache(kind :str,maxsize :int = 1024,ttl :float = 300,maxbytes :int = None,prefix :str = "task_app:"):
+  """設定に応じたキャッシュを作成
+
+  Args:
+      kind: "memory"（インプロセス）/ "redis"（REDIS_URLに接続）/ "off"（キャッシュしない）
+      maxsize: 最大件数（memoryのみ）
+      ttl: 有効秒数
+      maxbytes: 値の合計サイズの上限（memoryのみ）
+      prefix: キーの接頭辞（redisのみ）
+
+  Returns:
+      TTLCache または RedisCache（"off"の場合はNone）
+  """
+  if kind == "off":
+    return None
+  if kind == "redis":
+    import redis # 任意の依存パッケージ（redisを使う場合のみ必要）
+    return RedisCache(redis.Redis.from_url(os.getenv("REDIS_URL","redis://localhost:6379/0")),ttl=ttl,prefix=prefix)
+  return TTLCache(maxsize=maxsize,ttl=ttl,maxbytes=maxbytes)
+
+
+class SingleFlight:
+  """同じキーの読み込みを同時に1回だけ実行するガード
+
+    キャッシュミスが同時に大量に発生しても（キャッシュスタンピード）、
+    同じキーのDB読み込みは最初の1回だけ実行し、他の呼び出しはその結果を待ちます。
+    実行中の呼び出しがキャンセルされた場合（クライアントの切断など）、待っている呼び出しの1つが改めて実行します。
+    asyncioのイベントループ内で使用します。
+  """
+
+  def __init__(self):
+    self._inflight = {}
+    self.shared = 0
+
+  async def do(self,key,fn):
+    """fn()（コルーチン関数）を実行し、同じキーの実行中の呼び出しがあればその結果を待つ
+
+    Args:
+        key: キー
+        fn: 引数なしのコルーチン関数
+
+    Returns:
+        fn() の結果
+    """
+    future = self._inflight.get(key)
+    while future is not None:
+      self.shared += 1
+      await asyncio.wait([future]) # 実行中の呼び出しがキャンセルされても、待っている側にはキャンセルを伝えない
+      if not future.cancelled():
+        return future.result()
+      future = self._inflight.get(key) # キャンセルされた場合は改めて実行する（または新しい実行を待つ）
+    future = asyncio.get_running_loop().create_future()
+    self._inflight[key] = future
+    try:
+      result = await fn()
+    except asyncio.CancelledError:
+      future.cancel()
+      raise
+    except BaseException as e:
+      future.set_exception(e)
+      future.exception() # 待っている呼び出しがない場合の警告を抑止
+      raise
+    else:
+      future.set_result(result)
+      return result
+    finally:
+      del self._inflight[key]
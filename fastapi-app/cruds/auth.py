@@ -1,24 +1,143 @@
+from sqlalchemy import select,insert,update as sql_update,delete as sql_delete
 from sqlalchemy.orm import Session
 from schemas import UserCreate,DecodedToken
-from models import User
+from models import User,RefreshToken
 import hashlib
+import hmac
 import base64
 import os
-from datetime import timedelta,datetime
+import secrets
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from database import run_db
+from datetime import timedelta,datetime,timezone
 from jose import jwt,JWTError
 from fastapi.security import OAuth2PasswordBearer
 from typing import Annotated
-from fastapi import Depends
+from fastapi import Depends,HTTPException
+from starlette import status
 from dotenv import load_dotenv
+from cache import TTLCache,create_cache
+import metrics
 
 load_dotenv()
 
 SECRET_KEY = os.getenv("FASTAPI_SECRET_KEY")
 ALGORITHM = "HS256"
-def create_user(user_create :UserCreate,db :Session):
+
+# 検証済みトークンのキャッシュ（TOKEN_CACHE=off で無効化）
+TOKEN_CACHE_ENABLED = os.getenv("TOKEN_CACHE","on").lower() != "off"
+token_cache = TTLCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE","10000")))
+
+# ログアウトしたアクセストークン（トークンの有効期限まで保持し、検証時に拒否する）
+# memory はプロセスごと、redis は REDIS_URL で複数ワーカーが共有（off の場合ログアウトしてもトークンは有効期限まで使える）
+revoked_tokens = create_cache(
+    os.getenv("TOKEN_REVOCATION","memory"),
+    maxsize=int(os.getenv("TOKEN_REVOCATION_SIZE","100000")),
+    prefix="task_app:revoked:",
+)
+
+# リフレッシュトークンの有効日数
+REFRESH_TOKEN_DAYS = float(os.getenv("REFRESH_TOKEN_DAYS","14"))
+# 交換済みのリフレッシュトークンが再び使われたとき、同時に送られたリクエストとみなして
+# 同じログインのトークンを無効にしない秒数（これを過ぎた再利用は盗用とみなす）
+REFRESH_REUSE_GRACE_SECONDS = float(os.getenv("REFRESH_REUSE_GRACE_SECONDS","30"))
+
+# パスワードハッシュ（PBKDF2-SHA256）の反復回数
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS","600000"))
+# 反復回数を記録していない旧形式のハッシュの反復回数
+LEGACY_HASH_ITERATIONS = 1000
+HASH_PREFIX = "pbkdf2_sha256"
+
+# ハッシュ計算を実行するスレッド数（同時に計算するハッシュの上限）
+# 0 の場合はスレッドを使わずその場で計算（イベントループをブロックする）
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS",str(min(4,os.cpu_count() or 1))))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,thread_name_prefix="password-hash") if PASSWORD_HASH_WORKERS > 0 else None
+
+def hash_password(password :str,salt :str,iterations :int = None):
+    """パスワードをハッシュ化
+
+    反復回数をハッシュ値と一緒に "pbkdf2_sha256$反復回数$ハッシュ値" の形式で返すため、
+    後から反復回数を引き上げても既存のハッシュを検証できます。
+
+    Args:
+        password: パスワード（平文）
+        salt: ソルト
+        iterations: 反復回数（Noneの場合はPASSWORD_HASH_ITERATIONS）
+
+    Returns:
+        str: 保存用のハッシュ文字列
+    """
+    iterations = iterations or PASSWORD_HASH_ITERATIONS
+    digest = hashlib.pbkdf2_hmac("sha256",password.encode(),salt.encode(),iterations).hex()# hmacはバイトのため16進数に変換
+    return f"{HASH_PREFIX}${iterations}${digest}"
+
+def _hash_iterations(stored :str):
+    """保存されたハッシュ文字列から反復回数とハッシュ値を取り出す"""
+    if stored.startswith(HASH_PREFIX + "$"):
+        _,iterations,digest = stored.split("$",2)
+        return int(iterations),digest
+    return LEGACY_HASH_ITERATIONS,stored
+
+def verify_password(password :str,stored :str,salt :str):
+    """パスワードが保存されたハッシュと一致するか検証
+
+    Args:
+        password: パスワード（平文）
+        stored: 保存されたハッシュ文字列（旧形式のハッシュ値のみの文字列も可）
+        salt: ソルト
+
+    Returns:
+        bool: 一致すればTrue
+    """
+    iterations,digest = _hash_iterations(stored)
+    hashed = hashlib.pbkdf2_hmac("sha256",password.encode(),salt.encode(),iterations).hex()
+    return hmac.compare_digest(hashed,digest)
+
+def needs_rehash(stored :str):
+    """保存されたハッシュの反復回数が現在の設定より少ないか判定"""
+    iterations,_ = _hash_iterations(stored)
+    return iterations < PASSWORD_HASH_ITERATIONS
+
+async def run_hasher(fn,*args):
+    """ハッシュ計算をスレッドプールで実行
+
+    PBKDF2は計算中にGILを解放するため、専用のスレッドプールで実行すると
+    イベントループを止めずに他のリクエストを処理できます。
+    同時に計算する数はPASSWORD_HASH_WORKERSで制限されます。
+    """
+    with metrics.track("auth"):
+        if _hash_executor is None:
+            return fn(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor,fn,*args)
+
+def add_user(username :str,hashed_password :str,salt :str,db :Session):
+    """ハッシュ化済みのパスワードでユーザーをデータベースに追加"""
+    new_user = User(
+        # **user_create.model_dump()
+        username = username,
+        password = hashed_password,
+        salt = salt #Userデータモデルに列追加
+    )
+    db.add(new_user)
+    db.commit()
+    return new_user
+
+def find_user(username :str,db :Session):
+    """ユーザー名でユーザーを検索（見つからない場合はNone）"""
+    return db.query(User).filter(User.username==username).first()
+
+def update_password(user_id :int,hashed_password :str,db :Session):
+    """ユーザーのパスワードハッシュを更新"""
+    db.query(User).filter(User.id == user_id).update({User.password:hashed_password},synchronize_session=False)
+    db.commit()
+
+async def create_user(user_create :UserCreate,db :Session):
     """新規ユーザーを作成
     
     パスワードをハッシュ化し、ソルトと共にデータベースに保存します。
+    ハッシュ計算はスレッドプールで行い、イベントループをブロックしません。
     
     Args:
         user_create: ユーザー作成情報（username, password）
@@ -27,22 +146,17 @@ def create_user(user_create :UserCreate,db :Session):
     Returns:
         User: 作成されたユーザー（パスワードはハッシュ化済み）
     """
-    salt = base64.b64encode(os.urandom(32))
-    hashed_password = hashlib.pbkdf2_hmac("sha256",user_create.password.encode(),salt,1000).hex()# hmacはバイトのため16進数に変換
-    new_user = User(
-        # **user_create.model_dump()
-        username = user_create.username,
-        password = hashed_password,
-        salt = salt.decode() #Userデータモデルに列追加
-    )
-    db.add(new_user)
-    db.commit()
-    return new_user
+    salt = base64.b64encode(os.urandom(32)).decode()
+    hashed_password = await run_hasher(hash_password,user_create.password,salt)
+    return await run_db(db,add_user,user_create.username,hashed_password,salt)
 
-def login(username :str,password :str,db :Session):
+async def login(username :str,password :str,db :Session):
     """ユーザー認証
     
     ユーザー名とパスワードを検証し、一致すればユーザー情報を返します。
+    ハッシュ計算はスレッドプールで行い、イベントループをブロックしません。
+    保存されたハッシュの反復回数が現在の設定より少ない場合は、
+    認証に成功したパスワードで再ハッシュして保存し直します。
     
     Args:
         username: ユーザー名
@@ -53,12 +167,14 @@ def login(username :str,password :str,db :Session):
         User: 認証成功したユーザー
         None: 認証失敗の場合
     """
-    user = db.query(User).filter(User.username==username).first()
+    user = await run_db(db,find_user,username)
     if not user:
         return None
-    hashed_password = hashlib.pbkdf2_hmac("sha256",password.encode(),user.salt.encode(),1000).hex()
-    if user.password != hashed_password:
+    if not await run_hasher(verify_password,password,user.password,user.salt):
         return None
+    if needs_rehash(user.password):
+        hashed_password = await run_hasher(hash_password,password,user.salt)
+        await run_db(db,update_password,user.id,hashed_password)
     return user
 
 
@@ -81,10 +197,17 @@ def create_access_token(username :str,user_id :int,expires_delta :timedelta):
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+
+def _token_key(token :str):
+    """キャッシュのキー（トークン本体は保持せずハッシュ値を使う）"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
 def get_current_user(token :Annotated[str,Depends(oauth2_scheme)]):
     """現在のユーザー情報を取得
     
     JWTトークンをデコードし、ユーザー情報を検証して返します。
+    一度検証したトークンはトークンの有効期限（exp）までキャッシュし、
+    同じトークンでの2回目以降のリクエストでは署名検証を省略します。
     
     Args:
         token: JWTアクセストークン（Authorizationヘッダーから自動取得）
@@ -93,14 +216,158 @@ def get_current_user(token :Annotated[str,Depends(oauth2_scheme)]):
         DecodedToken: デコードされたユーザー情報（username, user_id）
 
     Raises:
-        JWTError:  トークンが不正または期限切れの場合
+        HTTPException: トークンが不正または期限切れの場合（401）
     """
+    with metrics.track("auth"):
+        return _verify_token(token)
+
+def _verify_token(token :str):
+    """トークンを検証してユーザー情報を返す（get_current_user の本体）"""
+    key = _token_key(token)
+    if revoked_tokens is not None and revoked_tokens.get(key) is not None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail="Token has been revoked",headers={"WWW-Authenticate":"Bearer"})
+    if TOKEN_CACHE_ENABLED:
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
     try:
         payload = jwt.decode(token,SECRET_KEY,algorithms=ALGORITHM)
-        username = payload.get("sub")
-        user_id = payload.get("id")
-        if username is None or user_id is None:
-            return None
-        return DecodedToken(username=username,user_id=user_id)
     except JWTError:
-        raise JWTError
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail="Could not validate credentials",headers={"WWW-Authenticate":"Bearer"})
+    username = payload.get("sub")
+    user_id = payload.get("id")
+    if username is None or user_id is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,detail="Could not validate credentials",headers={"WWW-Authenticate":"Bearer"})
+    user = DecodedToken(username=username,user_id=user_id)
+    if TOKEN_CACHE_ENABLED and payload.get("exp") is not None:
+        token_cache.set(key,user,expires_at=payload["exp"])
+    return user
+
+def invalidate_token(token :str):
+    """トークンを無効にする
+
+    ログアウト時に呼び出します。検証済みトークンのキャッシュから削除し、
+    トークンの有効期限（exp）まで revoked_tokens に記録して、以降のリクエストでは401にします。
+    不正・期限切れのトークンはもともと拒否されるため記録しません。
+
+    Args:
+        token: JWTアクセストークン
+    """
+    key = _token_key(token)
+    token_cache.delete(key)
+    if revoked_tokens is None:
+        return
+    try:
+        exp = jwt.decode(token,SECRET_KEY,algorithms=ALGORITHM).get("exp")
+    except JWTError:
+        return
+    if exp is not None:
+        revoked_tokens.set(key,b"1",expires_at=exp)
+
+
+def _utcnow():
+    """現在のUTC日時（DBのDateTime列と比較するためタイムゾーンなし）"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def hash_refresh_token(token :str):
+    """リフレッシュトークンの保存・検索用のHMAC-SHA256（16進数）
+
+    トークンは十分に長い乱数のため、パスワードのような反復ハッシュは不要です。
+    """
+    return hmac.new((SECRET_KEY or "").encode(),token.encode(),hashlib.sha256).hexdigest()
+
+def _add_refresh_token(db :Session,user_id :int,family_id :str,now :datetime):
+    """リフレッシュトークンを生成してINSERT（commitは呼び出し側）"""
+    token = secrets.token_urlsafe(32)
+    db.execute(insert(RefreshToken).values(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_DAYS),
+    ))
+    return token
+
+def create_refresh_token(user_id :int,db :Session):
+    """ログイン時に新しいリフレッシュトークンを発行
+
+    ユーザーの期限切れのトークンもあわせて削除します。
+
+    Args:
+        user_id: ユーザーID
+        db: データベースセッション
+
+    Returns:
+        str: リフレッシュトークン（保存するのはHMACの値のみ）
+    """
+    now = _utcnow()
+    db.execute(sql_delete(RefreshToken).where(RefreshToken.user_id == user_id,RefreshToken.expires_at <= now))
+    token = _add_refresh_token(db,user_id,secrets.token_hex(16),now)
+    db.commit()
+    return token
+
+def rotate_refresh_token(refresh_token :str,db :Session):
+    """リフレッシュトークンを検証し、新しいトークンに交換
+
+    パスワードの検証は行わず、トークンのHMACでインデックスを検索します。
+    使用したトークンは無効にし、同じログイン（family_id）の新しいトークンを発行します。
+    無効にしたトークンが REFRESH_REUSE_GRACE_SECONDS を過ぎて再び使われた場合は、
+    盗用とみなして同じログインのトークンを全て無効にします。
+
+    Args:
+        refresh_token: リフレッシュトークン
+        db: データベースセッション
+
+    Returns:
+        tuple[DecodedToken, str]: ユーザー情報と新しいリフレッシュトークン
+        None: トークンが不正・期限切れ・無効の場合
+    """
+    now = _utcnow()
+    row = db.execute(
+        select(RefreshToken.id,RefreshToken.user_id,RefreshToken.family_id,RefreshToken.expires_at,RefreshToken.revoked_at,User.username)
+        .join(User,User.id == RefreshToken.user_id)
+        .where(RefreshToken.token_hash == hash_refresh_token(refresh_token))
+    ).first()
+    if row is None:
+        return None
+    if row.revoked_at is not None:
+        if now - row.revoked_at > timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS):
+            _revoke_family(db,row.family_id,now)
+            db.commit()
+        return None
+    if row.expires_at <= now:
+        return None
+    # 同じトークンでの同時リクエストは、revoked_atを設定できた1つだけを有効にする
+    result = db.execute(
+        sql_update(RefreshToken)
+        .where(RefreshToken.id == row.id,RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        return None
+    token = _add_refresh_token(db,row.user_id,row.family_id,now)
+    db.commit()
+    return DecodedToken(username=row.username,user_id=row.user_id),token
+
+def _revoke_family(db :Session,family_id,now :datetime):
+    """同じログインの有効なリフレッシュトークンを全て無効にする（commitは呼び出し側）"""
+    return db.execute(
+        sql_update(RefreshToken)
+        .where(RefreshToken.family_id == family_id,RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    ).rowcount
+
+def revoke_refresh_token(refresh_token :str,db :Session):
+    """ログアウト時に、リフレッシュトークンと同じログインのトークンを全て無効にする
+
+    Args:
+        refresh_token: リフレッシュトークン
+        db: データベースセッション
+
+    Returns:
+        bool: 無効にしたトークンがあればTrue
+    """
+    family_id = select(RefreshToken.family_id).where(RefreshToken.token_hash == hash_refresh_token(refresh_token)).scalar_subquery()
+    revoked = _revoke_family(db,family_id,_utcnow())
+    db.commit()
+    return revoked > 0
@@ -1,8 +1,99 @@
 from sqlalchemy.orm import Session
-from models import Item,User
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select,insert,update as sql_update,delete as sql_delete,or_,and_,table,column,func,case,except_
+from models import Item,User,TaskTombstone,UserTaskSummary,UserTaskDueCount
 from typing import Optional
-from datetime import timedelta,date
-from schemas import ItemCreate, ItemUpdate
+from datetime import timedelta,date,datetime,timezone
+from schemas import ItemCreate, ItemUpdate, ItemResponse, ItemChange
+from pydantic import TypeAdapter
+from database import run_db
+from cache import create_cache,SingleFlight
+from events import EventBroker,format_event
+import fast_json
+import base64
+import json
+import os
+
+# 並び替えに使える列
+SORT_COLUMNS = {"id":Item.id,"due_date":Item.due_date,"title":Item.title}
+
+# ユーザーごとのタスク一覧（シリアライズ済みJSON）のキャッシュ
+# TASK_CACHE: memory（インプロセスLRU）/ redis（REDIS_URL）/ off
+task_list_cache = create_cache(
+    os.getenv("TASK_CACHE","memory"),
+    maxsize=int(os.getenv("TASK_CACHE_SIZE","1024")),
+    ttl=float(os.getenv("TASK_CACHE_TTL","60")),
+    maxbytes=int(os.getenv("TASK_CACHE_MAX_BYTES",str(64 * 1024 * 1024))),
+    prefix="tasks:",
+)
+_task_list_loads = SingleFlight()
+
+# タスク変更の通知（GET /tasks/events の購読へ配信するプロセス内 pub/sub）
+task_events = EventBroker(
+    queue_size=int(os.getenv("TASK_EVENTS_QUEUE_SIZE","64")),
+    heartbeat_seconds=float(os.getenv("TASK_EVENTS_HEARTBEAT","15")),
+)
+
+# 更新・削除を UPDATE/DELETE ... RETURNING の1文で行うか（off: 常にSELECTしてからORMで更新・削除）
+# RETURNING に対応していないデータベース（SQLite 3.35未満など）では設定に関係なくSELECTしてから実行します
+WRITE_RETURNING_ENABLED = os.getenv("TASK_WRITE_RETURNING","on").lower() != "off"
+
+# タスク数の集計（GET /tasks/summary）に集計表を使うか（table: トリガーで更新する集計表 / query: tasks を GROUP BY で集計）
+# 集計表のトリガーはSQLiteのみのため、その他のデータベースでは設定に関係なく GROUP BY で集計します
+SUMMARY_TABLE_ENABLED = os.getenv("TASK_SUMMARY","table").lower() != "query"
+
+# 全文検索の仮想テーブル（models.TASKS_FTS_DDL で作成）
+tasks_fts = table("tasks_fts",column("rowid"),column("rank"),column("tasks_fts"))
+ItemListAdapter = TypeAdapter(list[ItemResponse])
+
+# タスク一覧のJSONを列の値から直接作成するか（on: ItemResponseでの検証を省いて高速化 / off: 検証してから変換）
+FAST_JSON_ENABLED = os.getenv("TASK_FAST_JSON","off").lower() == "on"
+# ItemResponse のフィールド順に並べた列（高速化時はこの列だけをSELECTする）
+ITEM_FIELDS = tuple(ItemResponse.model_fields)
+ITEM_COLUMNS = tuple(Item.__table__.c[name] for name in ITEM_FIELDS)
+# 差分同期（GET /tasks/changes）で返す列
+CHANGE_COLUMNS = (*ITEM_COLUMNS,Item.__table__.c.revision,Item.__table__.c.updated_at)
+
+def touch(db :Session,user_id :int):
+    """ユーザーのタスク変更番号を1つ進める
+
+    タスクを変更する処理から、同じトランザクション内で、タスクを書き込む前に呼び出します。
+    変更番号はETagに使われ、変更があったことをクライアントに知らせます。
+    進めた後の変更番号は、書き込むタスクの revision（削除の場合は削除記録の revision）になります。
+    usersの行を先に更新して行ロックを取るため、同じユーザーの書き込みは変更番号の順に確定します。
+
+    Args:
+        db: データベースセッション
+        user_id: タスクを変更したユーザーID
+
+    Returns:
+        tuple: (進めた後の変更番号, 変更日時(UTC))
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    stmt = (
+        sql_update(User).where(User.id == user_id)
+        .values(task_version=User.task_version + 1,tasks_modified_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        return db.execute(stmt.returning(User.task_version)).scalar(),now
+    db.execute(stmt)
+    return db.query(User.task_version).filter(User.id == user_id).scalar(),now
+
+def get_version(db :Session,user_id :int):
+    """ユーザーのタスク変更番号と最終変更日時を取得
+
+    Args:
+        db: データベースセッション
+        user_id: 対象のユーザーID
+
+    Returns:
+        tuple: (変更番号, 最終変更日時(UTC) または None)
+    """
+    row = db.query(User.task_version,User.tasks_modified_at).filter(User.id == user_id).first()
+    if row is None:
+        return 0,None
+    return row.task_version,row.tasks_modified_at
 
 def find_all(db :Session,user_id :int):
     """ユーザーの全タスクを取得
@@ -14,39 +105,410 @@ def find_all(db :Session,user_id :int):
         user_id: 取得対象のユーザーID
         
     Returns:
-        list[Item]: タスクのリスト（空の場合は空リスト）
+        list[Item]: タスクのリスト（id順、空の場合は空リスト）
+    """
+    return db.query(Item).filter(Item.user_id == user_id).order_by(Item.id).all()
+
+def encode_cursor(item :Item,order :str):
+    """次ページ取得用のカーソルを作成
+
+    並び替え列の値とidの組をJSONにし、URLセーフなBase64文字列にします。
+
+    Args:
+        item: ページ内の最後のタスク
+        order: 並び替え列（"id" / "due_date" / "title"）
+
+    Returns:
+        str: カーソル文字列
+    """
+    value = getattr(item,order)
+    if isinstance(value,date):
+        value = value.isoformat()
+    raw = json.dumps([value,item.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor :str,order :str):
+    """カーソルを並び替え列の値とidに復元
+
+    Args:
+        cursor: encode_cursorで作成したカーソル文字列
+        order: 並び替え列（"id" / "due_date" / "title"）
+
+    Returns:
+        tuple: (並び替え列の値, id)
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    try:
+        value,last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError,TypeError):
+        raise ValueError("invalid cursor")
+    if not isinstance(last_id,int):
+        raise ValueError("invalid cursor")
+    if order == "title" and not isinstance(value,str):
+        raise ValueError("invalid cursor")
+    if order == "due_date" and value is not None:
+        if not isinstance(value,str):
+            raise ValueError("invalid cursor")
+        try:
+            value = date.fromisoformat(value)
+        except (TypeError,ValueError):
+            raise ValueError("invalid cursor")
+    return value,last_id
+
+def escape_like(value :str):
+    """LIKE検索のワイルドカード（% _）とエスケープ文字をエスケープ"""
+    return value.replace("\\","\\\\").replace("%","\\%").replace("_","\\_")
+
+def build_query(user_id :int,order :str = "id",direction :str = "asc",completed :Optional[bool] = None,due_after :Optional[date] = None,due_before :Optional[date] = None,q :Optional[str] = None):
+    """絞り込み・並び替え条件からタスク取得のSELECT文を作成
+
+    条件は全てSQLのWHERE / ORDER BYに変換し、(user_id, ...) の複合インデックスで
+    対象ユーザーの行だけを辿るようにします。
+
+    Args:
+        user_id: 取得対象のユーザーID
+        order: 並び替え列（"id" / "due_date" / "title"）
+        direction: 並び順（"asc" / "desc"）。同じ値の行はidで同じ向きに並べる
+        completed: 完了状態で絞り込む（Noneの場合は絞り込まない）
+        due_after: この日以降が期限のタスクに絞り込む
+        due_before: この日以前が期限のタスクに絞り込む
+        q: タイトルまたは内容に含まれる文字列（部分一致）
+
+    Returns:
+        Select: タスクのSELECT文
+    """
+    stmt = select(Item).where(Item.user_id == user_id)
+    if completed is not None:
+        stmt = stmt.where(Item.completed == completed)
+    if due_after is not None:
+        stmt = stmt.where(Item.due_date >= due_after)
+    if due_before is not None:
+        stmt = stmt.where(Item.due_date <= due_before)
+    if q:
+        pattern = f"%{escape_like(q)}%"
+        stmt = stmt.where(or_(Item.title.like(pattern,escape="\\"),Item.content.like(pattern,escape="\\")))
+    column = SORT_COLUMNS[order]
+    if order == "id":
+        keys = [column]
+    else:
+        keys = [column,Item.id]
+    if direction == "desc":
+        keys = [key.desc() for key in keys]
+    return stmt.order_by(*keys)
+
+def find_filtered(db :Session,user_id :int,order :str = "id",direction :str = "asc",**filters):
+    """条件に一致するユーザーのタスクを全て取得
+
+    Args:
+        db: データベースセッション
+        user_id: 取得対象のユーザーID
+        order: 並び替え列（"id" / "due_date" / "title"）
+        direction: 並び順（"asc" / "desc"）
+        **filters: build_query の絞り込み条件（completed, due_after, due_before, q）
+
+    Returns:
+        list[Item]: 条件に一致するタスクのリスト
+    """
+    return db.scalars(build_query(user_id,order,direction,**filters)).all()
+
+def find_filtered_json(db :Session,user_id :int,order :str = "id",direction :str = "asc",**filters):
+    """条件に一致するユーザーのタスクを全て取得し、JSON（bytes）で返す
+
+    ORMオブジェクトを作らずに ItemResponse の列だけをSELECTし、行から直接JSONを作成します。
+
+    Args:
+        db: データベースセッション
+        user_id: 取得対象のユーザーID
+        order: 並び替え列（"id" / "due_date" / "title"）
+        direction: 並び順（"asc" / "desc"）
+        **filters: build_query の絞り込み条件（completed, due_after, due_before, q）
+
+    Returns:
+        bytes: list[ItemResponse] と同じ形式のJSON
+    """
+    rows = db.execute(build_query(user_id,order,direction,**filters).with_only_columns(*ITEM_COLUMNS)).all()
+    return fast_json.dump_rows(rows,ITEM_FIELDS)
+
+def _after_cursor(order :str,direction :str,value,last_id :int):
+    """カーソルより後ろの行を表す条件を作成
+
+    SQLiteではNULLが最小値として扱われるため、昇順では先頭、降順では末尾に並びます。
+    """
+    column = SORT_COLUMNS[order]
+    if direction == "asc":
+        if order == "id":
+            return Item.id > last_id
+        if value is None:
+            return or_(and_(column.is_(None),Item.id > last_id),column.is_not(None))
+        return or_(column > value,and_(column == value,Item.id > last_id))
+    if order == "id":
+        return Item.id < last_id
+    if value is None:
+        return and_(column.is_(None),Item.id < last_id)
+    return or_(column < value,and_(column == value,Item.id < last_id),column.is_(None))
+
+def find_page(db :Session,user_id :int,limit :int,after :Optional[str] = None,order :str = "id",direction :str = "asc",rows :bool = False,**filters):
+    """ユーザーのタスクをカーソルページングで取得
+
+    (並び替え列, id) の組をキーにしたキーセットページングで、
+    afterより後ろのタスクをlimit件取得します。OFFSETを使わないため、
+    何ページ目でも (user_id, 並び替え列) のインデックスを辿るだけで済みます。
+    SQLiteではNULLが先頭に並ぶため、昇順では期限日なしのタスクが最初に返ります。
+
+    Args:
+        db: データベースセッション
+        user_id: 取得対象のユーザーID
+        limit: 1ページの件数
+        after: 前ページのnext_cursor（Noneの場合は先頭から）
+        order: 並び替え列（"id" / "due_date" / "title"）
+        direction: 並び順（"asc" / "desc"）
+        rows: Trueの場合、Itemの代わりに ITEM_COLUMNS の値の行を返す
+        **filters: build_query の絞り込み条件（completed, due_after, due_before, q）
+
+    Returns:
+        tuple: (list[Item], 次ページのカーソル または None)
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    stmt = build_query(user_id,order,direction,**filters)
+    if after is not None:
+        value,last_id = decode_cursor(after,order)
+        stmt = stmt.where(_after_cursor(order,direction,value,last_id))
+    stmt = stmt.limit(limit + 1)
+    if rows:
+        items = db.execute(stmt.with_only_columns(*ITEM_COLUMNS)).all()
+    else:
+        items = db.scalars(stmt).all()
+    if len(items) <= limit:
+        return items,None
+    items = items[:limit]
+    return items,encode_cursor(items[-1],order)
+
+def find_page_json(db :Session,user_id :int,limit :int,after :Optional[str] = None,order :str = "id",direction :str = "asc",**filters):
+    """find_page の結果を ItemPage と同じ形式のJSON（bytes）で返す
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    items,next_cursor = find_page(db,user_id,limit,after,order,direction,rows=True,**filters)
+    return fast_json.dumps({"items":[dict(zip(ITEM_FIELDS,row)) for row in items],"next_cursor":next_cursor})
+
+def iter_all(db :Session,user_id :int,batch_size :int = 500,order :str = "id",direction :str = "asc",rows :bool = False,**filters):
+    """ユーザーのタスクを少しずつ取得するイテレータ
+
+    yield_perで結果をbatch_size件ずつDBカーソルから読み出すため、
+    全件をメモリに載せずに先頭から順に処理できます。
+
+    Args:
+        db: データベースセッション
+        user_id: 取得対象のユーザーID
+        batch_size: 1回にDBから読み出す件数
+        order: 並び替え列（"id" / "due_date" / "title"）
+        direction: 並び順（"asc" / "desc"）
+        rows: Trueの場合、Itemの代わりに ITEM_COLUMNS の値の行を返す
+        **filters: build_query の絞り込み条件（completed, due_after, due_before, q）
+
+    Yields:
+        Item: タスク
+    """
+    stmt = build_query(user_id,order,direction,**filters).execution_options(yield_per=batch_size)
+    if rows:
+        yield from db.execute(stmt.with_only_columns(*ITEM_COLUMNS))
+        return
+    for item in db.scalars(stmt):
+        yield item
+
+async def aiter_all(db :AsyncSession,user_id :int,batch_size :int = 500,order :str = "id",direction :str = "asc",rows :bool = False,**filters):
+    """iter_all の非同期版（AsyncSession用）
+
+    Args:
+        db: 非同期データベースセッション
+        user_id: 取得対象のユーザーID
+        batch_size: 1回にDBから読み出す件数
+        order: 並び替え列（"id" / "due_date" / "title"）
+        direction: 並び順（"asc" / "desc"）
+        rows: Trueの場合、Itemの代わりに ITEM_COLUMNS の値の行を返す
+        **filters: build_query の絞り込み条件（completed, due_after, due_before, q）
+
+    Yields:
+        Item: タスク
+    """
+    stmt = build_query(user_id,order,direction,**filters).execution_options(yield_per=batch_size)
+    if rows:
+        result = await db.stream(stmt.with_only_columns(*ITEM_COLUMNS))
+    else:
+        result = await db.stream_scalars(stmt)
+    async for item in result:
+        yield item
+
+# 全文検索（trigram）で検索できる語の最小文字数（これより短い語を含む検索は部分一致（LIKE）で行う）
+FTS_MIN_TERM_LENGTH = 3
+
+def search_terms(q :str):
+    """検索文字列を空白区切りの語のリストにする（語の末尾の * は除く）"""
+    return [word.rstrip("*") for word in q.split() if word.rstrip("*")]
+
+def to_fts_query(terms :list[str],user_id :int):
+    """検索する語をFTS5のクエリに変換
+
+    語を全て含むタスク（AND検索）を対象にします。
+    trigram の索引のため、各語はタイトル・内容のどこに含まれていても一致します（部分一致）。
+    各語は "" で囲んでFTS5の演算子として解釈されないようにします。
+
+    Args:
+        terms: search_terms で分けた語（FTS_MIN_TERM_LENGTH 文字以上）
+        user_id: 検索対象のユーザーID
+
+    Returns:
+        str: FTS5のクエリ
+    """
+    phrases = " ".join('"' + term.replace('"','""') + '"' for term in terms)
+    return f'owner : "<{int(user_id)}>" AND {{title content}} : ({phrases})'
+
+def search(db :Session,user_id :int,q :str,limit :int = 50):
+    """タイトル・内容の全文検索
+
+    FTS5の索引（tasks_fts）でユーザーのタスクを検索し、一致度の高い順に返します。
+    タスクの行は一致したものだけを主キーで読み込むため、タスク全体を走査しません。
+    trigram の索引では FTS_MIN_TERM_LENGTH 文字未満の語を検索できないため、
+    短い語を含む場合とSQLite以外のデータベースでは、ユーザーのタスクの部分一致（LIKE）で代用します（id順）。
+
+    Args:
+        db: データベースセッション
+        user_id: 検索対象のユーザーID
+        q: 検索文字列（空白区切りでAND検索、各語は部分一致）
+        limit: 最大件数
+
+    Returns:
+        list[Item]: 一致したタスクのリスト（一致度順）
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+    if db.get_bind().dialect.name != "sqlite" or min(len(term) for term in terms) < FTS_MIN_TERM_LENGTH:
+        stmt = select(Item).where(Item.user_id == user_id)
+        for term in terms:
+            pattern = f"%{escape_like(term)}%"
+            stmt = stmt.where(or_(Item.title.like(pattern,escape="\\"),Item.content.like(pattern,escape="\\")))
+        return db.scalars(stmt.order_by(Item.id).limit(limit)).all()
+    stmt = (
+        select(Item)
+        .join(tasks_fts,tasks_fts.c.rowid == Item.id)
+        .where(tasks_fts.c.tasks_fts.match(to_fts_query(terms,user_id)))
+        .where(Item.user_id == user_id)
+        .order_by(tasks_fts.c.rank)
+        .limit(limit)
+    )
+    return db.scalars(stmt).all()
+
+def invalidate_cache(user_id :int):
+    """ユーザーのタスク一覧キャッシュを破棄（タスクを変更したcommitの後に呼び出す）"""
+    if task_list_cache is not None:
+        task_list_cache.delete(str(user_id))
+
+def change_event(revision :int,items :list = (),deleted :list[int] = (),cursor :Optional[str] = None):
+    """変更の通知（SSEの tasks イベント）を作成
+
+    Args:
+        revision: 変更番号（イベントID）
+        items: 作成・更新したタスク（Item または列名をキーにした辞書）
+        deleted: 削除したタスクのid
+        cursor: イベントIDにする差分同期のカーソル（変更番号の途中までの場合、Noneの場合は変更番号）
+
+    Returns:
+        bytes: イベントのバイト列
+    """
+    data = {
+        "revision":revision,
+        "items":[ItemChange.model_validate(item).model_dump(mode="json") for item in items],
+        "deleted":list(deleted),
+    }
+    return format_event(data,event="tasks",id=revision if cursor is None else cursor)
+
+def notify(user_id :int,revision :int,items :list = (),deleted :list[int] = ()):
+    """変更をユーザーの購読に通知（タスクを変更したcommitの後に呼び出す、購読がない場合は何もしない）"""
+    if task_events.has_subscribers(user_id):
+        task_events.publish(user_id,revision,change_event(revision,items,deleted))
+
+async def find_all_json(db :Session,user_id :int,version :int):
+    """ユーザーの全タスクをJSON（bytes）で取得
+
+    シリアライズ済みの一覧を変更番号と一緒にキャッシュし、変更番号が一致する間は
+    DBを読まずに返します。キャッシュミスが同時に発生しても、同じユーザーの
+    DB読み込みは1回だけ実行し、他のリクエストはその結果を共有します。
+
+    Args:
+        db: データベースセッション（Session または AsyncSession）
+        user_id: 取得対象のユーザーID
+        version: ユーザーの現在のタスク変更番号（get_version）
+
+    Returns:
+        bytes: list[ItemResponse] 形式のJSON
     """
-    return db.query(Item).filter(Item.user_id == user_id).all()
+    key = str(user_id)
+    prefix = f"{version}\n".encode()
+    if task_list_cache is not None:
+        cached = task_list_cache.get(key)
+        if cached is not None and cached.startswith(prefix):
+            return cached[len(prefix):]
+
+    async def load():
+        if FAST_JSON_ENABLED:
+            body = await run_db(db,find_filtered_json,user_id=user_id)
+        else:
+            items = await run_db(db,find_all,user_id=user_id)
+            body = ItemListAdapter.dump_json(ItemListAdapter.validate_python(items,from_attributes=True))
+        if task_list_cache is not None:
+            task_list_cache.set(key,prefix + body)
+        return body
+
+    return await _task_list_loads.do((user_id,version),load)
+
+def due_range(due_date :date,end :Optional[int]):
+    """期限日の検索範囲を求める
+
+    Args:
+        due_date: 検索開始日
+        end: 検索終了日までの日数（Noneの場合は開始日のみ）
 
-def find_by_due(db :Session,due_date :str,end :Optional[int]):
+    Returns:
+        tuple: (検索開始日, 検索終了日)
+    """
+    if end is None:
+        return due_date,due_date
+    return due_date,due_date + timedelta(days=end)
+
+def find_by_due(db :Session,user_id :int,due_date :str,end :Optional[int]):
     """期限日範囲でタスクを検索
     
     due_dateをdate型に変換し、endが指定されていれば範囲検索、
     指定されていなければ完全一致でフィルタリングします。
+    (user_id, due_date) のインデックスで対象ユーザーの範囲だけを読み込むため、
+    他のユーザーのタスク件数に関係なく、自分のタスクの件数分のコストで済みます。
     
     Args:
         db: データベースセッション
+        user_id: 検索対象のユーザーID
         due_date: 検索開始日（YYYY-MM-DD形式の文字列）
         end: 検索終了日までの日数（Noneの場合は完全一致）
         
     Returns:
-        list[Item]: 検索条件に一致するタスクのリスト
+        list[Item]: 検索条件に一致するタスクのリスト（期限日順）
         None: タスクが見つからない場合
         
     Raises:
         ValueError: due_dateの形式が不正な場合
     """
-    from_dt = date.fromisoformat(due_date)
-    if end is None:
-        found_items = db.query(Item).filter(Item.due_date == from_dt).all()
-    else: 
-        to_dt = from_dt +timedelta(days=end)
-        found_items = db.query(Item).filter(Item.due_date.between(from_dt,to_dt)).order_by(Item.due_date).all()
+    from_dt,to_dt = due_range(date.fromisoformat(due_date),end)
+    found_items = find_filtered(db,user_id,order="due_date",due_after=from_dt,due_before=to_dt)
     if not found_items:
         return None
     return found_items
 
-def find_by_due_fromtoday(db :Session,end :Optional[int] ):
+def find_by_due_fromtoday(db :Session,user_id :int,end :Optional[int] ):
     """今日から期限日範囲でタスクを検索
     
     検索日当日の日付で、endが指定されていれば範囲検索、
@@ -54,23 +516,236 @@ def find_by_due_fromtoday(db :Session,end :Optional[int] ):
     
     Args:
         db: データベースセッション
+        user_id: 検索対象のユーザーID
         end: 検索終了日までの日数（Noneの場合は完全一致）
         
     Returns:
-        list[Item]: 検索条件に一致するタスクのリスト
+        list[Item]: 検索条件に一致するタスクのリスト（期限日順）
         None: タスクが見つからない場合
         
     """
-    today = date.today()
-    if end is None:
-        found_items = db.query(Item).filter(Item.due_date == today).all()
+    return find_by_due(db,user_id,date.today().isoformat(),end)
+
+def use_summary_table(db :Session):
+    """タスク数を集計表（models.TASK_SUMMARY_DDL のトリガーで更新）から取得できるか"""
+    return SUMMARY_TABLE_ENABLED and db.get_bind().dialect.name == "sqlite"
+
+def _due_columns(due_date,open_count,today :date,end :date):
+    """期限日と未完了数の列から、期限切れ・今日が期限・end までが期限の未完了数を集計する列"""
+    def total(condition):
+        return func.coalesce(func.sum(case((condition,open_count),else_=0)),0)
+    return (
+        total(due_date < today).label("overdue"),
+        total(due_date == today).label("due_today"),
+        total(and_(due_date >= today,due_date <= end)).label("due_within"),
+    )
+
+def summary(db :Session,user_id :int,days :int = 7,today :Optional[date] = None,from_tasks :bool = False):
+    """タスク数の集計
+
+    集計表を使う場合は、task_summaries の主キー検索と task_due_counts のユーザー・期限日の範囲検索の1文で、
+    タスクの件数ではなく（未完了タスクのある）期限日の数に比例するコストで集計します。
+    集計表を使えない場合は tasks を GROUP BY で集計します（ユーザーのタスク件数に比例）。
+
+    Args:
+        db: データベースセッション
+        user_id: 集計対象のユーザーID
+        days: due_within に含める今日からの日数
+        today: 基準日（Noneの場合は今日）
+        from_tasks: Trueの場合は集計表を使わず tasks から集計
+
+    Returns:
+        dict: total, completed, open, overdue, due_today, due_within, days
+    """
+    today = today or date.today()
+    end = today + timedelta(days=days)
+    if use_summary_table(db) and not from_tasks:
+        statement = select(
+            select(UserTaskSummary.total).where(UserTaskSummary.user_id == user_id).scalar_subquery().label("total"),
+            select(UserTaskSummary.completed).where(UserTaskSummary.user_id == user_id).scalar_subquery().label("completed"),
+            *_due_columns(UserTaskDueCount.due_date,UserTaskDueCount.open_count,today,end),
+        ).where(UserTaskDueCount.user_id == user_id,UserTaskDueCount.due_date <= end)
     else:
-        to_dt = today + timedelta(days=end)
-        found_items = db.query(Item).filter(Item.due_date.between(today,to_dt)).order_by(Item.due_date).all()
-    
-    if not found_items:
-        return None
-    return found_items
+        is_open = or_(Item.completed.is_(None),Item.completed == False)
+        statement = select(
+            func.count().label("total"),
+            func.coalesce(func.sum(case((is_open,0),else_=1)),0).label("completed"),
+            *_due_columns(Item.due_date,case((is_open,1),else_=0),today,end),
+        ).where(Item.user_id == user_id)
+    row = db.execute(statement).one()
+    total = row.total or 0
+    completed = row.completed or 0
+    return {
+        "total":total,
+        "completed":completed,
+        "open":total - completed,
+        "overdue":row.overdue,
+        "due_today":row.due_today,
+        "due_within":row.due_within,
+        "days":days,
+    }
+
+def _summary_sources():
+    """tasks を GROUP BY で集計した、集計表と同じ列のSELECT（集計表の検査・作り直し用）"""
+    totals = (
+        select(Item.user_id,func.count().label("total"),func.sum(case((Item.completed == True,1),else_=0)).label("completed"))
+        .group_by(Item.user_id)
+    )
+    due_counts = (
+        select(Item.user_id,Item.due_date,func.count().label("open_count"))
+        .where(Item.due_date.is_not(None),or_(Item.completed.is_(None),Item.completed == False))
+        .group_by(Item.user_id,Item.due_date)
+    )
+    return totals,due_counts
+
+def find_summary_drift(db :Session):
+    """集計表と tasks の内容が一致しないユーザーを検査
+
+    tasks を GROUP BY で集計した結果と集計表を EXCEPT で比較します（全タスクを読み込むため、定期的な検査用）。
+
+    Args:
+        db: データベースセッション
+
+    Returns:
+        list[int]: 集計表が一致しないユーザーIDのリスト（昇順）
+    """
+    totals,due_counts = _summary_sources()
+    stored_totals = select(UserTaskSummary.user_id,UserTaskSummary.total,UserTaskSummary.completed).where(UserTaskSummary.total != 0)
+    stored_due_counts = select(UserTaskDueCount.user_id,UserTaskDueCount.due_date,UserTaskDueCount.open_count)
+    user_ids = set()
+    for expected,stored in ((totals,stored_totals),(due_counts,stored_due_counts)):
+        for difference in (except_(expected,stored),except_(stored,expected)):
+            user_ids.update(db.execute(select(difference.subquery().c.user_id)).scalars())
+    return sorted(user_ids)
+
+def rebuild_summary(db :Session,user_ids :Optional[list[int]] = None):
+    """tasks から集計表を作り直す
+
+    Args:
+        db: データベースセッション
+        user_ids: 作り直すユーザーIDのリスト（Noneの場合は全ユーザー）
+    """
+    totals,due_counts = _summary_sources()
+    delete_totals = sql_delete(UserTaskSummary)
+    delete_due_counts = sql_delete(UserTaskDueCount)
+    if user_ids is not None:
+        totals = totals.where(Item.user_id.in_(user_ids))
+        due_counts = due_counts.where(Item.user_id.in_(user_ids))
+        delete_totals = delete_totals.where(UserTaskSummary.user_id.in_(user_ids))
+        delete_due_counts = delete_due_counts.where(UserTaskDueCount.user_id.in_(user_ids))
+    db.execute(delete_totals)
+    db.execute(delete_due_counts)
+    db.execute(insert(UserTaskSummary).from_select(["user_id","total","completed"],totals))
+    db.execute(insert(UserTaskDueCount).from_select(["user_id","due_date","open_count"],due_counts))
+    db.commit()
+
+def add_tombstones(db :Session,user_id :int,task_ids :list[int],revision :int,deleted_at :datetime):
+    """削除したタスクの記録を追加
+
+    タスクを削除する処理から、同じトランザクション内（commit前）で呼び出します。
+
+    Args:
+        db: データベースセッション
+        user_id: タスクを削除したユーザーID
+        task_ids: 削除したタスクのidのリスト
+        revision: touch で進めた後の変更番号
+        deleted_at: 削除日時(UTC)
+    """
+    db.execute(insert(TaskTombstone),[
+        {"user_id":user_id,"task_id":task_id,"revision":revision,"deleted_at":deleted_at}
+        for task_id in task_ids
+    ])
+
+def decode_change_cursor(cursor :str):
+    """差分同期のカーソルを復元
+
+    カーソルは変更番号だけ（その変更番号までの変更を全て受け取った）か、
+    "変更番号:削除記録のid:タスクのid"（その変更番号の変更をそれぞれのidまで受け取った）の形式です。
+
+    Args:
+        cursor: find_changes が返したカーソル文字列（または変更番号）
+
+    Returns:
+        tuple: (変更番号, 削除記録のid, タスクのid)（変更番号だけの場合、idはNone）
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    parts = str(cursor).split(":")
+    if len(parts) not in (1,3) or not all(part.isdigit() for part in parts):
+        raise ValueError("invalid cursor")
+    revision,*ids = [int(part) for part in parts]
+    if not ids:
+        return revision,None,None
+    if revision == 0:
+        raise ValueError("invalid cursor")
+    return revision,ids[0],ids[1]
+
+def synced_revision(cursor :str):
+    """カーソルの時点で全ての変更を受け取り終えた変更番号"""
+    revision,deleted_id,_ = decode_change_cursor(cursor)
+    return revision if deleted_id is None else revision - 1
+
+def find_changes(db :Session,user_id :int,since :str,limit :int = 1000):
+    """カーソル since より後に作成・更新・削除されたタスクを取得
+
+    tasks と削除記録をそれぞれ (revision, id) のキーセットで (user_id, revision) のインデックスから範囲検索し、
+    変更番号順（同じ変更番号の中では削除記録・タスクの順にid順）に最大 limit 件を返します。
+    一括作成・一括削除のように1つの変更番号の変更が limit 件を超える場合も、ページの途中で分けて返します。
+    クライアントは deleted のタスクを削除してから items のタスクを追加・上書きします
+    （削除したidが新しいタスクで再利用された場合も、削除より後の変更番号を持つため正しく反映されます）。
+
+    Args:
+        db: データベースセッション
+        user_id: 対象のユーザーID
+        since: クライアントが前回の同期で受け取ったカーソル（初回は"0"、変更番号のみも可）
+        limit: 1回で返す変更の最大件数
+
+    Returns:
+        tuple: (作成・更新されたタスクの辞書のリスト（変更番号順）, 削除されたタスクidのリスト,
+                続きがある場合は次のカーソル・全て返した場合はNone)
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    revision,deleted_id,item_id = decode_change_cursor(since)
+
+    def after(model,last_id):
+        if last_id is None:
+            return model.revision > revision
+        # revision >= ? でインデックスの範囲を絞り、同じ変更番号の中は id（インデックスに含まれる主キー）で続きから読む
+        return and_(model.revision >= revision,or_(model.revision > revision,model.id > last_id))
+
+    items = db.execute(
+        select(*CHANGE_COLUMNS).where(Item.user_id == user_id,after(Item,item_id))
+        .order_by(Item.revision,Item.id).limit(limit + 1)
+    ).mappings().all()
+    tombstones = db.execute(
+        select(TaskTombstone.id,TaskTombstone.task_id,TaskTombstone.revision)
+        .where(TaskTombstone.user_id == user_id,after(TaskTombstone,deleted_id))
+        .order_by(TaskTombstone.revision,TaskTombstone.id).limit(limit + 1)
+    ).all()
+    changes = sorted(
+        [(row.revision,0,row.id,row) for row in tombstones] + [(row["revision"],1,row["id"],row) for row in items],
+        key=lambda change:change[:3],
+    )
+    page,rest = changes[:limit],changes[limit:]
+    deleted = list(dict.fromkeys(row.task_id for _,kind,_,row in page if kind == 0))
+    result = [dict(row) for _,kind,_,row in page if kind == 1]
+    if not rest:
+        return result,deleted,None
+    last = page[-1][0]
+    if rest[0][0] > last: # 最後の変更番号の変更を全て返した
+        return result,deleted,str(last)
+    if last != revision or deleted_id is None:
+        deleted_id,item_id = 0,0
+    for change_revision,kind,id,_ in page:
+        if change_revision == last:
+            if kind == 0:
+                deleted_id = id
+            else:
+                item_id = id
+    return result,deleted,f"{last}:{deleted_id}:{item_id}"
 
 def find_by_id(id :int,db :Session,user_id :int):
     """idでタスクを検索
@@ -92,6 +767,26 @@ def find_by_id(id :int,db :Session,user_id :int):
         return None
     return found_item
 
+def find_by_ids(ids :list[int],db :Session,user_id :int):
+    """複数のidでタスクをまとめて検索
+
+    指定されたユーザーIDに紐づき、idsに含まれるタスクを1回のIN検索で取得します。
+
+    Args:
+        ids: タスクIDのリスト
+        db: データベースセッション
+        user_id: 取得対象のユーザーID
+
+    Returns:
+        list[Item]: 検索条件に一致するタスクのリスト（id順、見つからないidは含まない）
+    """
+    return db.query(Item).filter(Item.user_id == user_id).filter(Item.id.in_(set(ids))).order_by(Item.id).all()
+
+def use_returning(db :Session):
+    """更新・削除をRETURNING付きの1文で実行できるか"""
+    dialect = db.get_bind().dialect
+    return WRITE_RETURNING_ENABLED and dialect.update_returning and dialect.delete_returning
+
 def create(create_item :ItemCreate,db :Session,user_id :int):
     """新規タスクを作成
     
@@ -105,17 +800,44 @@ def create(create_item :ItemCreate,db :Session,user_id :int):
     Returns:
         Item: 新しく作成したタスク
     """
+    revision,now = touch(db,user_id)
     new_item= Item(
-        **create_item.model_dump(),user_id=user_id
+        **create_item.model_dump(),user_id=user_id,revision=revision,updated_at=now
     )
     db.add(new_item)
     db.commit()
+    invalidate_cache(user_id)
+    notify(user_id,revision,[new_item])
     return new_item
 
+def create_many(create_items :list[ItemCreate],db :Session,user_id :int):
+    """複数のタスクをまとめて作成
+
+    ORMオブジェクトを1件ずつ追加せず、1回のINSERT文（executemany）でまとめて追加します。
+
+    Args:
+        create_items: ItemCreateスキーマのリスト
+        db: データベースセッション
+        user_id: 作成対象のユーザーID
+
+    Returns:
+        list[dict]: 作成したタスク（列名をキーにした辞書）
+    """
+    revision,now = touch(db,user_id)
+    rows = [{**create_item.model_dump(),"user_id":user_id,"revision":revision,"updated_at":now} for create_item in create_items]
+    created = db.execute(insert(Item.__table__).returning(*Item.__table__.c),rows).mappings().all()
+    db.commit()
+    invalidate_cache(user_id)
+    created = [dict(row) for row in created]
+    notify(user_id,revision,created)
+    return created
+
 def update(update_item :ItemUpdate,id :int,db :Session,user_id :int):
     """タスクを更新
     
-    指定されたユーザーIDとidに紐づき、タスクをデータベースから取得し、送信されたフィールドのみ更新
+    指定されたユーザーIDとidに紐づくタスクの、送信されたフィールドのみ更新します。
+    RETURNINGに対応したデータベースでは UPDATE ... WHERE id=? AND user_id=? RETURNING の1文で
+    更新と更新後の値の取得を行い、対応していない場合はタスクを取得してからORMで更新します。
 
     Args:
         update_item: ItemUpdateスキーマ
@@ -124,24 +846,51 @@ def update(update_item :ItemUpdate,id :int,db :Session,user_id :int):
         user_id: 更新対象のユーザーID
         
     Returns:
-        Item: 更新したタスク
+        dict | Item: 更新したタスク
         None: タスクが見つからない場合
     """
+    values = update_item.model_dump(exclude_none=True)
+    if not values:
+        return find_by_id(id,db,user_id)
+    if not use_returning(db):
+        return _update_loaded(values,id,db,user_id)
+    revision,now = touch(db,user_id)
+    stmt = (
+        sql_update(Item.__table__)
+        .where(Item.id == id,Item.user_id == user_id)
+        .values(**values,revision=revision,updated_at=now)
+        .returning(*Item.__table__.c)
+    )
+    row = db.execute(stmt).mappings().first()
+    if row is None:
+        db.rollback()
+        return None
+    db.commit()
+    invalidate_cache(user_id)
+    updated = dict(row)
+    notify(user_id,revision,[updated])
+    return updated
+
+def _update_loaded(values :dict,id :int,db :Session,user_id :int):
+    """タスクを取得してからORMで更新（RETURNINGを使わない場合）"""
     item = find_by_id(id,db,user_id)
     if not item:
         return None
-    item.title = item.title if update_item.title is None else update_item.title
-    item.content = item.content if update_item.content is None else update_item.content
-    item.due_date = item.due_date if update_item.due_date is None else update_item.due_date
-    item.completed = item.completed if update_item.completed is None else update_item.completed
+    revision,now = touch(db,user_id)
+    for key,value in {**values,"revision":revision,"updated_at":now}.items():
+        setattr(item,key,value)
     db.add(item)
     db.commit()
+    invalidate_cache(user_id)
+    notify(user_id,revision,[item])
     return item
 
 def delete(id :int,db :Session,user_id :int):
     """タスクを削除
     
-    指定されたユーザーIDとidに紐づき、タスクをデータベースから取得し、データベースから削除
+    指定されたユーザーIDとidに紐づくタスクをデータベースから削除し、削除記録（task_tombstones）を残します。
+    RETURNINGに対応したデータベースでは DELETE ... WHERE id=? AND user_id=? RETURNING の1文で
+    削除と削除したタスクの取得を行い、対応していない場合はタスクを取得してからORMで削除します。
 
     Args:
         id: タスクのid
@@ -149,12 +898,68 @@ def delete(id :int,db :Session,user_id :int):
         user_id: 削除対象のユーザーID
         
     Returns:
-        Item: 削除したタスク
+        dict | Item: 削除したタスク
         None: タスクが見つからない場合
     """
+    if not use_returning(db):
+        return _delete_loaded(id,db,user_id)
+    revision,now = touch(db,user_id)
+    stmt = sql_delete(Item.__table__).where(Item.id == id,Item.user_id == user_id).returning(*Item.__table__.c)
+    row = db.execute(stmt).mappings().first()
+    if row is None:
+        db.rollback()
+        return None
+    add_tombstones(db,user_id,[id],revision,now)
+    db.commit()
+    invalidate_cache(user_id)
+    notify(user_id,revision,deleted=[id])
+    return dict(row)
+
+def _delete_loaded(id :int,db :Session,user_id :int):
+    """タスクを取得してからORMで削除（RETURNINGを使わない場合）"""
     item = find_by_id(id,db,user_id)
     if not item:
        return None
+    revision,now = touch(db,user_id)
     db.delete(item)
+    add_tombstones(db,user_id,[id],revision,now)
+    db.commit()
+    invalidate_cache(user_id)
+    notify(user_id,revision,deleted=[id])
+    return item
+
+def delete_many(ids :list[int],db :Session,user_id :int):
+    """複数のタスクをまとめて削除
+
+    指定されたユーザーIDに紐づくタスクのうち、idsに含まれるものを
+    1つのトランザクション内で1回のDELETE文で削除し、削除したタスクの削除記録を残します。
+    RETURNINGに対応したデータベースでは、削除したidもDELETE文から受け取ります。
+
+    Args:
+        ids: 削除対象のタスクIDのリスト
+        db: データベースセッション
+        user_id: 削除対象のユーザーID
+
+    Returns:
+        tuple: (削除したタスクIDのリスト, 見つからなかったタスクIDのリスト)
+    """
+    ids = list(dict.fromkeys(ids))
+    if use_returning(db):
+        revision,now = touch(db,user_id)
+        stmt = sql_delete(Item.__table__).where(Item.user_id == user_id,Item.id.in_(ids)).returning(Item.id)
+        found_ids = set(db.execute(stmt).scalars())
+    else:
+        found_ids = {row.id for row in db.query(Item.id).filter(Item.user_id == user_id).filter(Item.id.in_(ids))}
+        if found_ids:
+            revision,now = touch(db,user_id)
+            db.query(Item).filter(Item.user_id == user_id).filter(Item.id.in_(found_ids)).delete(synchronize_session=False)
+    deleted = [id for id in ids if id in found_ids]
+    not_found = [id for id in ids if id not in found_ids]
+    if not deleted:
+        db.rollback()
+        return deleted,not_found
+    add_tombstones(db,user_id,deleted,revision,now)
     db.commit()
-    return item
\ No newline at end of file
+    invalidate_cache(user_id)
+    notify(user_id,revision,deleted=deleted)
+    return deleted,not_found
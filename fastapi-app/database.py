@@ -2,35 +2,125 @@
 
 SQLAlchemyを使用したデータベース接続とセッション管理を定義するモジュール。
 FastAPIアプリケーション全体で使用するDB接続エンジン、セッション、ベースクラスを提供します。
+
+環境変数 DB_MODE で同期モード（sync）と非同期モード（async）を切り替えられます。
+非同期モードでは aiosqlite 経由の AsyncSession を使用し、DBアクセス中も
+イベントループをブロックしません。
 """
 
-from sqlalchemy import create_engine
+import os
+from dotenv import load_dotenv
+from sqlalchemy import create_engine,event
 from sqlalchemy.orm import sessionmaker,declarative_base
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession,async_sessionmaker,create_async_engine
+from metrics import instrument_engine
+from query_guard import watch_engine
+
+load_dotenv()
 
 # データベース接続URL（SQLiteファイルのパス）
-SQL_URL = "sqlite:///../database.db"
+SQL_URL = os.getenv("DATABASE_URL","sqlite:///../database.db")
+
+# DB接続モード（sync: 同期Session / async: AsyncSession）
+DB_MODE = os.getenv("DB_MODE","sync").lower()
+ASYNC_MODE = DB_MODE == "async"
+
+def to_async_url(url :str):
+  """同期用の接続URLを非同期ドライバ用のURLに変換
+
+  Args:
+      url: 同期ドライバの接続URL（例: sqlite:///../database.db）
+
+  Returns:
+      str: 非同期ドライバの接続URL（例: sqlite+aiosqlite:///../database.db）
+  """
+  if url.startswith("sqlite://"):
+    return url.replace("sqlite://","sqlite+aiosqlite://",1)
+  if url.startswith("postgresql://"):
+    return url.replace("postgresql://","postgresql+asyncpg://",1)
+  return url
+
+ASYNC_SQL_URL = os.getenv("ASYNC_DATABASE_URL",to_async_url(SQL_URL))
+
+# SQLiteの接続時に設定するPRAGMAのプロファイル（SQLITE_PROFILEで選択）
+# default: 外部キー制約（ondelete=CASCADE）のみ有効化
+# production: WALで読み書きを並行させ、ロック待ちをbusy_timeoutで吸収する設定
+SQLITE_PROFILES = {
+  "none":{},
+  "default":{
+    "foreign_keys":"ON",
+  },
+  "production":{
+    "journal_mode":"WAL",
+    "synchronous":"NORMAL",
+    "cache_size":os.getenv("SQLITE_CACHE_SIZE","-65536"),  # 負の値はKiB単位（64MiB）
+    "mmap_size":os.getenv("SQLITE_MMAP_SIZE","268435456"),  # 256MiB
+    "busy_timeout":os.getenv("SQLITE_BUSY_TIMEOUT","5000"), # ミリ秒
+    "temp_store":"MEMORY",
+    "foreign_keys":"ON",
+  },
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE","default").lower()
+
+def apply_sqlite_profile(engine,profile :str):
+  """SQLiteエンジンの接続ごとにプロファイルのPRAGMAを設定
+
+  Args:
+      engine: 同期エンジン（非同期エンジンの場合は engine.sync_engine）
+      profile: SQLITE_PROFILES のキー
+
+  Raises:
+      ValueError: 存在しないプロファイル名の場合
+  """
+  if engine.dialect.name != "sqlite":
+    return
+  if profile not in SQLITE_PROFILES:
+    raise ValueError(f"unknown SQLITE_PROFILE: {profile}")
+  pragmas = SQLITE_PROFILES[profile]
+  if not pragmas:
+    return
+
+  @event.listens_for(engine,"connect")
+  def set_sqlite_pragma(dbapi_connection,connection_record):
+    cursor = dbapi_connection.cursor()
+    for name,value in pragmas.items():
+      cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
 
 # SQLAlchemyエンジン（DB接続を管理）
 # connect_args: SQLiteで別スレッドからのアクセスを許可
 engine = create_engine(SQL_URL,connect_args={"check_same_thread": False})#connect_args別のスレッドからデータベースにアクセス可能にする
+apply_sqlite_profile(engine,SQLITE_PROFILE)
+instrument_engine(engine) # SQL文の数と時間をリクエストごとに計測（metrics）
+watch_engine(engine) # N+1・低速クエリの検出（query_guard、有効なガードがない場合は何もしない）
 
 # セッションファクトリ（DB操作用のセッションを生成）
 # autoflush=False: 自動フラッシュを無効化
 # autocommit=False: 自動コミットを無効化（明示的なcommitが必要）
 SessionLocal = sessionmaker(bind=engine,autoflush=False,autocommit=False)
 
+# 非同期エンジンとセッションファクトリ（DB_MODE=async のときのみ生成）
+# expire_on_commit=False: commit後にレスポンス変換で属性を再読込（暗黙のIO）しないようにする
+async_engine = create_async_engine(ASYNC_SQL_URL) if ASYNC_MODE else None
+if async_engine is not None:
+  apply_sqlite_profile(async_engine.sync_engine,SQLITE_PROFILE)
+  instrument_engine(async_engine.sync_engine)
+  watch_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine,autoflush=False,expire_on_commit=False) if ASYNC_MODE else None
+
 # モデルクラスのベースクラス（全てのモデルがこれを継承）
 Base = declarative_base()
 
 def get_db():
   """データベースセッションを取得
-    
+
     FastAPIの依存性注入で使用するDB接続セッションを提供します。
     リクエストごとに新しいセッションを作成し、処理後に自動でクローズします。
-    
+
     Yields:
         Session: SQLAlchemyのデータベースセッション
-        
+
     Example:
         @app.get("/items")
         def find_all(db: Session = Depends(get_db)):
@@ -40,4 +130,53 @@ def get_db():
   try:
     yield db
   finally:
-    db.close()
\ No newline at end of file
+    db.close()
+
+async def get_async_db():
+  """非同期データベースセッションを取得
+
+    DB_MODE=async のときに使用するAsyncSessionを提供します。
+    リクエストごとに新しいセッションを作成し、処理後に自動でクローズします。
+
+    Yields:
+        AsyncSession: SQLAlchemyの非同期データベースセッション
+    """
+  async with AsyncSessionLocal() as db:
+    yield db
+
+def pool_capacity():
+  """DB接続を同時に取得できる数（コネクションプールの件数 + オーバーフローの上限）
+
+    同期Sessionはイベントループ上で接続を待つため、プールを使い切ると処理中のリクエストが
+    接続を返せなくなります。同時に処理するリクエスト数の既定値（main.py）に使用します。
+
+    Returns:
+        int: 同時に取得できる接続の数（上限がないプールの場合はNone）
+    """
+  pool = (async_engine.sync_engine if async_engine is not None else engine).pool
+  if not isinstance(pool,QueuePool) or pool._max_overflow < 0:
+    return None
+  return pool.size() + pool._max_overflow
+
+# ルーターが依存性注入で使用するセッション取得関数（DB_MODEで切り替え）
+get_session = get_async_db if ASYNC_MODE else get_db
+
+async def run_db(db,fn,*args,**kwargs):
+  """cruds の関数をセッションの種類に応じて実行
+
+    cruds の関数は同期Sessionを引数 db で受け取る形で実装されています。
+    AsyncSession が渡された場合は run_sync で非同期接続上に載せて実行し、
+    DBの待ち時間中はイベントループを他のリクエストに明け渡します。
+    同期Sessionの場合はそのまま呼び出します。
+
+    Args:
+        db: Session または AsyncSession
+        fn: 実行する cruds の関数（キーワード引数 db でセッションを受け取るもの）
+        *args, **kwargs: fn に渡す引数
+
+    Returns:
+        fn の戻り値
+    """
+  if isinstance(db,AsyncSession):
+    return await db.run_sync(lambda session: fn(*args,db=session,**kwargs))
+  return fn(*args,db=db,**kwargs)
@@ -0,0 +1,182 @@
+"""タスク変更の通知（Server-Sent Events 用のプロセス内 pub/sub）
+
+cruds のタスクの書き込みが commit 後に publish し、GET /tasks/events の接続（購読）へユーザーごとに配信します。
+
+- 通知はSSEの1イベント分のバイト列に1回だけ変換し、同じユーザーの全ての購読で共有します
+- 購読ごとのキューは上限付きで、書き込み側は待たされません。遅いクライアントのキューが満杯になった場合は
+  溜まった通知を捨てて LAGGED を1つだけ入れ、接続側が差分同期（cruds.task.find_changes）で追いつきます
+- ハートビートは購読ごとのタイマーを持たず、イベントループごとに1つのタスクが全ての購読のキューへ HEARTBEAT を入れます
+- 購読は idle の間キューを待つだけで、DB接続もスレッドも使いません
+- 購読は弱参照で保持し、接続側で参照がなくなった購読（unsubscribe し損ねたもの）は自動で配信対象から外れます
+
+通知はこのプロセスの接続にのみ届きます（複数ワーカーの場合、他のワーカーの書き込みは再接続時の差分同期で届きます）。
+"""
+
+import asyncio
+import json
+import threading
+import weakref
+from collections import defaultdict
+
+# キューに入れる制御用の値（通知は (変更番号, イベントのバイト列) のタプル）
+HEARTBEAT = "heartbeat"
+LAGGED = "lagged"
+
+
+def format_event(data,event :str = None,id :int = None,retry :int = None):
+  """SSEの1イベント分のバイト列を作成
+
+  Args:
+      data: data行にするJSONの値
+      event: イベント名（Noneの場合は省略し、クライアントでは message になる）
+      id: イベントID（クライアントが再接続時に Last-Event-ID で送り返す）
+      retry: 再接続までのミリ秒
+
+  Returns:
+      bytes: イベント（空行で終わる）
+  """
+  lines = []
+  if retry is not None:
+    lines.append(f"retry: {retry}")
+  if id is not None:
+    lines.append(f"id: {id}")
+  if event is not None:
+    lines.append(f"event: {event}")
+  lines.append("data: " + json.dumps(data,ensure_ascii=False,separators=(",",":"),default=str))
+  return ("\n".join(lines) + "\n\n").encode()
+
+# ハートビート（コメント行。クライアントには通知されず、接続の維持と切断の検出に使う）
+PING = b": ping\n\n"
+
+
+class Subscription:
+  """1つの接続の購読
+
+    Attributes:
+        user_id: 購読しているユーザーID
+        queue: 通知・制御用の値のキュー（上限付き）
+        loop: 購読したイベントループ
+        dropped: キューが満杯で捨てた通知の数
+  """
+
+  __slots__ = ("user_id","queue","loop","dropped","__weakref__")
+
+  def __init__(self,user_id :int,maxsize :int,loop):
+    self.user_id = user_id
+    self.queue = asyncio.Queue(maxsize)
+    self.loop = loop
+    self.dropped = 0
+
+  def offer(self,message):
+    """キューに入れる（満杯の場合は溜まった通知を捨てて LAGGED に置き換える、イベントループ上で呼ぶ）"""
+    if message == HEARTBEAT and not self.queue.empty():
+      return
+    try:
+      self.queue.put_nowait(message)
+    except asyncio.QueueFull:
+      if message == HEARTBEAT:
+        return
+      self.dropped += self.queue.qsize()
+      while not self.queue.empty():
+        self.queue.get_nowait()
+      self.queue.put_nowait(LAGGED)
+
+  async def get(self):
+    """次の通知・制御用の値を待つ"""
+    return await self.queue.get()
+
+
+class EventBroker:
+  """ユーザーごとに購読を管理し、通知を配信する
+
+    publish は同期関数で、どのスレッドからでも呼び出せます（購読のイベントループ以外からは call_soon_threadsafe で渡す）。
+
+    Attributes:
+        queue_size: 購読ごとのキューの上限
+        heartbeat_seconds: ハートビートの間隔（秒）
+        published: publish した通知の数
+        dropped: キューが満杯で捨てた通知の数（LAGGEDに置き換えた数）
+  """
+
+  def __init__(self,queue_size :int = 64,heartbeat_seconds :float = 15):
+    self.queue_size = queue_size
+    self.heartbeat_seconds = heartbeat_seconds
+    self.published = 0
+    self.dropped = 0
+    self._subscribers = defaultdict(weakref.WeakSet)
+    self._tickers = {}
+    self._lock = threading.Lock()
+
+  def has_subscribers(self,user_id :int):
+    """ユーザーの購読があるか（ない場合は通知の作成を省く）"""
+    return bool(self._subscribers.get(user_id))
+
+  @property
+  def count(self):
+    """購読の数"""
+    with self._lock:
+      return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+  def subscribe(self,user_id :int):
+    """購読を追加（イベントループ上で呼ぶ）
+
+    Returns:
+        Subscription: 追加した購読（終了時は unsubscribe に渡す）
+    """
+    loop = asyncio.get_running_loop()
+    subscription = Subscription(user_id,self.queue_size,loop)
+    with self._lock:
+      self._subscribers[user_id].add(subscription)
+      ticker = self._tickers.get(loop)
+      if ticker is None or ticker.done():
+        self._tickers[loop] = loop.create_task(self._tick(loop))
+    return subscription
+
+  def unsubscribe(self,subscription :Subscription):
+    """購読を削除"""
+    with self._lock:
+      subscriptions = self._subscribers.get(subscription.user_id)
+      if subscriptions is not None:
+        subscriptions.discard(subscription)
+        if not subscriptions:
+          del self._subscribers[subscription.user_id]
+      self.dropped += subscription.dropped
+
+  def publish(self,user_id :int,revision :int,frame :bytes):
+    """ユーザーの全ての購読に通知を配信
+
+    Args:
+        user_id: 変更したユーザーID
+        revision: 変更番号（接続側で送信済みの変更番号以下の通知を読み飛ばすのに使う）
+        frame: format_event で作成したイベントのバイト列
+    """
+    with self._lock:
+      subscriptions = list(self._subscribers.get(user_id,()))
+    if not subscriptions:
+      return
+    self.published += 1
+    message = (revision,frame)
+    try:
+      running = asyncio.get_running_loop()
+    except RuntimeError:
+      running = None
+    for subscription in subscriptions:
+      if subscription.loop is running:
+        subscription.offer(message)
+      elif not subscription.loop.is_closed():
+        subscription.loop.call_soon_threadsafe(subscription.offer,message)
+
+  async def _tick(self,loop):
+    """イベントループの全ての購読に HEARTBEAT を入れる（購読がなくなると終了）"""
+    while True:
+      await asyncio.sleep(self.heartbeat_seconds)
+      with self._lock:
+        for user_id in [user_id for user_id,group in self._subscribers.items() if not group]:
+          del self._subscribers[user_id]
+        subscriptions = [s for group in self._subscribers.values() for s in group if s.loop is loop]
+        if not subscriptions:
+          if self._tickers.get(loop) is asyncio.current_task():
+            del self._tickers[loop]
+          return
+      for subscription in subscriptions:
+        subscription.offer(HEARTBEAT)
@@ -0,0 +1,43 @@
+"""タスク一覧の高速なJSON変換
+
+ORMオブジェクトを ItemResponse で1件ずつ検証してからJSONにする代わりに、
+列の値のタプル（SELECTした行）から直接JSONのbytesを作成します。
+出力の形式（キーの順番・日付の書式・区切り文字）は ItemResponse.model_dump_json と同じです。
+
+orjson がインストールされていれば orjson を、なければ標準の json を使用します。
+"""
+
+import json
+from datetime import date
+
+try:
+  import orjson # 任意の依存パッケージ（なくても動作する）
+except ImportError:
+  orjson = None
+
+def _default(value):
+  if isinstance(value,date):
+    return value.isoformat()
+  raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value):
+  """値をJSON（bytes、区切りの空白なし・非ASCII文字はそのまま）に変換"""
+  if orjson is not None:
+    return orjson.dumps(value)
+  return json.dumps(value,ensure_ascii=False,separators=(",",":"),default=_default).encode()
+
+def dump_rows(rows,fields :tuple):
+  """行（fieldsの順に値を持つタプル）のリストをJSONの配列に変換
+
+  Args:
+      rows: SELECTした行のリスト
+      fields: 各行の値に対応するキー名
+
+  Returns:
+      bytes: [{field: value, ...}, ...] 形式のJSON
+  """
+  return dumps([dict(zip(fields,row)) for row in rows])
+
+def dump_row(row,fields :tuple):
+  """1行をJSONのオブジェクトに変換"""
+  return dumps(dict(zip(fields,row)))
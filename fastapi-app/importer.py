@@ -0,0 +1,150 @@
+"""タスクの一括インポート
+
+CSV または NDJSON のファイルを先頭から少しずつ読み込み、
+batch_size 件ごとに1回のINSERT文（ドライバのexecutemany）でデータベースに追加します。
+ファイル全体をメモリに載せないため、大量のタスクでも一定のメモリで取り込めます。
+取り込み前にユーザーのタスク変更番号を1つ進め、取り込んだタスクはその変更番号で差分同期（GET /tasks/changes）に含まれます。
+
+CSVは title,content,due_date,completed 列を持つもの（test_data.csv と同じ形式）、
+NDJSONは1行に1つ {"title": ..., "content": ..., "due_date": ..., "completed": ...} を想定します。
+各行は POST /tasks と同じ ItemCreate で検証し、不正な行は取り込まずに行番号と理由を報告します。
+
+実行方法:
+    python importer.py test_data.csv --user-id 1
+    python importer.py tasks.ndjson --user-id 1 --batch-size 20000
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime,timezone
+from itertools import islice
+from sqlalchemy import select,update
+from models import Item,User
+from schemas import ItemCreate
+
+# 挿入する列（parse_rowが返すタプルの並び順）
+COLUMNS = ("title","content","due_date","completed","user_id")
+# parse_rowの値に続けて、取り込み全体で共通の値を入れる列
+STAMP_COLUMNS = ("revision","updated_at")
+
+def parse_row(row :dict,user_id :int):
+    """ファイルの1行をtasksテーブルの1行に変換
+
+    APIで作成するタスクと同じ ItemCreate で検証したうえで、SQLAlchemyの型変換を通さずドライバへ直接渡せる値
+    （期限日はYYYY-MM-DD形式の文字列、完了状態は0/1）に変換します。
+
+    Args:
+        row: CSV/NDJSONの1行分の辞書
+        user_id: タスクを登録するユーザーID
+
+    Returns:
+        tuple: COLUMNSの順に並べた値
+
+    Raises:
+        ValueError: 行が不正な場合（タイトル・内容の文字数、期限日の形式など。pydanticのValidationError）
+    """
+    completed = row.get("completed")
+    if isinstance(completed,str):
+        completed = completed.strip().lower() in ("true","1") #CSVでは文字列の"True"/"False"
+    item = ItemCreate(title=row.get("title"),content=row.get("content"),due_date=row.get("due_date") or None,completed=bool(completed))
+    due_date = item.due_date.isoformat() if item.due_date is not None else None
+    return (item.title,item.content,due_date,int(item.completed),user_id)
+
+def read_rows(path :str,format :str = None):
+    """ファイルを1行ずつ辞書として読み込むイテレータ
+
+    Args:
+        path: 読み込むファイルのパス
+        format: "csv" または "ndjson"（Noneの場合は拡張子から判定）
+
+    Yields:
+        dict: 1行分の辞書
+    """
+    if format is None:
+        format = "ndjson" if path.endswith((".ndjson",".jsonl")) else "csv"
+    with open(path,"r",encoding="utf-8") as f:
+        if format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def import_file(path :str,user_id :int,engine = None,batch_size :int = 10000,format :str = None,progress = None,on_error = None):
+    """ファイルのタスクをデータベースへ一括で取り込む
+
+    batch_size 件ごとにINSERT文を実行し、全件を1つのトランザクションで確定します。
+    同じトランザクション内でユーザーのタスク変更番号（users.task_version）を進めるため、
+    ETagも変わり、取り込んだタスクは一覧の再取得・差分同期でクライアントに届きます。
+    不正な行は取り込まずに読み飛ばし、on_error で報告します。
+
+    Args:
+        path: 読み込むファイルのパス
+        user_id: タスクを登録するユーザーID
+        engine: SQLAlchemyエンジン（Noneの場合は database.engine）
+        batch_size: 1回のINSERTで追加する件数
+        format: "csv" または "ndjson"（Noneの場合は拡張子から判定）
+        progress: バッチごとに (取り込み済み件数, 経過秒数) で呼ばれる関数
+        on_error: 不正な行ごとに (データの行番号（1から）, 例外) で呼ばれる関数
+
+    Returns:
+        int: 取り込んだ件数（不正な行は含まない）
+    """
+    if engine is None:
+        from database import engine
+
+    def parse_rows():
+        for number,row in enumerate(read_rows(path,format),start=1):
+            try:
+                yield parse_row(row,user_id)
+            except ValueError as e:
+                if on_error is not None:
+                    on_error(number,e)
+
+    rows = parse_rows()
+    total = 0
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        conn.execute(update(User).where(User.id == user_id).values(task_version=User.task_version + 1,tasks_modified_at=now))
+        stamp = (conn.execute(select(User.task_version).where(User.id == user_id)).scalar(),now.isoformat(sep=" "))
+        columns = COLUMNS + STAMP_COLUMNS
+        placeholder = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+        sql = f"INSERT INTO {Item.__tablename__} ({','.join(columns)}) VALUES ({','.join([placeholder] * len(columns))})"
+        while True:
+            batch = [row + stamp for row in islice(rows,batch_size)]
+            if not batch:
+                break
+            conn.exec_driver_sql(sql,batch)
+            total += len(batch)
+            if progress is not None:
+                progress(total,time.perf_counter() - start)
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV/NDJSONファイルのタスクを一括で取り込みます")
+    parser.add_argument("path",help="取り込むファイル（.csv / .ndjson）")
+    parser.add_argument("--user-id",type=int,required=True,help="タスクを登録するユーザーID")
+    parser.add_argument("--batch-size",type=int,default=10000,help="1回のINSERTで追加する件数")
+    parser.add_argument("--format",choices=["csv","ndjson"],default=None,help="ファイル形式（省略時は拡張子から判定）")
+    args = parser.parse_args()
+
+    def report(total :int,elapsed :float):
+        print(f"\r{total:,} 件 {elapsed:.1f} 秒 ({total / max(elapsed,1e-9):,.0f} 件/秒)",end="",file=sys.stderr,flush=True)
+
+    errors = []
+    def skip(number :int,error :ValueError):
+        errors.append(number)
+        print(f"\n{number} 件目のデータを読み飛ばしました: {error}",file=sys.stderr)
+
+    total = import_file(args.path,args.user_id,batch_size=args.batch_size,format=args.format,progress=report,on_error=skip)
+    print(file=sys.stderr)
+    print(f"{total:,} 件のタスクを挿入しました")
+    if errors:
+        print(f"不正な {len(errors):,} 行は取り込みませんでした",file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
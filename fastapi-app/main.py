@@ -2,14 +2,63 @@ from fastapi import FastAPI,Depends,Query,HTTPException
 from schemas import ItemCreate,ItemResponse,ItemUpdate
 from typing import Optional,Annotated
 from models import Item
-from database import get_db
+from database import get_db,async_engine,pool_capacity
+from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
 from datetime import date,timedelta
 from routers import task,auth
 from starlette import status
+from fastapi.responses import PlainTextResponse
+import os
+import metrics
+import query_guard
+import rate_limit
 
 DbDependency = Annotated[Session,Depends(get_db)]
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app :FastAPI):
+    """アプリの起動・終了処理
+
+    DB_MODE=async のとき、終了時に非同期エンジンのコネクションプールを破棄します。
+    """
+    yield
+    if async_engine is not None:
+        await async_engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
+
+# N+1・低速クエリの検出（ステージング用、QUERY_GUARD=on で有効化し、違反をログに出力）
+if os.getenv("QUERY_GUARD","off").lower() == "on":
+  app.add_middleware(
+    query_guard.QueryGuardMiddleware,
+    max_statements=int(os.getenv("QUERY_GUARD_MAX_STATEMENTS","10")),
+    max_repeats=int(os.getenv("QUERY_GUARD_MAX_REPEATS","1")),
+    slow_seconds=float(os.getenv("QUERY_GUARD_SLOW_MS","100")) / 1000,
+  )
+
+# 同時に処理するリクエスト数の上限（超えた分は到着順に短時間だけ待たせ、待ちの列も満杯なら処理を始める前に503で断る、0で無効化）
+# 既定はDB接続を同時に取得できる数 - 1（1つは変更通知の追いつきに残す）。変更通知（SSE）の接続と /metrics は数えない
+POOL_CAPACITY = pool_capacity()
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS",str(max(1,POOL_CAPACITY - 1) if POOL_CAPACITY else 64)))
+if MAX_CONCURRENT_REQUESTS > 0:
+  app.add_middleware(
+    rate_limit.ConcurrencyLimitMiddleware,
+    max_concurrent=MAX_CONCURRENT_REQUESTS,
+    max_waiting=int(os.getenv("MAX_WAITING_REQUESTS","256")),
+    wait_seconds=float(os.getenv("REQUEST_WAIT_TIMEOUT_MS","1000")) / 1000,
+    exempt=("/tasks/events","/metrics"),
+  )
+
+# リクエストの計測（METRICS_ENABLED=off で無効化）
+METRICS_ENABLED = os.getenv("METRICS_ENABLED","on").lower() != "off"
+if METRICS_ENABLED:
+  app.add_middleware(metrics.MetricsMiddleware)
+
+  @app.get("/metrics",include_in_schema=False)
+  def get_metrics():
+    """ルートごとのレイテンシ・SQL文の数と時間・認証時間をPrometheusのテキスト形式で返す"""
+    return PlainTextResponse(metrics.render(),media_type="text/plain; version=0.0.4; charset=utf-8")
 
 app.include_router(task.router)
 app.include_router(auth.router)
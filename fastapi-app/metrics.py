@@ -0,0 +1,201 @@
+"""リクエストの計測（レイテンシ・SQL文の数と時間・認証時間）
+
+- RequestStats: 1リクエスト分の計測値（ContextVarでリクエストごとに保持）
+- instrument_engine: SQLAlchemyエンジンのイベントで、実行したSQL文の数と時間を計測
+- track: 認証などの処理時間を計測するコンテキストマネージャ
+- MetricsMiddleware: ルートごとのヒストグラムへの記録と Server-Timing ヘッダーの付与
+- render: 集計値をPrometheusのテキスト形式で出力（GET /metrics）
+
+集計値はプロセスごとに保持します（uvicornのワーカーが複数の場合はワーカーごとの値）。
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+# レイテンシ用のバケット（秒）
+LATENCY_BUCKETS = (0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0)
+# 1リクエストあたりのSQL文の数用のバケット
+COUNT_BUCKETS = (0,1,2,3,5,10,20,50,100)
+
+def _escape(value):
+  return str(value).replace("\\","\\\\").replace("\n","\\n").replace('"','\\"')
+
+class Histogram:
+  """ラベルごとに値の分布を集計するヒストグラム（Prometheusのhistogram型）
+
+    Attributes:
+        name: メトリクス名
+        help: 説明
+        labelnames: ラベル名のタプル
+        buckets: バケットの上限値のタプル（昇順）
+  """
+
+  def __init__(self,name :str,help :str,labelnames :tuple,buckets :tuple):
+    self.name = name
+    self.help = help
+    self.labelnames = labelnames
+    self.buckets = buckets
+    self._values = {}
+    self._lock = threading.Lock()
+
+  def observe(self,labels :tuple,value :float):
+    """値を1つ記録
+
+    Args:
+        labels: labelnames の順に並べたラベルの値
+        value: 記録する値
+    """
+    with self._lock:
+      entry = self._values.get(labels)
+      if entry is None:
+        entry = self._values[labels] = [[0] * len(self.buckets),0.0,0]
+      counts = entry[0]
+      for i,bucket in enumerate(self.buckets):
+        if value <= bucket:
+          counts[i] += 1
+      entry[1] += value
+      entry[2] += 1
+
+  def clear(self):
+    """集計値を全て破棄"""
+    with self._lock:
+      self._values.clear()
+
+  def render(self):
+    """Prometheusのテキスト形式の行のリストを返す"""
+    lines = [f"# HELP {self.name} {self.help}",f"# TYPE {self.name} histogram"]
+    with self._lock:
+      values = sorted((labels,(list(counts),total,count)) for labels,(counts,total,count) in self._values.items())
+    for labels,(counts,total,count) in values:
+      base = ",".join(f'{name}="{_escape(value)}"' for name,value in zip(self.labelnames,labels))
+      for bucket,bucket_count in zip(self.buckets,counts):
+        lines.append(f'{self.name}_bucket{{{base},le="{bucket}"}} {bucket_count}')
+      lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+      lines.append(f"{self.name}_sum{{{base}}} {total}")
+      lines.append(f"{self.name}_count{{{base}}} {count}")
+    return lines
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds","HTTPリクエストの処理時間（秒）",("method","route","status"),LATENCY_BUCKETS)
+DB_STATEMENTS = Histogram("http_request_db_statements","1リクエストで実行したSQL文の数",("method","route"),COUNT_BUCKETS)
+DB_SECONDS = Histogram("http_request_db_seconds","1リクエストでSQL文の実行にかかった時間（秒）",("method","route"),LATENCY_BUCKETS)
+AUTH_SECONDS = Histogram("http_request_auth_seconds","1リクエストで認証（JWT検証・パスワードハッシュ）にかかった時間（秒）",("method","route"),LATENCY_BUCKETS)
+HISTOGRAMS = (REQUEST_SECONDS,DB_STATEMENTS,DB_SECONDS,AUTH_SECONDS)
+
+
+class RequestStats:
+  """1リクエスト分の計測値
+
+    Attributes:
+        db_statements: 実行したSQL文の数
+        db_seconds: SQL文の実行にかかった時間の合計（秒）
+        timings: 処理名（"auth" など）ごとの時間の合計（秒）
+  """
+
+  def __init__(self):
+    self.db_statements = 0
+    self.db_seconds = 0.0
+    self.timings = {}
+
+  def server_timing(self,total :float):
+    """Server-Timing ヘッダーの値を作成
+
+    Args:
+        total: レスポンス開始までの時間（秒）
+
+    Returns:
+        str: 例 'db;dur=1.20;desc="3 queries", auth;dur=0.35, total;dur=4.81'
+    """
+    parts = [f'db;dur={self.db_seconds * 1000:.2f};desc="{self.db_statements} queries"']
+    for name,seconds in self.timings.items():
+      parts.append(f"{name};dur={seconds * 1000:.2f}")
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+_current_stats = ContextVar("request_stats",default=None)
+
+def current_stats():
+  """処理中のリクエストの計測値を取得（リクエスト外の場合はNone）"""
+  return _current_stats.get()
+
+@contextmanager
+def track(name :str):
+  """with ブロックの処理時間を、処理中のリクエストの計測値に加算
+
+  Args:
+      name: 処理名（Server-Timing の名前になる）
+  """
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    stats = _current_stats.get()
+    if stats is not None:
+      stats.timings[name] = stats.timings.get(name,0.0) + time.perf_counter() - start
+
+def _before_cursor_execute(conn,cursor,statement,parameters,context,executemany):
+  context._metrics_start = time.perf_counter()
+
+def _after_cursor_execute(conn,cursor,statement,parameters,context,executemany):
+  stats = _current_stats.get()
+  if stats is not None:
+    stats.db_statements += 1
+    stats.db_seconds += time.perf_counter() - context._metrics_start
+
+def instrument_engine(engine):
+  """エンジンで実行したSQL文の数と時間を、処理中のリクエストの計測値に加算するよう設定
+
+  Args:
+      engine: 同期エンジン（非同期エンジンの場合は engine.sync_engine）
+  """
+  if not event.contains(engine,"before_cursor_execute",_before_cursor_execute):
+    event.listen(engine,"before_cursor_execute",_before_cursor_execute)
+    event.listen(engine,"after_cursor_execute",_after_cursor_execute)
+
+
+class MetricsMiddleware:
+  """リクエストごとの計測を行うASGIミドルウェア
+
+    リクエストの処理中は RequestStats を ContextVar に設定し、
+    レスポンス開始時に Server-Timing ヘッダーを付け、終了時にルートごとのヒストグラムへ記録します。
+    ルートはパスのテンプレート（例: /tasks/{id}）で集計し、一致するルートがない場合は "unmatched" とします。
+  """
+
+  def __init__(self,app):
+    self.app = app
+
+  async def __call__(self,scope,receive,send):
+    if scope["type"] != "http":
+      await self.app(scope,receive,send)
+      return
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    start = time.perf_counter()
+    status_code = 500
+
+    async def send_with_timing(message):
+      nonlocal status_code
+      if message["type"] == "http.response.start":
+        status_code = message["status"]
+        headers = MutableHeaders(scope=message)
+        headers.append("Server-Timing",stats.server_timing(time.perf_counter() - start))
+      await send(message)
+
+    try:
+      await self.app(scope,receive,send_with_timing)
+    finally:
+      route = scope.get("route")
+      path = getattr(route,"path","unmatched")
+      method = scope["method"]
+      REQUEST_SECONDS.observe((method,path,str(status_code)),time.perf_counter() - start)
+      DB_STATEMENTS.observe((method,path),stats.db_statements)
+      DB_SECONDS.observe((method,path),stats.db_seconds)
+      AUTH_SECONDS.observe((method,path),stats.timings.get("auth",0.0))
+      _current_stats.reset(token)
+
+def render():
+  """全てのヒストグラムをPrometheusのテキスト形式で出力"""
+  return "\n".join(line for histogram in HISTOGRAMS for line in histogram.render()) + "\n"
@@ -22,6 +22,12 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+def include_name(name, type_, parent_names):
+    """全文検索の仮想テーブル（tasks_fts とその内部テーブル）を自動生成の比較対象から除外"""
+    if type_ == "table" and name.startswith("tasks_fts"):
+        return False
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -45,6 +51,7 @@ def run_migrations_offline() -> None:
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
+        include_name=include_name,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -67,7 +74,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata,render_as_batch=True
+            connection=connection, target_metadata=target_metadata,render_as_batch=True,include_name=include_name
         )
 
         with context.begin_transaction():
@@ -0,0 +1,61 @@
+"""add tasks full text search
+
+Revision ID: a7d4c2e9b6f1
+Revises: 9e3b6f1c2d48
+Create Date: 2026-10-18 15:21:09.804417
+
+tasks.title / tasks.content の全文検索用に、SQLite FTS5 の仮想テーブル tasks_fts と
+tasks と同期するためのトリガーを作成し、既存のタスクから索引を構築します。
+
+注意: batch_alter_table が tasks を作り直す（recreate）マイグレーションを追加すると
+トリガーも消えるため、その後にトリガーを作成し直してください。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d4c2e9b6f1'
+down_revision: Union[str, Sequence[str], None] = '9e3b6f1c2d48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute("CREATE VIEW tasks_fts_source AS SELECT id,title,content,'u' || user_id AS owner FROM tasks")
+    op.execute(
+        "CREATE VIRTUAL TABLE tasks_fts USING fts5("
+        "title,content,owner,content='tasks_fts_source',content_rowid='id',"
+        "tokenize='unicode61 remove_diacritics 2',prefix='2 3')"
+    )
+    op.execute("INSERT INTO tasks_fts(tasks_fts,rank) VALUES ('rank','bm25(10.0, 1.0, 0.0)')")
+    op.execute(
+        "CREATE TRIGGER tasks_fts_ai AFTER INSERT ON tasks BEGIN "
+        "INSERT INTO tasks_fts(rowid,title,content,owner) VALUES (new.id,new.title,new.content,'u' || new.user_id); END"
+    )
+    op.execute(
+        "CREATE TRIGGER tasks_fts_ad AFTER DELETE ON tasks BEGIN "
+        "INSERT INTO tasks_fts(tasks_fts,rowid,title,content,owner) VALUES ('delete',old.id,old.title,old.content,'u' || old.user_id); END"
+    )
+    op.execute(
+        "CREATE TRIGGER tasks_fts_au AFTER UPDATE OF title,content,user_id ON tasks BEGIN "
+        "INSERT INTO tasks_fts(tasks_fts,rowid,title,content,owner) VALUES ('delete',old.id,old.title,old.content,'u' || old.user_id); "
+        "INSERT INTO tasks_fts(rowid,title,content,owner) VALUES (new.id,new.title,new.content,'u' || new.user_id); END"
+    )
+    op.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute("DROP TRIGGER IF EXISTS tasks_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS tasks_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS tasks_fts_ai")
+    op.execute("DROP TABLE IF EXISTS tasks_fts")
+    op.execute("DROP VIEW IF EXISTS tasks_fts_source")
@@ -0,0 +1,70 @@
+"""use trigram tokenizer for task search
+
+Revision ID: b6e2d9f4a1c8
+Revises: f3c8a2d5e914
+Create Date: 2026-10-18 19:05:12.441873
+
+unicode61 は空白・記号でしか区切らないため、日本語のタイトル・内容の一部では検索できませんでした。
+tasks_fts を trigram の索引で作り直し、owner列を "<user_id>" の形式にします
+（trigram では3文字未満の "u1" を検索できず、"<1>" は "<12>" に一致しないため）。
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2d9f4a1c8'
+down_revision: Union[str, Sequence[str], None] = 'f3c8a2d5e914'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _drop_fts():
+    op.execute("DROP TRIGGER IF EXISTS tasks_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS tasks_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS tasks_fts_ai")
+    op.execute("DROP TABLE IF EXISTS tasks_fts")
+    op.execute("DROP VIEW IF EXISTS tasks_fts_source")
+
+
+def _create_fts(tokenize :str,owner :str):
+    """owner: user_id から owner列の値を作るSQL式（{row} は列の接頭辞）"""
+    op.execute(f"CREATE VIEW tasks_fts_source AS SELECT id,title,content,{owner.format(row='')} AS owner FROM tasks")
+    op.execute(
+        "CREATE VIRTUAL TABLE tasks_fts USING fts5("
+        f"title,content,owner,content='tasks_fts_source',content_rowid='id',tokenize={tokenize})"
+    )
+    op.execute("INSERT INTO tasks_fts(tasks_fts,rank) VALUES ('rank','bm25(10.0, 1.0, 0.0)')")
+    new,old = owner.format(row="new."),owner.format(row="old.")
+    op.execute(
+        "CREATE TRIGGER tasks_fts_ai AFTER INSERT ON tasks BEGIN "
+        f"INSERT INTO tasks_fts(rowid,title,content,owner) VALUES (new.id,new.title,new.content,{new}); END"
+    )
+    op.execute(
+        "CREATE TRIGGER tasks_fts_ad AFTER DELETE ON tasks BEGIN "
+        f"INSERT INTO tasks_fts(tasks_fts,rowid,title,content,owner) VALUES ('delete',old.id,old.title,old.content,{old}); END"
+    )
+    op.execute(
+        "CREATE TRIGGER tasks_fts_au AFTER UPDATE OF title,content,user_id ON tasks BEGIN "
+        f"INSERT INTO tasks_fts(tasks_fts,rowid,title,content,owner) VALUES ('delete',old.id,old.title,old.content,{old}); "
+        f"INSERT INTO tasks_fts(rowid,title,content,owner) VALUES (new.id,new.title,new.content,{new}); END"
+    )
+    op.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    _drop_fts()
+    _create_fts("'trigram'","'<' || {row}user_id || '>'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    _drop_fts()
+    _create_fts("'unicode61 remove_diacritics 2',prefix='2 3'","'u' || {row}user_id")
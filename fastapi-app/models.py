@@ -4,7 +4,7 @@
 SQLAlchemyのORMを使用してPythonクラスとデータベーステーブルをマッピングします。
 """
 
-from sqlalchemy import Column,Integer,String,Date,Boolean,ForeignKey
+from sqlalchemy import Column,Integer,String,Date,DateTime,Boolean,ForeignKey,Index,DDL,event
 from database import Base
 from sqlalchemy.orm import relationship
 
@@ -20,6 +20,8 @@ class Item(Base):
         content: タスクの詳細内容（任意）
         due_date: タスクの期限日（任意）
         completed: タスクの完了状態（デフォルト: False）
+        revision: 最後に作成・更新したときのユーザーのタスク変更番号（users.task_version、差分同期に使用）
+        updated_at: 最後に作成・更新した日時（UTC）
   """
   __tablename__ = "tasks"
   id = Column(Integer,primary_key=True)
@@ -28,14 +30,178 @@ class Item(Base):
   due_date  =Column(Date,nullable=True)
   completed = Column(Boolean,default=False)
   user_id = Column(Integer,ForeignKey("users.id",name="fk_user_id",ondelete="CASCADE"),nullable=False)
+  revision = Column(Integer,nullable=False,default=0,server_default="0")
+  updated_at = Column(DateTime,nullable=True)
 
   user = relationship("User",back_populates="items")
 
+  # ユーザー単位の検索・並び替え用の複合インデックス
+  __table_args__ = (
+    Index("ix_tasks_user_id_due_date","user_id","due_date"),
+    Index("ix_tasks_user_id_completed_due_date","user_id","completed","due_date"),
+    Index("ix_tasks_user_id_title","user_id","title"),
+    Index("ix_tasks_user_id_id","user_id","id"),
+    Index("ix_tasks_user_id_revision","user_id","revision"),
+  )
+
+# タイトル・内容の全文検索用（SQLite FTS5）の仮想テーブルと同期トリガー
+# tasks_fts はタスク本体を持たない外部コンテンツ型で、tasks_fts_source（tasksのビュー）を参照します。
+# 分かち書きしない日本語も部分一致で検索できるよう、3文字ずつの trigram で索引を作ります。
+# owner列（"<user_id>"）も索引に含め、検索時にユーザーの絞り込みを全文検索側で行います。
+# 検索順位はタイトルの一致を内容の10倍に重み付けしたbm25です。
+TASKS_FTS_DDL = (
+  "CREATE VIEW IF NOT EXISTS tasks_fts_source AS SELECT id,title,content,'<' || user_id || '>' AS owner FROM tasks",
+  "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(title,content,owner,content='tasks_fts_source',content_rowid='id',tokenize='trigram')",
+  "INSERT INTO tasks_fts(tasks_fts,rank) VALUES ('rank','bm25(10.0, 1.0, 0.0)')",
+  "CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN "
+  "INSERT INTO tasks_fts(rowid,title,content,owner) VALUES (new.id,new.title,new.content,'<' || new.user_id || '>'); END",
+  "CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN "
+  "INSERT INTO tasks_fts(tasks_fts,rowid,title,content,owner) VALUES ('delete',old.id,old.title,old.content,'<' || old.user_id || '>'); END",
+  "CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title,content,user_id ON tasks BEGIN "
+  "INSERT INTO tasks_fts(tasks_fts,rowid,title,content,owner) VALUES ('delete',old.id,old.title,old.content,'<' || old.user_id || '>'); "
+  "INSERT INTO tasks_fts(rowid,title,content,owner) VALUES (new.id,new.title,new.content,'<' || new.user_id || '>'); END",
+)
+TASKS_FTS_DROP = (
+  "DROP TRIGGER IF EXISTS tasks_fts_au",
+  "DROP TRIGGER IF EXISTS tasks_fts_ad",
+  "DROP TRIGGER IF EXISTS tasks_fts_ai",
+  "DROP TABLE IF EXISTS tasks_fts",
+  "DROP VIEW IF EXISTS tasks_fts_source",
+)
+
+# create_all / drop_all（テストや新規DB）でも全文検索の索引を作成・削除する
+for statement in TASKS_FTS_DDL:
+  event.listen(Item.__table__,"after_create",DDL(statement).execute_if(dialect="sqlite"))
+for statement in TASKS_FTS_DROP:
+  event.listen(Item.__table__,"before_drop",DDL(statement).execute_if(dialect="sqlite"))
+
+# タスク数の集計表（task_summaries / task_due_counts）を tasks と同期するトリガー（SQLite）
+# {row} は new / old。完了状態がNULLのタスクは未完了として数えます。
+_SUMMARY_ADD = (
+  "INSERT INTO task_summaries(user_id,total,completed) VALUES ({row}.user_id,1,coalesce({row}.completed,0)) "
+  "ON CONFLICT(user_id) DO UPDATE SET total=total+1,completed=completed+excluded.completed; "
+  "INSERT INTO task_due_counts(user_id,due_date,open_count) SELECT {row}.user_id,{row}.due_date,1 "
+  "WHERE {row}.due_date IS NOT NULL AND NOT coalesce({row}.completed,0) "
+  "ON CONFLICT(user_id,due_date) DO UPDATE SET open_count=open_count+1; "
+)
+_SUMMARY_REMOVE = (
+  "UPDATE task_summaries SET total=total-1,completed=completed-coalesce({row}.completed,0) WHERE user_id={row}.user_id; "
+  "UPDATE task_due_counts SET open_count=open_count-1 "
+  "WHERE user_id={row}.user_id AND due_date={row}.due_date AND NOT coalesce({row}.completed,0); "
+  "DELETE FROM task_due_counts WHERE user_id={row}.user_id AND due_date={row}.due_date AND open_count<=0; "
+)
+TASK_SUMMARY_DDL = (
+  "CREATE TRIGGER IF NOT EXISTS task_summary_ai AFTER INSERT ON tasks BEGIN " + _SUMMARY_ADD.format(row="new") + "END",
+  "CREATE TRIGGER IF NOT EXISTS task_summary_ad AFTER DELETE ON tasks BEGIN " + _SUMMARY_REMOVE.format(row="old") + "END",
+  "CREATE TRIGGER IF NOT EXISTS task_summary_au AFTER UPDATE OF completed,due_date,user_id ON tasks BEGIN "
+  + _SUMMARY_REMOVE.format(row="old") + _SUMMARY_ADD.format(row="new") + "END",
+)
+TASK_SUMMARY_DROP = (
+  "DROP TRIGGER IF EXISTS task_summary_au",
+  "DROP TRIGGER IF EXISTS task_summary_ad",
+  "DROP TRIGGER IF EXISTS task_summary_ai",
+)
 class User(Base):
   __tablename__ = "users"
   id = Column(Integer,primary_key=True)
   username = Column(String,nullable=False,unique=True)
   password = Column(String,nullable=False)
   salt = Column(String,nullable=False)
+  # タスクを変更するたびに増える番号と最終変更日時（ETag / Last-Modified・差分同期に使用）
+  task_version = Column(Integer,nullable=False,default=0,server_default="0")
+  tasks_modified_at = Column(DateTime,nullable=True)
+
+  items = relationship("Item",back_populates="user")
+
+class RefreshToken(Base):
+  """リフレッシュトークンのデータモデル
+
+    トークン本体は保存せず、HMAC-SHA256の値（token_hash）だけを保存します。
+    使用するたびに新しいトークンへ交換（ローテーション）し、古いトークンは revoked_at を設定して無効にします。
+    同じログインから交換されたトークンは同じ family_id を持ち、ログアウトや使用済みトークンの再利用時にまとめて無効にします。
+
+    Attributes:
+        id: 一意識別子（主キー）
+        user_id: ユーザーID
+        token_hash: トークンのHMAC-SHA256（16進数）
+        family_id: ログインごとの識別子
+        expires_at: 有効期限（UTC）
+        revoked_at: 無効にした日時（UTC、有効な場合はNone）
+  """
+  __tablename__ = "refresh_tokens"
+  id = Column(Integer,primary_key=True)
+  user_id = Column(Integer,ForeignKey("users.id",name="fk_refresh_tokens_user_id",ondelete="CASCADE"),nullable=False)
+  token_hash = Column(String(64),nullable=False)
+  family_id = Column(String(32),nullable=False)
+  expires_at = Column(DateTime,nullable=False)
+  revoked_at = Column(DateTime,nullable=True)
+
+  __table_args__ = (
+    Index("ix_refresh_tokens_token_hash","token_hash",unique=True),
+    Index("ix_refresh_tokens_family_id","family_id"),
+    Index("ix_refresh_tokens_user_id_expires_at","user_id","expires_at"),
+  )
+
+
+class TaskTombstone(Base):
+  """削除したタスクの記録（差分同期用）
+
+    タスクを削除したときに、削除したときのタスク変更番号と一緒に残し、
+    GET /tasks/changes で前回の同期以降に削除されたタスクをクライアントに伝えます。
+
+    Attributes:
+        id: 一意識別子（主キー）
+        user_id: ユーザーID
+        task_id: 削除したタスクのid
+        revision: 削除したときのユーザーのタスク変更番号
+        deleted_at: 削除した日時（UTC）
+  """
+  __tablename__ = "task_tombstones"
+  id = Column(Integer,primary_key=True)
+  user_id = Column(Integer,ForeignKey("users.id",name="fk_task_tombstones_user_id",ondelete="CASCADE"),nullable=False)
+  task_id = Column(Integer,nullable=False)
+  revision = Column(Integer,nullable=False)
+  deleted_at = Column(DateTime,nullable=False)
+
+  __table_args__ = (
+    Index("ix_task_tombstones_user_id_revision","user_id","revision"),
+  )
+
+
+class UserTaskSummary(Base):
+  """ユーザーごとのタスク数の集計表
+
+    tasks のトリガー（SQLite）で、タスクの作成・更新・削除と同じトランザクション内で更新されます。
+
+    Attributes:
+        user_id: ユーザーID（主キー）
+        total: タスク数
+        completed: 完了したタスク数
+  """
+  __tablename__ = "task_summaries"
+  user_id = Column(Integer,ForeignKey("users.id",name="fk_task_summaries_user_id",ondelete="CASCADE"),primary_key=True)
+  total = Column(Integer,nullable=False,default=0)
+  completed = Column(Integer,nullable=False,default=0)
+
+
+class UserTaskDueCount(Base):
+  """ユーザー・期限日ごとの未完了タスク数の集計表
+
+    期限切れ・今日が期限・N日以内が期限のタスク数を、タスク数ではなく期限日の数に比例する件数の集計で求めるために使います。
+    未完了タスクが0件になった期限日の行は削除されます。
+
+    Attributes:
+        user_id: ユーザーID
+        due_date: 期限日
+        open_count: 未完了タスク数
+  """
+  __tablename__ = "task_due_counts"
+  user_id = Column(Integer,ForeignKey("users.id",name="fk_task_due_counts_user_id",ondelete="CASCADE"),primary_key=True)
+  due_date = Column(Date,primary_key=True)
+  open_count = Column(Integer,nullable=False,default=0)
 
-  items = relationship("Item",back_populates="user")
\ No newline at end of file
+# 集計表とトリガーは tasks・集計表の全てを作成した後に作成し、削除前に削除する
+for statement in TASK_SUMMARY_DDL:
+  event.listen(Base.metadata,"after_create",DDL(statement).execute_if(dialect="sqlite"))
+for statement in TASK_SUMMARY_DROP:
+  event.listen(Base.metadata,"before_drop",DDL(statement).execute_if(dialect="sqlite"))
@@ -0,0 +1,173 @@
+"""SQL文の監視（N+1・低速クエリの検出）
+
+テストやステージング環境で、1リクエスト（または with ブロック）で実行したSQL文を記録し、次を検出します。
+
+- 実行したSQL文の数が上限を超えた
+- 同じSQL文（パラメータだけが違うもの）を繰り返し実行した（N+1のパターン）
+- 実行時間がしきい値を超えた（EXPLAIN QUERY PLAN の結果と一緒にログに出力）
+
+使い方:
+    # テスト（tests/conftest.py の query_guard フィクスチャ）
+    with query_guard(max_statements=2) as guard:
+        client.get("/tasks")
+
+    # ステージング（QUERY_GUARD=on でミドルウェアを登録し、違反をログに出力）
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+
+logger = logging.getLogger("query_guard")
+
+
+class QueryBudgetExceeded(AssertionError):
+  """SQL文の数・繰り返しが上限を超えた場合の例外"""
+
+
+class QueryGuard:
+  """実行したSQL文の記録と検査
+
+    Attributes:
+        max_statements: SQL文の数の上限（Noneの場合は検査しない）
+        max_repeats: 同じSQL文を実行してよい回数（Noneの場合は検査しない）
+        slow_seconds: 低速クエリとしてログに出力する実行時間（秒、Noneの場合は出力しない）
+        statements: 実行したSQL文と実行時間（秒）のリスト
+        slow: 低速クエリ（SQL文, 実行時間, 実行計画）のリスト
+  """
+
+  def __init__(self,max_statements :int = None,max_repeats :int = None,slow_seconds :float = None):
+    self.max_statements = max_statements
+    self.max_repeats = max_repeats
+    self.slow_seconds = slow_seconds
+    self.statements = []
+    self.slow = []
+
+  @property
+  def count(self):
+    """実行したSQL文の数"""
+    return len(self.statements)
+
+  def repeated(self):
+    """max_repeats 回を超えて実行された同じSQL文と回数の辞書（N+1の候補）"""
+    limit = 1 if self.max_repeats is None else self.max_repeats
+    counts = Counter(_normalize(statement) for statement,_ in self.statements)
+    return {statement:count for statement,count in counts.items() if count > limit}
+
+  def violations(self):
+    """上限を超えた内容の説明のリスト（問題がない場合は空）"""
+    problems = []
+    if self.max_statements is not None and self.count > self.max_statements:
+      problems.append(f"{self.count} statements (max {self.max_statements})")
+    if self.max_repeats is not None:
+      for statement,count in self.repeated().items():
+        problems.append(f"repeated {count} times (max {self.max_repeats}): {statement}")
+    return problems
+
+  def check(self):
+    """上限を超えていないか検査
+
+    Raises:
+        QueryBudgetExceeded: SQL文の数・繰り返しが上限を超えた場合
+    """
+    problems = self.violations()
+    if problems:
+      listing = "\n".join(f"  {seconds * 1000:7.2f} ms  {statement}" for statement,seconds in self.statements)
+      raise QueryBudgetExceeded("\n".join(problems) + "\nstatements:\n" + listing)
+
+  def __enter__(self):
+    _active.append(self)
+    return self
+
+  def __exit__(self,exc_type,exc,tb):
+    _active.remove(self)
+    if exc_type is None:
+      self.check()
+    return False
+
+
+def _normalize(statement :str):
+  """空白をまとめたSQL文（同じ文かどうかの比較用）"""
+  return re.sub(r"\s+"," ",statement).strip()
+
+# with ブロックで有効にしたガード（テスト用、全スレッドのSQL文を記録）
+_active = []
+# リクエストごとのガード（QueryGuardMiddleware、入れ子の場合は全て）
+_current = ContextVar("query_guard",default=())
+
+def _guards():
+  return [*_current.get(),*_active]
+
+def _before_cursor_execute(conn,cursor,statement,parameters,context,executemany):
+  context._query_guard_start = time.perf_counter()
+
+def _after_cursor_execute(conn,cursor,statement,parameters,context,executemany):
+  guards = _guards()
+  if not guards:
+    return
+  seconds = time.perf_counter() - context._query_guard_start
+  plan = None
+  for guard in guards:
+    guard.statements.append((statement,seconds))
+    if guard.slow_seconds is not None and seconds >= guard.slow_seconds:
+      if plan is None:
+        plan = explain(conn,statement,parameters,executemany)
+      guard.slow.append((statement,seconds,plan))
+      logger.warning("slow query %.2f ms: %s\nplan: %s",seconds * 1000,_normalize(statement),plan)
+
+def explain(conn,statement :str,parameters,executemany :bool = False):
+  """SQL文の EXPLAIN QUERY PLAN の結果を1行の文字列で返す（SQLite以外・取得できない場合はNone）"""
+  if conn.dialect.name != "sqlite" or executemany:
+    return None
+  if not re.match(r"\s*(SELECT|UPDATE|DELETE|INSERT|WITH)\b",statement,re.I):
+    return None
+  cursor = conn.connection.cursor() # イベントを発生させないDBAPIのカーソルで実行
+  try:
+    cursor.execute("EXPLAIN QUERY PLAN " + statement,parameters)
+    return " / ".join(str(row[-1]) for row in cursor.fetchall())
+  except Exception as e:
+    return f"(EXPLAIN failed: {e})"
+  finally:
+    cursor.close()
+
+def watch_engine(engine):
+  """エンジンで実行したSQL文を、有効なガードに記録するよう設定
+
+  Args:
+      engine: 同期エンジン（非同期エンジンの場合は engine.sync_engine）
+  """
+  if not event.contains(engine,"before_cursor_execute",_before_cursor_execute):
+    event.listen(engine,"before_cursor_execute",_before_cursor_execute)
+    event.listen(engine,"after_cursor_execute",_after_cursor_execute)
+
+
+class QueryGuardMiddleware:
+  """リクエストごとにSQL文を監視するASGIミドルウェア（ステージング用）
+
+    上限を超えたリクエストと低速クエリを logger（query_guard）に警告として出力します。
+    レスポンスは変更しません。
+  """
+
+  def __init__(self,app,max_statements :int = None,max_repeats :int = 1,slow_seconds :float = None):
+    self.app = app
+    self.max_statements = max_statements
+    self.max_repeats = max_repeats
+    self.slow_seconds = slow_seconds
+
+  async def __call__(self,scope,receive,send):
+    if scope["type"] != "http":
+      await self.app(scope,receive,send)
+      return
+    guard = QueryGuard(self.max_statements,self.max_repeats,self.slow_seconds)
+    token = _current.set((*_current.get(),guard))
+    try:
+      await self.app(scope,receive,send)
+    finally:
+      _current.reset(token)
+      problems = guard.violations()
+      if problems:
+        route = getattr(scope.get("route"),"path",scope["path"])
+        logger.warning("%s %s: %s",scope["method"],route,"; ".join(problems))
@@ -0,0 +1,249 @@
+"""レート制限・同時実行数の制限（受付制御）
+
+- TokenBucketLimiter: キー（ユーザーID・IPアドレス）ごとのトークンバケットを持つインプロセスのレート制限
+- RedisTokenBucketLimiter: Redis互換クライアント（register_script / scan_iter / delete）を使う共有のレート制限
+- ConcurrencyLimitMiddleware: 同時に処理するリクエスト数の上限を超えた分を短時間だけ待たせ、
+  待ちの列も上限を超えたら処理を始める前に503で断るASGIミドルウェア
+
+レート制限を超えたリクエストは check_rate で 429（Retry-After付き）にします。
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict,deque
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+class TokenBucketLimiter:
+  """トークンバケットによるレート制限（インプロセス）
+
+    キーごとに最大 burst 個のトークンを持ち、1秒あたり rate 個ずつ補充します。
+    リクエストごとにトークンを消費し、足りない場合は拒否します（拒否したリクエストはトークンを消費しません）。
+    キーは maxsize 件までLRUで保持し、破棄したキーは次回満杯のバケットから始まります。
+    複数スレッドから安全に使えるようロックで保護しています。
+
+    Attributes:
+        rate: 1秒あたりに補充するトークンの数
+        burst: バケットの容量（連続して許可するリクエストの数）
+        maxsize: 保持するキーの最大件数
+        allowed: 許可したリクエストの数
+        rejected: 拒否したリクエストの数
+  """
+
+  def __init__(self,rate :float,burst :float,maxsize :int = 100000):
+    self.rate = rate
+    self.burst = burst
+    self.maxsize = maxsize
+    self.allowed = 0
+    self.rejected = 0
+    self._buckets = OrderedDict()
+    self._lock = threading.Lock()
+
+  def acquire(self,key :str,cost :float = 1):
+    """トークンを消費
+
+    Args:
+        key: バケットのキー
+        cost: 消費するトークンの数
+
+    Returns:
+        float: 許可した場合は0、拒否した場合は許可されるまでの秒数
+    """
+    now = time.monotonic()
+    with self._lock:
+      bucket = self._buckets.get(key)
+      if bucket is None:
+        tokens = self.burst
+      else:
+        tokens = min(self.burst,bucket[0] + (now - bucket[1]) * self.rate)
+      if tokens >= cost:
+        tokens -= cost
+        wait = 0.0
+        self.allowed += 1
+      else:
+        wait = (cost - tokens) / self.rate
+        self.rejected += 1
+      self._buckets[key] = (tokens,now)
+      self._buckets.move_to_end(key)
+      while len(self._buckets) > self.maxsize:
+        self._buckets.popitem(last=False)
+    return wait
+
+  def clear(self):
+    """全てのバケットを削除"""
+    with self._lock:
+      self._buckets.clear()
+
+
+# トークンバケットの更新（Redisのサーバー時刻で補充し、読み込みと更新を1回の往復でアトミックに行う）
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1])
+if tokens == nil then
+  tokens = burst
+else
+  tokens = math.min(burst, tokens + math.max(0, now - tonumber(bucket[2])) * rate)
+end
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+class RedisTokenBucketLimiter:
+  """Redis互換の共有レート制限
+
+    複数のワーカープロセスで同じバケットを共有する場合に使用します。
+    バケットの更新はLuaスクリプトで1回の往復で行い、満杯に戻るまでの秒数で有効期限を設定します。
+
+    Attributes:
+        client: register_script / scan_iter / delete を持つRedis互換クライアント
+        rate: 1秒あたりに補充するトークンの数
+        burst: バケットの容量
+        prefix: キーの接頭辞
+  """
+
+  def __init__(self,client,rate :float,burst :float,prefix :str = "task_app:rate:"):
+    self.client = client
+    self.rate = rate
+    self.burst = burst
+    self.prefix = prefix
+    self._script = client.register_script(_TOKEN_BUCKET_SCRIPT)
+
+  def acquire(self,key :str,cost :float = 1):
+    """トークンを消費（許可した場合は0、拒否した場合は許可されるまでの秒数）"""
+    return float(self._script(keys=[self.prefix + key],args=[self.rate,self.burst,cost]))
+
+  def clear(self):
+    """接頭辞に一致するキーを全て削除"""
+    for key in self.client.scan_iter(self.prefix + "*"):
+      self.client.delete(key)
+
+
+def create_limiter(kind :str,rate :float,burst :float,maxsize :int = 100000,prefix :str = "task_app:rate:"):
+  """設定に応じたレート制限を作成
+
+  Args:
+      kind: "memory"（インプロセス）/ "redis"（REDIS_URLに接続）/ "off"（制限しない）
+      rate: 1秒あたりに補充するトークンの数（0以下の場合は制限しない）
+      burst: バケットの容量
+      maxsize: 保持するキーの最大件数（memoryのみ）
+      prefix: キーの接頭辞（redisのみ）
+
+  Returns:
+      TokenBucketLimiter または RedisTokenBucketLimiter（制限しない場合はNone）
+  """
+  if kind == "off" or rate <= 0:
+    return None
+  if kind == "redis":
+    import redis # 任意の依存パッケージ（redisを使う場合のみ必要）
+    return RedisTokenBucketLimiter(redis.Redis.from_url(os.getenv("REDIS_URL","redis://localhost:6379/0")),rate,burst,prefix=prefix)
+  return TokenBucketLimiter(rate,burst,maxsize=maxsize)
+
+def check_rate(limiter,key :str,cost :float = 1):
+  """レート制限を確認し、超えている場合は429にする
+
+  Args:
+      limiter: create_limiter で作成したレート制限（Noneの場合は何もしない）
+      key: バケットのキー
+      cost: 消費するトークンの数
+
+  Raises:
+      HTTPException: レート制限を超えた場合（429、Retry-After に再試行までの秒数）
+  """
+  if limiter is None:
+    return
+  wait = limiter.acquire(key,cost)
+  if wait > 0:
+    raise HTTPException(status_code=429,detail="Too many requests",headers={"Retry-After":str(math.ceil(wait))})
+
+
+class ConcurrencyLimitMiddleware:
+  """同時に処理するリクエスト数を制限するASGIミドルウェア
+
+    max_concurrent 件を処理中の場合、後続のリクエストは到着順に最大 max_waiting 件・wait_seconds 秒まで待ちます。
+    待ちの列が満杯の場合と待ち時間を過ぎた場合は、アプリを呼ばずに503（Retry-After付き）を返します。
+    処理が終わると空いた枠を待っているリクエストへ直接渡すため、後から来たリクエストに追い越されません。
+    exempt のパスで始まるリクエスト（長時間の接続など）は数えません。
+
+    Attributes:
+        max_concurrent: 同時に処理するリクエストの上限
+        max_waiting: 待たせるリクエストの上限
+        wait_seconds: 待たせる最大秒数
+        exempt: 制限しないパスの接頭辞
+        active: 処理中のリクエストの数
+        shed: 503で断ったリクエストの数
+  """
+
+  def __init__(self,app,max_concurrent :int,max_waiting :int = 0,wait_seconds :float = 0,exempt :tuple = ()):
+    self.app = app
+    self.max_concurrent = max_concurrent
+    self.max_waiting = max_waiting
+    self.wait_seconds = wait_seconds
+    self.exempt = tuple(exempt)
+    self.active = 0
+    self.shed = 0
+    self._waiters = deque()
+
+  @property
+  def waiting(self):
+    """待っているリクエストの数"""
+    return sum(1 for future in self._waiters if not future.done())
+
+  async def __call__(self,scope,receive,send):
+    if scope["type"] != "http" or scope["path"].startswith(self.exempt):
+      await self.app(scope,receive,send)
+      return
+    if not await self._acquire():
+      self.shed += 1
+      response = JSONResponse({"detail":"Server is busy"},status_code=503,headers={"Retry-After":str(max(1,math.ceil(self.wait_seconds)))})
+      await response(scope,receive,send)
+      return
+    try:
+      await self.app(scope,receive,send)
+    finally:
+      self._release()
+
+  async def _acquire(self):
+    """処理の枠を取得（取得できずに断る場合はFalse）"""
+    if self.active < self.max_concurrent and not self.waiting:
+      self.active += 1
+      return True
+    if self.waiting >= self.max_waiting or self.wait_seconds <= 0:
+      return False
+    future = asyncio.get_running_loop().create_future()
+    self._waiters.append(future)
+    try:
+      await asyncio.wait_for(future,self.wait_seconds)
+      return True
+    except asyncio.TimeoutError:
+      return False
+    except BaseException:
+      if future.done() and not future.cancelled(): # 枠を受け取った直後に切断された
+        self._release()
+      raise
+    finally:
+      if future in self._waiters and future.done():
+        self._waiters.remove(future)
+
+  def _release(self):
+    """処理の枠を返す（待っているリクエストがあればそのまま渡す）"""
+    while self._waiters:
+      future = self._waiters.popleft()
+      if not future.done():
+        future.set_result(None)
+        return
+    self.active -= 1
@@ -1,18 +1,52 @@
-from fastapi import APIRouter,Depends,HTTPException
-from schemas import UserResponse,UserCreate
-from typing import Annotated
+from fastapi import APIRouter,Depends,HTTPException,Request
+from schemas import UserResponse,UserCreate,Token,RefreshRequest
+from typing import Annotated,Optional
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_session,run_db
 from cruds import auth as auth_cruds
 from starlette import status
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
+from rate_limit import create_limiter,check_rate
+import os
 
 router = APIRouter(prefix="/auth",tags=["auth"])
-DbDependency = Annotated[Session,Depends(get_db)]
+DbDependency = Annotated[Session,Depends(get_session)]
 FormDependency = Annotated[OAuth2PasswordRequestForm,Depends()]
 
-@router.post("/signup",response_model=UserResponse,status_code=status.HTTP_201_CREATED)
+# アクセストークンの有効期限
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=20)
+
+# IPアドレスごとのログイン・ユーザー登録のレート制限（1分あたりの回数と、連続して許可する回数）
+# パスワードのハッシュ（PBKDF2）はCPUを多く使うため、ハッシュの計算前に断る
+login_limiter = create_limiter(
+    os.getenv("RATE_LIMIT","memory"),
+    rate=float(os.getenv("LOGIN_RATE_LIMIT","10")) / 60,
+    burst=float(os.getenv("LOGIN_RATE_BURST","10")),
+    prefix="task_app:rate:login:",
+)
+
+async def limit_login(request :Request):
+    """接続元IPアドレスのレート制限を確認
+
+    Flask経由の場合は、Flaskが X-Forwarded-For で渡した利用者のIPアドレスになります
+    （uvicorn が信頼するプロキシ（--forwarded-allow-ips）からの場合のみ）。
+
+    Raises:
+        HTTPException: レート制限を超えた場合（429）
+    """
+    check_rate(login_limiter,request.client.host if request.client else "unknown")
+
+def token_response(username :str,user_id :int,refresh_token :str):
+    """アクセストークンを作成し、リフレッシュトークンと一緒にレスポンスの形にする"""
+    return {
+        "access_token":auth_cruds.create_access_token(username,user_id,ACCESS_TOKEN_EXPIRES),
+        "token_type":"bearer",
+        "refresh_token":refresh_token,
+        "expires_in":int(ACCESS_TOKEN_EXPIRES.total_seconds()),
+    }
+
+@router.post("/signup",response_model=UserResponse,status_code=status.HTTP_201_CREATED,dependencies=[Depends(limit_login)])
 async def create_user(user_create :UserCreate,db :DbDependency):
     """新規ユーザー登録
     
@@ -21,23 +55,52 @@ async def create_user(user_create :UserCreate,db :DbDependency):
     Returns:
         UserResponse: 作成されたユーザー情報（id, username）
     """
-    return auth_cruds.create_user(user_create,db)
+    return await auth_cruds.create_user(user_create,db)
 
-@router.post("/login")
+@router.post("/login",response_model=Token,dependencies=[Depends(limit_login)])
 async def login(db :DbDependency,form_data :FormDependency):
     """ログイン
     
     ユーザー名とパスワードで認証し、JWTトークンを取得します。
     取得したトークンは以降のAPI呼び出しで使用します。
+    アクセストークンの期限が切れたら、リフレッシュトークンで POST /auth/refresh から更新できます。
     
     Returns:
-        dict: アクセストークン(JWT)、トークンタイプ
+        dict: アクセストークン(JWT)、トークンタイプ、リフレッシュトークン、有効秒数
     Raise:
-        HTTPException: 認証失敗（401）
+        HTTPException: 認証失敗（401）、レート制限を超えた場合（429）
     """
-    user = auth_cruds.login(form_data.username,form_data.password,db)
+    user = await auth_cruds.login(form_data.username,form_data.password,db)
     if not user:
         raise HTTPException(status_code=401,detail="Incorrect username or password")
-    token = auth_cruds.create_access_token(user.username,user.id,timedelta(minutes=20))
-    return {"access_token":token,"token_type":"bearer"}
+    refresh_token = await run_db(db,auth_cruds.create_refresh_token,user.id)
+    return token_response(user.username,user.id,refresh_token)
+
+@router.post("/refresh",response_model=Token)
+async def refresh(body :RefreshRequest,db :DbDependency):
+    """アクセストークンの更新
 
+    リフレッシュトークンを新しいアクセストークン・リフレッシュトークンに交換します。
+    パスワードの検証（PBKDF2）は行いません。使用したリフレッシュトークンは無効になります。
+
+    Returns:
+        dict: アクセストークン(JWT)、トークンタイプ、新しいリフレッシュトークン、有効秒数
+    Raise:
+        HTTPException: リフレッシュトークンが不正・期限切れ・使用済みの場合（401）
+    """
+    rotated = await run_db(db,auth_cruds.rotate_refresh_token,body.refresh_token)
+    if rotated is None:
+        raise HTTPException(status_code=401,detail="Invalid refresh token")
+    user,refresh_token = rotated
+    return token_response(user.username,user.user_id,refresh_token)
+
+@router.post("/logout",status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token :Annotated[str,Depends(auth_cruds.oauth2_scheme)],db :DbDependency,body :Optional[RefreshRequest] = None):
+    """ログアウト
+
+    アクセストークンを無効にし、以降のリクエストでは401にします（トークンの有効期限まで記録）。
+    リフレッシュトークンを送った場合は、同じログインのリフレッシュトークンを全て無効にします。
+    """
+    auth_cruds.invalidate_token(token)
+    if body is not None:
+        await run_db(db,auth_cruds.revoke_refresh_token,body.refresh_token)
@@ -1,89 +1,489 @@
 from fastapi import APIRouter,Depends
 from typing import Annotated
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_session,run_db
 from models import Item
 from schemas import ItemResponse,ItemCreate,ItemUpdate
 from starlette import status
-from fastapi import FastAPI,Depends,Query,HTTPException
-from schemas import ItemCreate,ItemResponse,ItemUpdate,DecodedToken
-from typing import Optional,Annotated
+from fastapi import FastAPI,Depends,Query,HTTPException,Body,Header
+from schemas import ItemCreate,ItemResponse,ItemUpdate,DecodedToken,ItemPage,TaskIds,BulkDeleteResponse,TaskSummary,TaskChanges
+from typing import Optional,Annotated,Literal,Union
+from fastapi import Request,Response
+from fastapi.responses import StreamingResponse
+from email.utils import format_datetime
+from datetime import timezone
+import hashlib
+import os
+import time
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Item
-from database import get_db
 from sqlalchemy.orm import Session
 from datetime import date,timedelta
 from starlette import status
 from cruds import task as task_cruds,auth as auth_cruds
+import fast_json
+from events import HEARTBEAT,LAGGED,PING,format_event
+from rate_limit import create_limiter,check_rate
 
-router = APIRouter(prefix="/tasks",tags=["tasks"])
-
-DbDependency = Annotated[Session,Depends(get_db)]
+DbDependency = Annotated[Session,Depends(get_session)]
 UserDependency = Annotated[DecodedToken,Depends(auth_cruds.get_current_user)]
 
-@router.get("",response_model=list[ItemResponse],status_code=status.HTTP_200_OK)
-async def find_all(db :DbDependency,user :UserDependency):
+# ユーザーごとのレート制限（1秒あたりのリクエスト数と、連続して許可するリクエスト数）
+user_limiter = create_limiter(
+    os.getenv("RATE_LIMIT","memory"),
+    rate=float(os.getenv("USER_RATE_LIMIT","20")),
+    burst=float(os.getenv("USER_RATE_BURST","100")),
+    prefix="task_app:rate:user:",
+)
+
+async def limit_user(user :UserDependency):
+    """ログイン中のユーザーのレート制限を確認（タスクの全エンドポイントで実行）
+
+    Raises:
+        HTTPException: レート制限を超えた場合（429）
+    """
+    check_rate(user_limiter,str(user.user_id))
+
+router = APIRouter(prefix="/tasks",tags=["tasks"],dependencies=[Depends(limit_user)])
+
+# 一括作成で1リクエストに含められるタスクの上限件数
+BULK_CREATE_LIMIT = 1000
+
+# 差分同期で1リクエストに返す変更の上限件数（limit の上限）
+CHANGES_LIMIT = 1000
+
+# 差分同期のカーソル（変更番号、または "変更番号:削除記録のid:タスクのid"）
+CHANGE_CURSOR_PATTERN = r"^\d{1,18}(:\d{1,18}:\d{1,18})?$"
+
+# GET /tasks/events の1接続の最大秒数（過ぎると接続を閉じ、クライアントは Last-Event-ID 付きで再接続して認証し直す）
+EVENTS_MAX_SECONDS = float(os.getenv("TASK_EVENTS_MAX_SECONDS","1200"))
+# クライアント（EventSource）が切断後に再接続するまでのミリ秒
+EVENTS_RETRY_MS = int(os.getenv("TASK_EVENTS_RETRY_MS","3000"))
+
+async def check_not_modified(request :Request,db :Session,user_id :int):
+    """条件付きGET（If-None-Match）を判定
+
+    ユーザーのタスク変更番号とリクエストURLからETagを作成し、
+    クライアントが持っているETagと一致するか判定します。
+    変更番号の取得はusersの主キー検索1回のみで、タスクは読み込みません。
+    Last-Modified は秒単位のため同じ秒の2回目以降の変更を区別できず、参考として返すだけで
+    If-Modified-Since による304の判定には使いません（変更番号を含むETagで判定します）。
+
+    Args:
+        request: リクエスト
+        db: データベースセッション
+        user_id: ログイン中のユーザーID
+
+    Returns:
+        tuple: (レスポンスに付けるヘッダー, 変更がなく304を返せる場合はTrue, 変更番号)
+    """
+    version,modified_at = await run_db(db,task_cruds.get_version,user_id=user_id)
+    digest = hashlib.sha1(f"{user_id}:{request.url.path}?{request.url.query}".encode()).hexdigest()[:16]
+    etag = f'"{version}-{digest}"'
+    headers = {"ETag":etag,"Cache-Control":"private, no-cache"}
+    if modified_at is not None:
+        modified_at = modified_at.replace(tzinfo=timezone.utc,microsecond=0)
+        headers["Last-Modified"] = format_datetime(modified_at,usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return headers,(etag in tags or "*" in tags),version
+    return headers,False,version
+
+class TaskFilters:
+    """GET /tasks の絞り込み・並び替え条件（クエリパラメータ）"""
+
+    def __init__(
+        self,
+        completed :Optional[bool] = Query(default=None),
+        due_after :Optional[date] = Query(default=None,example="2025-10-27"),
+        due_before :Optional[date] = Query(default=None,example="2025-11-02"),
+        q :Optional[str] = Query(default=None,min_length=1,max_length=100),
+        sort :Optional[Literal["id","due_date","title"]] = Query(default=None),
+        direction :Literal["asc","desc"] = Query(default="asc"),
+        order :Optional[Literal["id","due_date","title"]] = Query(default=None,deprecated=True),
+    ):
+        self.filters = {"completed":completed,"due_after":due_after,"due_before":due_before,"q":q}
+        self.order = sort or order or "id"
+        self.direction = direction
+
+    @property
+    def is_default(self):
+        """絞り込みなし・id昇順（キャッシュ済みの全件取得を使える条件）か"""
+        return all(value is None for value in self.filters.values()) and self.order == "id" and self.direction == "asc"
+
+    def kwargs(self):
+        """cruds の find_page / find_filtered / iter_all に渡す引数"""
+        return {"order":self.order,"direction":self.direction,**{key:value for key,value in self.filters.items() if value is not None}}
+
+FiltersDependency = Annotated[TaskFilters,Depends()]
+
+@router.get("",response_model=Union[list[ItemResponse],ItemPage],status_code=status.HTTP_200_OK)
+async def find_all(
+    request :Request,
+    response :Response,
+    db :DbDependency,
+    user :UserDependency,
+    filters :FiltersDependency,
+    limit :Optional[int] = Query(default=None,ge=1,le=1000,example=50),
+    after :Optional[str] = Query(default=None),
+    stream :bool = Query(default=False)
+):
     """全タスクを取得
     
     ログイン中のユーザーに紐づく全てのタスクを取得します。
+    絞り込み・並び替えは全てSQLで行い、条件に一致するタスクだけを返します。
+    limit または after を指定するとカーソルページングになり、
+    stream=true を指定するとNDJSON形式で1行1タスクずつ返します。
+    ETagを返し、If-None-Match が一致する場合はタスクを読み込まずに304を返します。
+    条件なしの全件取得はユーザーごとにシリアライズ済みの結果をキャッシュします。
+    TASK_FAST_JSON=on の場合、ItemResponseでの検証を省き、SELECTした列の値から直接JSONを作成します。
+
+    Args:
+        completed: 完了状態で絞り込み（true / false）
+        due_after: この日以降が期限のタスクに絞り込み（YYYY-MM-DD）
+        due_before: この日以前が期限のタスクに絞り込み（YYYY-MM-DD）
+        q: タイトルまたは内容の部分一致検索
+        sort: 並び替え列（id / due_date / title）
+        direction: 並び順（asc / desc）
+        order: sort の旧名（非推奨）
+        limit: 1ページの件数（指定時はItemPageを返す）
+        after: 前ページのnext_cursor（同じ条件で指定する）
+        stream: trueの場合NDJSONでストリーミング
         
     Returns:
-        list[ItemResponse]: 全タスクのリスト
+        list[ItemResponse]: 条件に一致するタスクのリスト
+        ItemPage: ページング時の1ページ分のタスクと次ページのカーソル
+
+    Raises:
+        HTTPException: カーソルが不正な場合（400）
     """
-    return task_cruds.find_all(db,user.user_id)
+    headers,not_modified,version = await check_not_modified(request,db,user.user_id)
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,headers=headers)
+    if stream:
+        return StreamingResponse(_ndjson(db,user.user_id,filters.kwargs()),media_type="application/x-ndjson",headers=headers)
+    fast = task_cruds.FAST_JSON_ENABLED
+    if limit is None and after is None:
+        if filters.is_default:
+            body = await task_cruds.find_all_json(db,user.user_id,version)
+            return Response(content=body,media_type="application/json",headers=headers)
+        if fast:
+            body = await run_db(db,task_cruds.find_filtered_json,user_id=user.user_id,**filters.kwargs())
+            return Response(content=body,media_type="application/json",headers=headers)
+        response.headers.update(headers)
+        return await run_db(db,task_cruds.find_filtered,user_id=user.user_id,**filters.kwargs())
+    response.headers.update(headers)
+    try:
+        if fast:
+            body = await run_db(db,task_cruds.find_page_json,user_id=user.user_id,limit=limit or 100,after=after,**filters.kwargs())
+            return Response(content=body,media_type="application/json",headers=headers)
+        items,next_cursor = await run_db(db,task_cruds.find_page,user_id=user.user_id,limit=limit or 100,after=after,**filters.kwargs())
+    except ValueError:
+        raise HTTPException(status_code=400,detail="Invalid cursor")
+    return {"items":items,"next_cursor":next_cursor}
+
+def _ndjson(db :Session,user_id :int,kwargs :dict):
+    """タスクを1行ずつJSONにしたNDJSONのイテレータを返す"""
+    if task_cruds.FAST_JSON_ENABLED:
+        def dump(row):
+            return fast_json.dump_row(row,task_cruds.ITEM_FIELDS) + b"\n"
+        kwargs = {**kwargs,"rows":True}
+    else:
+        def dump(item):
+            return ItemResponse.model_validate(item).model_dump_json() + "\n"
+    if isinstance(db,AsyncSession):
+        async def lines():
+            async for item in task_cruds.aiter_all(db,user_id,**kwargs):
+                yield dump(item)
+        return lines()
+    return (dump(item) for item in task_cruds.iter_all(db,user_id,**kwargs))
 
 
-@router.get("/",response_model=list[ItemResponse],status_code=status.HTTP_200_OK)
-async def find_by_due(db :DbDependency,due_date :str = Query(example="2025-10-30"),end :Optional[int] = Query(default=None,example=7)):
+async def _find_by_due_range(db :Session,user_id :int,due_date :date,end :Optional[int],limit :Optional[int],after :Optional[str]):
+    """期限日範囲の検索（limit / after 指定時はカーソルページング）"""
+    if limit is None and after is None:
+        found_items = await run_db(db,task_cruds.find_by_due,user_id=user_id,due_date=due_date.isoformat(),end=end)
+        if not found_items:
+            raise HTTPException(status_code=404,detail="Task not found")
+        return found_items
+    due_after,due_before = task_cruds.due_range(due_date,end)
+    try:
+        items,next_cursor = await run_db(db,task_cruds.find_page,user_id=user_id,limit=limit or 100,after=after,order="due_date",due_after=due_after,due_before=due_before)
+    except ValueError:
+        raise HTTPException(status_code=400,detail="Invalid cursor")
+    return {"items":items,"next_cursor":next_cursor}
+
+@router.get("/",response_model=Union[list[ItemResponse],ItemPage],status_code=status.HTTP_200_OK)
+async def find_by_due(
+    db :DbDependency,
+    user :UserDependency,
+    due_date :str = Query(example="2025-10-30"),
+    end :Optional[int] = Query(default=None,example=7),
+    limit :Optional[int] = Query(default=None,ge=1,le=1000,example=50),
+    after :Optional[str] = Query(default=None)
+):
     """期限日でタスクを検索
     
-    指定した期限日、または期限日から指定日数範囲内のタスクを取得します。
+    ログイン中のユーザーのタスクから、指定した期限日、または期限日から指定日数範囲内のタスクを取得します。
     endパラメータを省略すると、due_dateと完全一致するタスクのみ取得します。
+    limit または after を指定するとカーソルページングになります。
     
     Args:
         due_date: 検索開始日（YYYY-MM-DD形式）
         end: 検索終了日までの日数（省略時はdue_dateのみ）
+        limit: 1ページの件数（指定時はItemPageを返す）
+        after: 前ページのnext_cursor
         
     Returns:
-        list[ItemResponse]: 検索条件に一致するタスクのリスト
+        list[ItemResponse]: 検索条件に一致するタスクのリスト（期限日順）
+        ItemPage: ページング時の1ページ分のタスクと次ページのカーソル
         
     Raises:
-        HTTPException: 日付形式が不正な場合（400）、タスクが見つからない場合（404）
+        HTTPException: 日付形式・カーソルが不正な場合（400）、タスクが見つからない場合（404）
     """
-    try:    
-        found_items = task_cruds.find_by_due(db,due_date,end)
+    try:
+        from_dt = date.fromisoformat(due_date)
     except ValueError:
-        raise HTTPException(status_code=400,detail="nvalid date format. Use YYYY-MM-DD")
-    if not found_items:
-        raise HTTPException(status_code=404,detail="Task not found")
-    return found_items
+        raise HTTPException(status_code=400,detail="Invalid date format. Use YYYY-MM-DD")
+    return await _find_by_due_range(db,user.user_id,from_dt,end,limit,after)
 
-@router.get("/today",response_model=list[ItemResponse],status_code=status.HTTP_200_OK)
-async def find_by_due_fromtoday(db :DbDependency,end :Optional[int] = Query(default=None,example=7)):
+@router.get("/today",response_model=Union[list[ItemResponse],ItemPage],status_code=status.HTTP_200_OK)
+async def find_by_due_fromtoday(
+    db :DbDependency,
+    user :UserDependency,
+    end :Optional[int] = Query(default=None,example=7),
+    limit :Optional[int] = Query(default=None,ge=1,le=1000,example=50),
+    after :Optional[str] = Query(default=None)
+):
     """今日を起点に期限日でタスクを検索
     
-    今日の日付を起点として、指定日数範囲内のタスクを取得します。
+    ログイン中のユーザーのタスクから、今日の日付を起点として指定日数範囲内のタスクを取得します。
     endパラメータを省略すると、今日が期限のタスクのみ取得します。
+    limit または after を指定するとカーソルページングになります。
     
     Args:
         end: 今日から何日後までのタスクを取得するか（省略時は今日のみ）
+        limit: 1ページの件数（指定時はItemPageを返す）
+        after: 前ページのnext_cursor
        
     Returns:
-        list[ItemResponse]: 検索条件に一致するタスクのリスト
+        list[ItemResponse]: 検索条件に一致するタスクのリスト（期限日順）
+        ItemPage: ページング時の1ページ分のタスクと次ページのカーソル
         
     Raises:
-        HTTPException: タスクが見つからない場合（404）
+        HTTPException: カーソルが不正な場合（400）、タスクが見つからない場合（404）
     """
-    found_items = task_cruds.find_by_due_fromtoday(db,end)
-    if not found_items:
-        raise HTTPException(status_code=404,detail="Task not found")
-    return found_items
+    return await _find_by_due_range(db,user.user_id,date.today(),end,limit,after)
+
+
+@router.get("/search",response_model=list[ItemResponse],status_code=status.HTTP_200_OK)
+async def search(
+    request :Request,
+    response :Response,
+    db :DbDependency,
+    user :UserDependency,
+    q :str = Query(min_length=1,max_length=100,examples=["牛乳 買い物"]),
+    limit :int = Query(default=50,ge=1,le=1000)
+):
+    """タイトル・内容の全文検索
+
+    全文検索の索引でログイン中のユーザーのタスクを検索し、一致度の高い順に返します。
+    空白で区切った語は全て含むもの（AND）を検索し、各語はタイトル・内容の一部に一致すれば対象になります。
+    3文字未満の語を含む場合は部分一致（LIKE）で検索し、id順に返します。
+
+    Args:
+        q: 検索文字列
+        limit: 最大件数
+
+    Returns:
+        list[ItemResponse]: 一致したタスクのリスト（一致度順）
+    """
+    headers,not_modified,version = await check_not_modified(request,db,user.user_id)
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,headers=headers)
+    response.headers.update(headers)
+    return await run_db(db,task_cruds.search,user_id=user.user_id,q=q,limit=limit)
+
+
+@router.get("/batch",response_model=list[ItemResponse],status_code=status.HTTP_200_OK)
+async def find_by_ids(request :Request,response :Response,db :DbDependency,user :UserDependency,ids :list[int] = Query(min_length=1,max_length=1000,examples=[[1,2,3]])):
+    """複数のIDでタスクをまとめて取得
+
+    クエリパラメータ ids（?ids=1&ids=2 の形式）で指定したタスクを1回のリクエストで取得します。
+    ログイン中のユーザーのタスクのみを返し、見つからないIDは結果に含みません。
+
+    Args:
+        ids: タスクIDのリスト
+
+    Returns:
+        list[ItemResponse]: 取得したタスクのリスト（id順）
+    """
+    headers,not_modified,version = await check_not_modified(request,db,user.user_id)
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,headers=headers)
+    response.headers.update(headers)
+    return await run_db(db,task_cruds.find_by_ids,ids,user_id=user.user_id)
+
+
+@router.get("/summary",response_model=TaskSummary,status_code=status.HTTP_200_OK)
+async def summary(db :DbDependency,user :UserDependency,days :int = Query(default=7,ge=0,le=365)):
+    """タスク数の集計
+
+    完了・未完了・期限切れ・今日が期限・days日以内が期限のタスク数を返します。
+    タスク一覧を読み込まず、トリガーで更新している集計表から集計するため、タスクの件数が増えても応答時間は変わりません。
+
+    Args:
+        days: due_within に含める今日からの日数
+
+    Returns:
+        TaskSummary: タスク数の集計
+    """
+    return await run_db(db,task_cruds.summary,user_id=user.user_id,days=days)
+
+
+@router.get("/changes",response_model=TaskChanges,status_code=status.HTTP_200_OK)
+async def find_changes(
+    request :Request,
+    response :Response,
+    db :DbDependency,
+    user :UserDependency,
+    since :str = Query(default="0",pattern=CHANGE_CURSOR_PATTERN,example="42"),
+    limit :int = Query(default=CHANGES_LIMIT,ge=1,le=CHANGES_LIMIT)
+):
+    """前回の同期以降に変更されたタスクを取得（差分同期）
+
+    カーソル since より後に作成・更新されたタスクと、削除されたタスクのidを返します。
+    初回は since=0 で全件を取得し、以降はレスポンスの cursor を since に指定します。
+    変更がない場合（since が現在の変更番号と同じ場合）はタスクを読み込まずに空の結果を返します。
+    ETagを返し、If-None-Match が一致する場合は304を返します。
+
+    Args:
+        since: 前回の同期で受け取った cursor（初回は0）
+        limit: 1回で返す変更の最大件数（1つの変更番号の変更が超える場合はページを分けます）
+
+    Returns:
+        TaskChanges: 変更されたタスク・削除されたタスクのidと、次回の since にするカーソル
+
+    Raises:
+        HTTPException: カーソルが不正な場合（400）、
+            since が現在の変更番号より大きい場合（410、データベースの復元などで同期できないため since=0 から取得し直す）
+    """
+    headers,not_modified,version = await check_not_modified(request,db,user.user_id)
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,headers=headers)
+    try:
+        revision,_,_ = task_cruds.decode_change_cursor(since)
+    except ValueError:
+        raise HTTPException(status_code=400,detail="Invalid cursor")
+    if revision > version:
+        raise HTTPException(status_code=410,detail="Revision is ahead of the server. Sync again from since=0")
+    response.headers.update(headers)
+    if since == str(version):
+        return {"items":[],"deleted":[],"revision":version,"cursor":since,"has_more":False}
+    items,deleted,cursor = await run_db(db,task_cruds.find_changes,user_id=user.user_id,since=since,limit=limit)
+    if cursor is None:
+        return {"items":items,"deleted":deleted,"revision":version,"cursor":str(version),"has_more":False}
+    return {"items":items,"deleted":deleted,"revision":task_cruds.synced_revision(cursor),"cursor":cursor,"has_more":True}
+
+
+@router.get("/events",response_class=StreamingResponse,status_code=status.HTTP_200_OK,responses={200:{"content":{"text/event-stream":{}}}})
+async def events(
+    db :DbDependency,
+    user :UserDependency,
+    since :Optional[str] = Query(default=None,pattern=CHANGE_CURSOR_PATTERN,example="42"),
+    last_event_id :Optional[str] = Header(default=None)
+):
+    """タスクの変更をServer-Sent Eventsで受け取る
+
+    ログイン中のユーザーのタスクが作成・更新・削除されるたびに、tasks イベント
+    （data は {"revision", "items", "deleted"}、id は変更番号）を送信します。
+    差分同期で1つの変更番号の途中までを送る場合、id は差分同期のカーソルです。
+    接続直後に ready イベントを送り、HEARTBEAT の間隔でコメント行（: ping）を送ります。
+    再接続時の Last-Event-ID（または since）より後の変更は、差分同期で取得して先に送信します。
+    クライアントの受信が遅れて通知が溜まりすぎた場合も、溜まった通知を捨てて差分同期で追いつきます。
+    接続は TASK_EVENTS_MAX_SECONDS で閉じるため、クライアントは再接続してください（EventSource は自動で再接続します）。
+
+    Args:
+        since: この変更番号（または差分同期のカーソル）より後の変更から送信（省略時は接続した時点以降）
+        last_event_id: 最後に受信したイベントID（EventSource が再接続時に送るヘッダー、since より優先）
+
+    Returns:
+        StreamingResponse: text/event-stream
+
+    Raises:
+        HTTPException: Last-Event-ID が不正な場合（400）、変更番号がサーバーより大きい場合（410、since=0 から同期し直す）
+    """
+    if last_event_id:
+        try:
+            task_cruds.decode_change_cursor(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400,detail="Invalid Last-Event-ID")
+        since = last_event_id
+    # 購読してから変更番号を読むため、読んだ後の変更は必ず通知で届く
+    # （レスポンスの送信前に切断されて _events が実行されなかった購読は、参照がなくなると自動で削除される）
+    subscription = task_cruds.task_events.subscribe(user.user_id)
+    try:
+        version,_ = await run_db(db,task_cruds.get_version,user_id=user.user_id)
+        await _release(db)
+        if since is None:
+            since = str(version)
+        if task_cruds.decode_change_cursor(since)[0] > version:
+            raise HTTPException(status_code=410,detail="Revision is ahead of the server. Sync again from since=0")
+    except BaseException:
+        task_cruds.task_events.unsubscribe(subscription)
+        raise
+    headers = {"Cache-Control":"no-cache","X-Accel-Buffering":"no"}
+    return StreamingResponse(_events(db,user.user_id,subscription,since,version),media_type="text/event-stream",headers=headers)
+
+async def _release(db :Session):
+    """セッションのトランザクションを終了し、DB接続をプールに返す（待機中の接続がDB接続を持ち続けないようにする）"""
+    if isinstance(db,AsyncSession):
+        await db.rollback()
+    else:
+        db.rollback()
+
+async def _catch_up(db :Session,user_id :int,since :str,version :Optional[int] = None):
+    """カーソル since より後の変更を差分同期で取得し、(受け取り終えた変更番号, tasks イベント) をページごとに返す"""
+    if version is None:
+        version,_ = await run_db(db,task_cruds.get_version,user_id=user_id)
+    while task_cruds.synced_revision(since) < version:
+        items,deleted,cursor = await run_db(db,task_cruds.find_changes,user_id=user_id,since=since,limit=CHANGES_LIMIT)
+        await _release(db)
+        since = str(version) if cursor is None else cursor
+        revision = task_cruds.synced_revision(since)
+        yield revision,task_cruds.change_event(revision,items,deleted,cursor=since)
+    await _release(db)
+
+async def _events(db :Session,user_id :int,subscription,since :str,version :int):
+    """GET /tasks/events のイベントのイテレータ（終了・切断時に購読を削除）"""
+    deadline = time.monotonic() + EVENTS_MAX_SECONDS
+    last = task_cruds.synced_revision(since)
+    try:
+        yield format_event({"revision":last},event="ready",id=since,retry=EVENTS_RETRY_MS)
+        async for last,frame in _catch_up(db,user_id,since,version):
+            yield frame
+        while time.monotonic() < deadline:
+            message = await subscription.get()
+            if message == HEARTBEAT:
+                yield PING
+            elif message == LAGGED:
+                async for last,frame in _catch_up(db,user_id,str(last)):
+                    yield frame
+            elif message[0] > last: # 差分同期で送信済みの変更は読み飛ばす
+                last,frame = message
+                yield frame
+    finally:
+        task_cruds.task_events.unsubscribe(subscription)
 
 
 @router.get("/{id}",response_model=Optional[ItemResponse],status_code=status.HTTP_200_OK)
-async def find_by_id(id :int,db :DbDependency,user :UserDependency):
+async def find_by_id(id :int,request :Request,response :Response,db :DbDependency,user :UserDependency):
     """IDでタスクを取得
     
     指定されたIDに一致する単一のタスクを取得します。
+    ETagを返し、If-None-Match が一致する場合はタスクを読み込まずに304を返します。
     
     Args:
         id: タスクID
@@ -94,9 +494,13 @@ async def find_by_id(id :int,db :DbDependency,user :UserDependency):
     Raises:
         HTTPException: タスクが見つからない場合（404）
     """
-    found_item = task_cruds.find_by_id(id,db,user.user_id)
+    headers,not_modified,version = await check_not_modified(request,db,user.user_id)
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,headers=headers)
+    found_item = await run_db(db,task_cruds.find_by_id,id,user_id=user.user_id)
     if not found_item:
         raise HTTPException(status_code=404,detail="Task not found")
+    response.headers.update(headers)
     return found_item
 
 
@@ -110,10 +514,22 @@ async def create(create_item :ItemCreate,db :DbDependency,user :UserDependency):
     Returns:
         ItemResponse: 作成されたタスク
     """
-    new_item = task_cruds.create(create_item,db,user.user_id)
+    new_item = await run_db(db,task_cruds.create,create_item,user_id=user.user_id)
     return new_item
 
 
+@router.post("/bulk",response_model=list[ItemResponse],status_code=status.HTTP_201_CREATED)
+async def create_many(create_items :Annotated[list[ItemCreate],Body(min_length=1,max_length=BULK_CREATE_LIMIT)],db :DbDependency,user :UserDependency):
+    """タスクを一括作成
+
+    リクエストボディで受け取った複数のタスクを1回のINSERT文でまとめて作成します。
+
+    Returns:
+        list[ItemResponse]: 作成されたタスクのリスト
+    """
+    return await run_db(db,task_cruds.create_many,create_items,user_id=user.user_id)
+
+
 @router.put("/{id}",response_model=ItemResponse,status_code=status.HTTP_200_OK)
 async def update(update_item :ItemUpdate,id :int,db :DbDependency,user :UserDependency):
     """タスクを更新
@@ -130,7 +546,7 @@ async def update(update_item :ItemUpdate,id :int,db :DbDependency,user :UserDepe
     Raises:
         HTTPException: タスクが見つからない場合（404）
     """
-    update_item = task_cruds.update(update_item,id,db,user.user_id)
+    update_item = await run_db(db,task_cruds.update,update_item,id,user_id=user.user_id)
     if not update_item:
         raise HTTPException(status_code=404,detail="Task not found")
     return update_item
@@ -150,7 +566,20 @@ async def delete(id :int,db :DbDependency,user :UserDependency):
     Raises:
         HTTPException: タスクが見つからない場合（404）
     """
-    delete_item = task_cruds.delete(id,db,user.user_id)
+    delete_item = await run_db(db,task_cruds.delete,id,user_id=user.user_id)
     if not delete_item:
         raise HTTPException(status_code=404,detail="Task not found")
-    return delete_item
\ No newline at end of file
+    return delete_item
+
+@router.post("/bulk-delete",response_model=BulkDeleteResponse,status_code=status.HTTP_200_OK)
+async def delete_many(task_ids :TaskIds,db :DbDependency,user :UserDependency):
+    """タスクを一括削除
+
+    リクエストボディで受け取った複数のIDのタスクを1回のリクエストでまとめて削除します。
+    ログイン中のユーザーのタスクのみが削除対象です。
+
+    Returns:
+        BulkDeleteResponse: 削除したIDと見つからなかったIDの一覧
+    """
+    deleted,not_found = await run_db(db,task_cruds.delete_many,task_ids.ids,user_id=user.user_id)
+    return {"deleted":deleted,"not_found":not_found}
@@ -4,7 +4,7 @@ FastAPIのリクエスト/レスポンスで使用するPydanticスキーマを
 データのバリデーション、シリアライゼーション、ドキュメント生成に使用されます。
 """
 from pydantic import BaseModel,Field,ConfigDict
-from datetime import date
+from datetime import date,datetime
 from typing import Optional
 
 
@@ -49,6 +49,50 @@ class ItemResponse(BaseModel):
         model_config = ConfigDict(from_attributes=True)
 
 
+class ItemPage(BaseModel):
+        """タスク一覧のページ用スキーマ
+
+        カーソルページングで取得したタスクの1ページ分を返却する構造を定義します。
+
+        Attributes:
+            items: このページのタスク
+            next_cursor: 次のページを取得するためのカーソル（最終ページの場合はNone）
+        """
+        items : list[ItemResponse]
+        next_cursor : Optional[str] = Field(default=None,examples=["WyIyMDI1LTEwLTI2IiwgMTJd"])
+
+
+class ItemChange(ItemResponse):
+        """差分同期で返すタスク用スキーマ
+
+        Attributes:
+            revision: 最後に作成・更新したときの変更番号
+            updated_at: 最後に作成・更新した日時（UTC）
+        """
+        revision : int = Field(examples=[42])
+        updated_at : Optional[datetime] = Field(default=None,examples=["2025-10-26T09:30:00"])
+
+
+class TaskChanges(BaseModel):
+        """差分同期（GET /tasks/changes）のレスポンス用スキーマ
+
+        クライアントは deleted のタスクを削除してから items のタスクを追加・上書きし、
+        cursor を次回の since に使います。has_more が true の間は続けて取得します。
+
+        Attributes:
+            items: 作成・更新されたタスク（変更番号順）
+            deleted: 削除されたタスクのid
+            revision: 全ての変更を受け取り終えた変更番号
+            cursor: 次回の since に指定するカーソル（1つの変更番号の途中でページを分けた場合は "変更番号:削除記録のid:タスクのid"）
+            has_more: 続きの変更があるか
+        """
+        items : list[ItemChange]
+        deleted : list[int]
+        revision : int = Field(examples=[42])
+        cursor : str = Field(examples=["42"])
+        has_more : bool = Field(examples=[False])
+
+
 class ItemUpdate(BaseModel):
         """タスク更新用スキーマ
         
@@ -67,6 +111,49 @@ class ItemUpdate(BaseModel):
         completed : Optional[bool] = Field(default=None,examples=[False])
         
 
+class TaskIds(BaseModel):
+        """タスクID一覧用スキーマ
+
+        複数のタスクをまとめて操作する際のリクエストボディの構造を定義します。
+
+        Attributes:
+            ids: タスクIDのリスト（1〜1000件）
+        """
+        ids : list[int] = Field(min_length=1,max_length=1000,examples=[[1,2,3]])
+
+
+class BulkDeleteResponse(BaseModel):
+        """一括削除結果用スキーマ
+
+        Attributes:
+            deleted: 削除したタスクID
+            not_found: 見つからなかった（または他ユーザーの）タスクID
+        """
+        deleted : list[int]
+        not_found : list[int]
+
+
+class TaskSummary(BaseModel):
+        """タスク数の集計用スキーマ
+
+        Attributes:
+            total: タスク数
+            completed: 完了したタスク数
+            open: 未完了のタスク数
+            overdue: 期限切れ（期限日が今日より前）の未完了タスク数
+            due_today: 今日が期限の未完了タスク数
+            due_within: 今日から days 日後までが期限の未完了タスク数（今日を含む）
+            days: due_within の日数
+        """
+        total : int = Field(examples=[12])
+        completed : int = Field(examples=[5])
+        open : int = Field(examples=[7])
+        overdue : int = Field(examples=[1])
+        due_today : int = Field(examples=[2])
+        due_within : int = Field(examples=[4])
+        days : int = Field(examples=[7])
+
+
 class UserCreate(BaseModel):
         username : str = Field(min_length=2,examples=["user1"])
         password : str = Field(min_length=8,examples=["test1234"])
@@ -76,8 +163,26 @@ class UserResponse(BaseModel):
         username : str = Field(min_length=2,examples=["user1"])
 
 class Token(BaseModel):
+        """ログイン・トークン更新のレスポンス用スキーマ
+
+        Attributes:
+            access_token: JWTアクセストークン
+            token_type: トークンの種類（bearer）
+            refresh_token: アクセストークンの更新に使うリフレッシュトークン（1回のみ使用可能）
+            expires_in: アクセストークンの有効秒数
+        """
         access_token : str
         token_type : str
+        refresh_token : str
+        expires_in : int
+
+class RefreshRequest(BaseModel):
+        """トークン更新・ログアウト用スキーマ
+
+        Attributes:
+            refresh_token: ログインまたは前回の更新で取得したリフレッシュトークン
+        """
+        refresh_token : str = Field(min_length=1)
 
 class DecodedToken(BaseModel):
         username : str
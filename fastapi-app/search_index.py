@@ -0,0 +1,51 @@
+"""全文検索の索引（tasks_fts）の管理
+
+通常はトリガーで tasks と同期されますが、トリガー作成前のデータを取り込んだ場合や
+索引の不整合が疑われる場合に、tasks から索引を作り直します。
+
+実行方法:
+    python search_index.py rebuild    # tasks から索引を作り直す
+    python search_index.py optimize   # 索引のセグメントを1つにまとめ、検索を速くする
+    python search_index.py check      # 索引と tasks の内容が一致するか検査する
+"""
+
+import argparse
+import sys
+import time
+from sqlalchemy import text
+
+COMMANDS = {
+    "rebuild":"INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')",
+    "optimize":"INSERT INTO tasks_fts(tasks_fts) VALUES ('optimize')",
+    "check":"INSERT INTO tasks_fts(tasks_fts,rank) VALUES ('integrity-check',1)",
+}
+
+def run(command :str,engine = None):
+    """索引の管理コマンドを実行
+
+    Args:
+        command: "rebuild" / "optimize" / "check"
+        engine: SQLAlchemyエンジン（Noneの場合は database.engine）
+
+    Returns:
+        float: 実行にかかった秒数
+
+    Raises:
+        sqlalchemy.exc.DatabaseError: check で索引の不整合が見つかった場合
+    """
+    if engine is None:
+        from database import engine
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text(COMMANDS[command]))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="全文検索の索引（tasks_fts）を管理します")
+    parser.add_argument("command",choices=list(COMMANDS),help="実行するコマンド")
+    args = parser.parse_args()
+    elapsed = run(args.command)
+    print(f"{args.command}: {elapsed:.2f} 秒",file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,15 @@
-from database import SessionLocal
-import csv
-from models import Item
-from datetime import date
+"""サンプルデータ投入
 
+test_data.csv のタスクを importer で一括投入します。
 
-db = SessionLocal()
+実行方法:
+    python seed.py [user_id]   # user_id省略時は1
+"""
+import sys
+from importer import import_file
 
- 
-with open("test_data.csv","r",encoding="utf-8") as f:
-  #open('test_data.csv', 'r') = ファイルを読み込みモードで開く
-  #encoding='utf-8' = 日本語対応
-  #with ... as f: = 終わったら自動でファイルを閉じる
-  reader = csv.DictReader(f)
-  for row in reader:
-    task = Item(
-      title = row["title"],
-      content = row["content"],
-      due_date = date.fromisoformat(row["due_date"]),
-      completed = row["completed"] == True
-        #row['completed'] = 文字列の"True"か"False"
-        #== 'True' = 文字列と比較してbool値を作る
-    )
-    db.add(task)
+user_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1 # tasks.user_idは必須のため登録先ユーザーを指定
 
-db.commit()
-db.close()
+count = import_file("test_data.csv",user_id=user_id)
 
-print("test_tasksを挿入しました")
\ No newline at end of file
+print(f"test_tasksを{count}件挿入しました")
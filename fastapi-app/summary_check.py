@@ -0,0 +1,55 @@
+"""タスク数の集計表（task_summaries / task_due_counts）の管理
+
+通常はトリガーで tasks と同期されますが、トリガーを通らない変更（トリガー作成前のデータ、手作業の修正など）で
+集計表がずれていないかを tasks の GROUP BY と比較して検査し、ずれたユーザーの集計表を作り直します。
+
+実行方法:
+    python summary_check.py check            # 一致しないユーザーを表示（あれば終了コード1）
+    python summary_check.py check --repair   # 一致しないユーザーの集計表を作り直す
+    python summary_check.py rebuild          # 全ユーザーの集計表を作り直す
+"""
+
+import argparse
+import sys
+import time
+from sqlalchemy.orm import Session
+from cruds import task as task_cruds
+
+def run(command :str,engine = None,repair :bool = False):
+    """集計表の管理コマンドを実行
+
+    Args:
+        command: "check" / "rebuild"
+        engine: SQLAlchemyエンジン（Noneの場合は database.engine）
+        repair: check で一致しないユーザーの集計表を作り直すか
+
+    Returns:
+        tuple: (一致しなかったユーザーIDのリスト（rebuildの場合は空）, 実行にかかった秒数)
+    """
+    if engine is None:
+        from database import engine
+    start = time.perf_counter()
+    with Session(engine) as db:
+        if command == "rebuild":
+            task_cruds.rebuild_summary(db)
+            drift = []
+        else:
+            drift = task_cruds.find_summary_drift(db)
+            if drift and repair:
+                task_cruds.rebuild_summary(db,drift)
+    return drift,time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="タスク数の集計表を検査・作り直します")
+    parser.add_argument("command",choices=["check","rebuild"],help="実行するコマンド")
+    parser.add_argument("--repair",action="store_true",help="check で一致しないユーザーの集計表を作り直す")
+    args = parser.parse_args()
+    drift,elapsed = run(args.command,repair=args.repair)
+    if drift:
+        print(f"集計表が一致しないユーザー: {', '.join(map(str,drift))}" + ("（作り直しました）" if args.repair else ""))
+    print(f"{args.command}: {elapsed:.2f} 秒",file=sys.stderr)
+    if drift and not args.repair:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,15 @@ from sqlalchemy.orm import Session,sessionmaker
 from database import get_db
 from main import app
 from fastapi.testclient import TestClient
-from models import Base,Item
+from models import Base,Item,User
 from datetime import date
 from schemas import DecodedToken
 from cruds.auth import get_current_user
+from cruds import auth as auth_cruds
+from cruds import task as task_cruds
+from routers import task as task_router,auth as auth_router
+from metrics import instrument_engine
+from query_guard import QueryGuard,watch_engine
 
 
 @pytest.fixture()
@@ -24,10 +29,14 @@ def session_fixture():
         poolclass=StaticPool
     )
     Base.metadata.create_all(engine)
+    instrument_engine(engine)
+    watch_engine(engine)
     SessionLocal = sessionmaker(autoflush=False,autocommit=False,bind=engine)
     db = SessionLocal()
 
     try:
+        user = User(id=1,username="user1",password="x",salt="x")
+        db.add(user)
         today = date.today()
         task1 = Item(title="kaimono1",content="milk",due_date=today,completed=False,user_id="1")
         task2 = Item(title="kaimono2",content="pasta",due_date=date(2025,10,30),completed=False,user_id="1")
@@ -52,8 +61,25 @@ def client_fixture(session_fixture: Session,user_fixture :DecodedToken):
 
     app.dependency_overrides[get_db] = override_get_db
     app.dependency_overrides[get_current_user] = override_get_current_user
+    if task_cruds.task_list_cache is not None:
+        task_cruds.task_list_cache.clear()
+    if auth_cruds.revoked_tokens is not None:
+        auth_cruds.revoked_tokens.clear()
+    for limiter in (task_router.user_limiter,auth_router.login_limiter):
+        if limiter is not None:
+            limiter.clear()
     
     client = TestClient(app)
     yield client
 
     app.dependency_overrides.clear()
+
+@pytest.fixture()
+def query_guard():
+    """with query_guard(max_statements=...) as guard: の形で、ブロック内のSQL文の数・繰り返しを検査する
+
+    同じSQL文の繰り返し（N+1）は既定で1回まで許可します。
+    """
+    def guard(max_statements :int = None,max_repeats :int = 1,slow_seconds :float = None):
+        return QueryGuard(max_statements=max_statements,max_repeats=max_repeats,slow_seconds=slow_seconds)
+    return guard
@@ -0,0 +1,138 @@
+import pytest
+from datetime import timedelta
+from fastapi import HTTPException
+from cruds import auth as auth_cruds
+
+
+@pytest.fixture()
+def token_fixture(monkeypatch):
+    monkeypatch.setattr(auth_cruds,"SECRET_KEY","test-secret")
+    auth_cruds.token_cache.clear()
+    auth_cruds.revoked_tokens.clear()
+    yield auth_cruds.create_access_token("user1",1,timedelta(minutes=20))
+    auth_cruds.token_cache.clear()
+    auth_cruds.revoked_tokens.clear()
+
+
+def test_get_current_user_キャッシュ(token_fixture :str):
+    hits = auth_cruds.token_cache.hits
+    user = auth_cruds.get_current_user(token_fixture)
+    assert user.user_id == 1
+    assert auth_cruds.get_current_user(token_fixture) is user
+    assert auth_cruds.token_cache.hits == hits + 1
+
+def test_get_current_user_ログアウトで無効化(token_fixture :str):
+    auth_cruds.get_current_user(token_fixture)
+    auth_cruds.invalidate_token(token_fixture)
+    assert len(auth_cruds.token_cache) == 0
+    with pytest.raises(HTTPException) as e:
+        auth_cruds.get_current_user(token_fixture)
+    assert e.value.status_code == 401
+    assert len(auth_cruds.token_cache) == 0
+    auth_cruds.invalidate_token("invalid") # 不正なトークンは記録しない
+    assert len(auth_cruds.revoked_tokens) == 1
+
+def test_get_current_user_異常系(token_fixture :str):
+    with pytest.raises(HTTPException) as e:
+        auth_cruds.get_current_user(token_fixture + "x")
+    assert e.value.status_code == 401
+    assert len(auth_cruds.token_cache) == 0
+
+def test_get_current_user_期限切れ(token_fixture :str):
+    token = auth_cruds.create_access_token("user1",1,timedelta(minutes=-1))
+    with pytest.raises(HTTPException):
+        auth_cruds.get_current_user(token)
+
+@pytest.fixture()
+def hash_fixture(monkeypatch,token_fixture):
+    monkeypatch.setattr(auth_cruds,"PASSWORD_HASH_ITERATIONS",2000)
+
+
+def test_signup_login(client_fixture,hash_fixture):
+    response = client_fixture.post("/auth/signup",json={"username":"user2","password":"test1234"})
+    assert response.status_code == 201
+    response = client_fixture.post("/auth/login",data={"username":"user2","password":"test1234"})
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+
+def test_login_異常系(client_fixture,hash_fixture):
+    client_fixture.post("/auth/signup",json={"username":"user2","password":"test1234"})
+    response = client_fixture.post("/auth/login",data={"username":"user2","password":"wrong1234"})
+    assert response.status_code == 401
+
+def test_login_旧形式ハッシュを再ハッシュ(client_fixture,session_fixture,hash_fixture):
+    import hashlib
+    from models import User
+    salt = "c2FsdA=="
+    legacy = hashlib.pbkdf2_hmac("sha256",b"test1234",salt.encode(),1000).hex()
+    session_fixture.add(User(username="legacy",password=legacy,salt=salt))
+    session_fixture.commit()
+    response = client_fixture.post("/auth/login",data={"username":"legacy","password":"test1234"})
+    assert response.status_code == 200
+    user = session_fixture.query(User).filter(User.username == "legacy").first()
+    session_fixture.refresh(user)
+    assert user.password.startswith("pbkdf2_sha256$2000$")
+    assert auth_cruds.verify_password("test1234",user.password,salt)
+
+
+@pytest.fixture()
+def refresh_fixture(client_fixture,hash_fixture):
+    client_fixture.post("/auth/signup",json={"username":"user2","password":"test1234"})
+    return client_fixture.post("/auth/login",data={"username":"user2","password":"test1234"}).json()
+
+def test_refresh(client_fixture,refresh_fixture,monkeypatch,query_guard):
+    def fail(*args):
+        raise AssertionError("パスワードのハッシュを計算しない")
+    monkeypatch.setattr(auth_cruds,"verify_password",fail)
+    monkeypatch.setattr(auth_cruds,"hash_password",fail)
+    with query_guard(max_statements=3): # SELECT + UPDATE（使用済み）+ INSERT（新しいトークン）
+        response = client_fixture.post("/auth/refresh",json={"refresh_token":refresh_fixture["refresh_token"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["refresh_token"] != refresh_fixture["refresh_token"]
+    assert body["expires_in"] == 1200
+    assert auth_cruds.get_current_user(body["access_token"]).username == "user2"
+
+def test_refresh_トークン本体は保存しない(session_fixture,refresh_fixture):
+    from models import RefreshToken
+    hashes = [token.token_hash for token in session_fixture.query(RefreshToken)]
+    assert hashes == [auth_cruds.hash_refresh_token(refresh_fixture["refresh_token"])]
+    assert refresh_fixture["refresh_token"] not in hashes
+
+def test_refresh_使用済みと不正なトークン(client_fixture,refresh_fixture):
+    old = refresh_fixture["refresh_token"]
+    new = client_fixture.post("/auth/refresh",json={"refresh_token":old}).json()["refresh_token"]
+    assert client_fixture.post("/auth/refresh",json={"refresh_token":old}).status_code == 401
+    assert client_fixture.post("/auth/refresh",json={"refresh_token":"x"}).status_code == 401
+    # 猶予時間内の再利用（同時リクエスト）では、交換後のトークンは有効なまま
+    assert client_fixture.post("/auth/refresh",json={"refresh_token":new}).status_code == 200
+
+def test_refresh_猶予時間後の再利用で同じログインのトークンを無効化(client_fixture,refresh_fixture,monkeypatch):
+    monkeypatch.setattr(auth_cruds,"REFRESH_REUSE_GRACE_SECONDS",-1)
+    old = refresh_fixture["refresh_token"]
+    new = client_fixture.post("/auth/refresh",json={"refresh_token":old}).json()["refresh_token"]
+    assert client_fixture.post("/auth/refresh",json={"refresh_token":old}).status_code == 401
+    assert client_fixture.post("/auth/refresh",json={"refresh_token":new}).status_code == 401
+
+def test_refresh_期限切れ(client_fixture,refresh_fixture,monkeypatch):
+    monkeypatch.setattr(auth_cruds,"REFRESH_TOKEN_DAYS",-1)
+    token = client_fixture.post("/auth/refresh",json={"refresh_token":refresh_fixture["refresh_token"]}).json()["refresh_token"]
+    assert client_fixture.post("/auth/refresh",json={"refresh_token":token}).status_code == 401
+
+def test_logout_リフレッシュトークンを無効化(client_fixture,refresh_fixture):
+    old = refresh_fixture["refresh_token"]
+    new = client_fixture.post("/auth/refresh",json={"refresh_token":old}).json()["refresh_token"]
+    response = client_fixture.post("/auth/logout",json={"refresh_token":old},headers={"Authorization":f"Bearer {refresh_fixture['access_token']}"})
+    assert response.status_code == 204
+    assert client_fixture.post("/auth/refresh",json={"refresh_token":new}).status_code == 401
+
+def test_logout_アクセストークンを無効化(client_fixture,refresh_fixture):
+    from main import app
+    from cruds.auth import get_current_user
+    del app.dependency_overrides[get_current_user]
+    headers = {"Authorization":f"Bearer {refresh_fixture['access_token']}"}
+    assert client_fixture.get("/tasks",headers=headers).status_code == 200
+    assert client_fixture.post("/auth/logout",headers=headers).status_code == 204
+    response = client_fixture.get("/tasks",headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token has been revoked"
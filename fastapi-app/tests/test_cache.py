@@ -0,0 +1,104 @@
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from cache import TTLCache,RedisCache,SingleFlight
+from cruds import task as task_cruds
+
+
+class FakeRedis:
+    """テスト用のRedis互換クライアント（get / set(ex=) / delete / scan_iter）"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self,key):
+        value = self.data.get(key)
+        if value is None or value[1] < time.time():
+            return None
+        return value[0]
+
+    def set(self,key,value,ex=None):
+        self.data[key] = (value,time.time() + (ex or 3600))
+
+    def delete(self,key):
+        self.data.pop(key,None)
+
+    def scan_iter(self,pattern):
+        return [key for key in list(self.data) if key.startswith(pattern.rstrip("*"))]
+
+
+def test_ttl_cache_バイト数上限():
+    cache = TTLCache(maxsize=10,maxbytes=10)
+    cache.set("a",b"12345")
+    cache.set("b",b"12345")
+    cache.set("c",b"12345")
+    assert cache.get("a") is None
+    assert cache.get("c") == b"12345"
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 10
+
+def test_ttl_cache_有効期限():
+    cache = TTLCache()
+    cache.set("a",1,expires_at=time.time() - 1)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_redis_cache():
+    cache = RedisCache(FakeRedis(),prefix="tasks:")
+    cache.set("1",b"body")
+    assert cache.get("1") == b"body"
+    cache.clear()
+    assert cache.get("1") is None
+    assert cache.stats() == {"hits":1,"misses":1}
+
+def test_single_flight():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return b"body"
+
+    async def scenario():
+        flight = SingleFlight()
+        return await asyncio.gather(*(flight.do("1",load) for _ in range(10)))
+
+    assert asyncio.run(scenario()) == [b"body"] * 10
+    assert len(calls) == 1
+
+def test_single_flight_実行中の呼び出しがキャンセルされても待っている側は結果を受け取る():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return b"body"
+
+    async def scenario():
+        flight = SingleFlight()
+        leader = asyncio.create_task(flight.do("1",load))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(flight.do("1",load)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        return leader.cancelled(),results
+
+    assert asyncio.run(scenario()) == (True,[b"body"] * 3)
+    assert len(calls) == 2
+
+def test_find_all_キャッシュ(client_fixture :TestClient):
+    cache = task_cruds.task_list_cache
+    first = client_fixture.get("/tasks").json()
+    hits = cache.hits
+    assert client_fixture.get("/tasks").json() == first
+    assert cache.hits == hits + 1
+    client_fixture.post("/tasks",json={"title":"kaimono3","content":"banana","due_date":"2025-11-04","completed":False})
+    assert len(cache) == 0
+    assert len(client_fixture.get("/tasks").json()) == 3
+
+def test_find_all_json_古い変更番号のキャッシュは使わない(session_fixture):
+    task_cruds.task_list_cache.set("1",b"0\n[]")
+    body = asyncio.run(task_cruds.find_all_json(session_fixture,1,1))
+    assert len(body) > 2
+    task_cruds.task_list_cache.clear()
@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import create_engine
+import database
+from sqlalchemy.pool import StaticPool
+from database import apply_sqlite_profile,pool_capacity
+
+
+def test_apply_sqlite_profile_production(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    apply_sqlite_profile(engine,"production")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1 # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 5000
+        assert conn.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+    engine.dispose()
+
+def test_apply_sqlite_profile_default(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    apply_sqlite_profile(engine,"default")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "delete"
+        assert conn.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+    engine.dispose()
+
+def test_apply_sqlite_profile_異常系():
+    engine = create_engine("sqlite://")
+    with pytest.raises(ValueError):
+        apply_sqlite_profile(engine,"unknown")
+
+def test_pool_capacity(tmp_path,monkeypatch):
+    monkeypatch.setattr(database,"engine",create_engine(f"sqlite:///{tmp_path / 'test.db'}",pool_size=3,max_overflow=2))
+    assert pool_capacity() == 5
+    monkeypatch.setattr(database,"engine",create_engine("sqlite://",poolclass=StaticPool))
+    assert pool_capacity() is None
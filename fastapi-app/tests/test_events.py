@@ -0,0 +1,148 @@
+import asyncio
+import gc
+import json
+import threading
+from fastapi.testclient import TestClient
+from events import EventBroker,HEARTBEAT,LAGGED,format_event
+from cruds import task as task_cruds
+from routers import task as task_router
+from schemas import ItemCreate
+
+
+def parse_events(body :str):
+    """SSEのレスポンスを (event, id, data) のリストにする（コメント行は ": ping" として残す）"""
+    events = []
+    for block in body.split("\n\n"):
+        if not block:
+            continue
+        if block.startswith(":"):
+            events.append((block,None,None))
+            continue
+        fields = dict(line.split(": ",1) for line in block.split("\n"))
+        events.append((fields.get("event"),fields.get("id"),json.loads(fields["data"])))
+    return events
+
+
+def test_format_event():
+    assert format_event({"revision":3},event="tasks",id=3) == b'id: 3\nevent: tasks\ndata: {"revision":3}\n\n'
+    assert format_event({"a":"買い物"},retry=1000) == 'retry: 1000\ndata: {"a":"買い物"}\n\n'.encode()
+
+def test_ユーザーごとに配信():
+    async def main():
+        broker = EventBroker()
+        first,second,other = broker.subscribe(1),broker.subscribe(1),broker.subscribe(2)
+        broker.publish(1,5,b"frame")
+        assert await first.get() == (5,b"frame")
+        assert await second.get() == (5,b"frame")
+        assert other.queue.empty()
+        broker.unsubscribe(first)
+        broker.unsubscribe(second)
+        assert not broker.has_subscribers(1)
+        assert broker.count == 1
+        broker.unsubscribe(other)
+    asyncio.run(main())
+
+def test_キューが満杯なら通知を捨てて追いつかせる():
+    async def main():
+        broker = EventBroker(queue_size=2)
+        subscription = broker.subscribe(1)
+        for revision in (1,2,3):
+            broker.publish(1,revision,b"frame")
+        assert await subscription.get() == LAGGED
+        assert subscription.queue.empty()
+        broker.publish(1,4,b"frame")
+        assert await subscription.get() == (4,b"frame")
+        broker.unsubscribe(subscription)
+        assert broker.dropped == 2
+    asyncio.run(main())
+
+def test_ハートビート():
+    async def main():
+        broker = EventBroker(heartbeat_seconds=0.01)
+        subscription = broker.subscribe(1)
+        assert await asyncio.wait_for(subscription.get(),1) == HEARTBEAT
+        assert len(broker._tickers) == 1
+        broker.unsubscribe(subscription)
+        await asyncio.sleep(0.05)
+        assert broker._tickers == {}
+    asyncio.run(main())
+
+def test_別スレッドからの通知():
+    async def main():
+        broker = EventBroker()
+        subscription = broker.subscribe(1)
+        thread = threading.Thread(target=broker.publish,args=(1,7,b"frame"))
+        thread.start()
+        assert await asyncio.wait_for(subscription.get(),1) == (7,b"frame")
+        thread.join()
+        broker.unsubscribe(subscription)
+    asyncio.run(main())
+
+def test_参照がなくなった購読は配信しない():
+    async def main():
+        broker = EventBroker()
+        subscription = broker.subscribe(1)
+        del subscription
+        gc.collect()
+        assert not broker.has_subscribers(1)
+    asyncio.run(main())
+
+def test_タスクの書き込みで通知(session_fixture):
+    async def main():
+        subscription = task_cruds.task_events.subscribe(1)
+        try:
+            task_cruds.create(ItemCreate(title="kaimono3",content="banana",completed=False),db=session_fixture,user_id=1)
+            task_cruds.delete_many([1,2,99],db=session_fixture,user_id=1)
+            revision,frame = await subscription.get()
+            (event,id,data), = parse_events(frame.decode())
+            assert (event,id,revision) == ("tasks","1",1)
+            assert [(item["id"],item["title"],item["revision"]) for item in data["items"]] == [(3,"kaimono3",1)]
+            revision,frame = await subscription.get()
+            assert parse_events(frame.decode())[0][2] == {"revision":2,"items":[],"deleted":[1,2]}
+        finally:
+            task_cruds.task_events.unsubscribe(subscription)
+    asyncio.run(main())
+
+def test_events_再接続時は差分同期で追いつく(client_fixture :TestClient,monkeypatch):
+    monkeypatch.setattr(task_router,"EVENTS_MAX_SECONDS",0)
+    client_fixture.post("/tasks",json={"title":"kaimono3","content":"banana","due_date":None,"completed":False})
+    client_fixture.delete("/tasks/2")
+    response = client_fixture.get("/tasks/events",headers={"Last-Event-ID":"0"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    assert events[0] == ("ready","0",{"revision":0})
+    event,id,data = events[1]
+    assert (event,id) == ("tasks","2")
+    assert ([item["id"] for item in data["items"]],data["deleted"]) == ([3],[2])
+    assert task_cruds.task_events.count == 0
+    events = parse_events(client_fixture.get("/tasks/events").text)
+    assert events == [("ready","2",{"revision":2})]
+
+def test_events_差分同期は変更番号の途中でも分けて送る(client_fixture :TestClient,monkeypatch):
+    monkeypatch.setattr(task_router,"EVENTS_MAX_SECONDS",0)
+    monkeypatch.setattr(task_router,"CHANGES_LIMIT",2)
+    client_fixture.post("/tasks/bulk",json=[{"title":"kaimono4","content":"egg","due_date":None,"completed":False}] * 3)
+    events = parse_events(client_fixture.get("/tasks/events?since=0").text)
+    assert [(id,[item["id"] for item in data["items"]]) for event,id,data in events[1:]] == [("1:0:4",[3,4]),("1",[5])]
+    assert [data["revision"] for event,id,data in events] == [0,0,1]
+    events = parse_events(client_fixture.get("/tasks/events",headers={"Last-Event-ID":"1:0:4"}).text)
+    assert events[0] == ("ready","1:0:4",{"revision":0})
+    assert [(id,[item["id"] for item in data["items"]]) for event,id,data in events[1:]] == [("1",[5])]
+
+def test_events_接続中の変更とハートビート(client_fixture :TestClient,monkeypatch):
+    monkeypatch.setattr(task_router,"EVENTS_MAX_SECONDS",0.3)
+    monkeypatch.setattr(task_cruds.task_events,"heartbeat_seconds",0.05)
+    timer = threading.Timer(0.1,task_cruds.task_events.publish,args=(1,1,format_event({"revision":1},event="tasks",id=1)))
+    timer.start()
+    response = client_fixture.get("/tasks/events")
+    timer.join()
+    events = parse_events(response.text)
+    assert events[0] == ("ready","0",{"revision":0})
+    assert ("tasks","1",{"revision":1}) in events
+    assert (": ping",None,None) in events
+
+def test_events_異常系(client_fixture :TestClient):
+    assert client_fixture.get("/tasks/events",headers={"Last-Event-ID":"abc"}).status_code == 400
+    assert client_fixture.get("/tasks/events?since=5").status_code == 410
+    assert task_cruds.task_events.count == 0
@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from models import Item
+from cruds import task as task_cruds
+import fast_json
+
+
+@pytest.fixture(params=["orjson","json"])
+def fast_fixture(request,monkeypatch,session_fixture :Session):
+    """TASK_FAST_JSON=on 相当にし、orjson あり / なし（標準のjson）の両方で実行する"""
+    if request.param == "json":
+        monkeypatch.setattr(fast_json,"orjson",None)
+    elif fast_json.orjson is None:
+        pytest.skip("orjson is not installed")
+    session_fixture.add_all([
+        Item(title="買い物メモ",content='引用符"と\\と\n改行',due_date=None,completed=True,user_id=1),
+        Item(title="emoji 🍣",content="制御\x01文字</script>",completed=False,user_id=1),
+    ])
+    session_fixture.commit()
+
+
+def fetch(client :TestClient,url :str,fast :bool,monkeypatch):
+    monkeypatch.setattr(task_cruds,"FAST_JSON_ENABLED",fast)
+    task_cruds.task_list_cache.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    return response.content
+
+
+@pytest.mark.parametrize("url",[
+    "/tasks",
+    "/tasks?completed=false",
+    "/tasks?sort=title&direction=desc",
+    "/tasks?limit=2",
+    "/tasks?limit=10&sort=due_date",
+    "/tasks?stream=true",
+])
+def test_fast_json_同じ形式(client_fixture :TestClient,fast_fixture,monkeypatch,url :str):
+    assert fetch(client_fixture,url,True,monkeypatch) == fetch(client_fixture,url,False,monkeypatch)
+
+
+def test_fast_json_ページング(client_fixture :TestClient,fast_fixture,monkeypatch):
+    monkeypatch.setattr(task_cruds,"FAST_JSON_ENABLED",True)
+    ids = []
+    after = None
+    while True:
+        page = client_fixture.get("/tasks?limit=3" + (f"&after={after}" if after else "")).json()
+        ids += [item["id"] for item in page["items"]]
+        after = page["next_cursor"]
+        if after is None:
+            break
+    assert ids == [1,2,3,4]
@@ -1,4 +1,7 @@
+import pytest
 from fastapi.testclient import TestClient
+from models import Item
+from cruds import task as task_cruds
 
 def test_find_all(client_fixture :TestClient):
     response = client_fixture.get("/tasks")
@@ -28,6 +31,41 @@ def test_find_by_due_fromtoday_異常系(client_fixture :TestClient):
     assert response.status_code == 404
     assert response.json()["detail"] == "Task not found"
     
+def add_other_users(db,users :int,tasks_per_user :int):
+    """期限日が同じタスクを持つ他のユーザーを追加"""
+    from datetime import date
+    from models import User
+    for user_id in range(2,users + 2):
+        db.add(User(id=user_id,username=f"user{user_id}",password="x",salt="x"))
+        for i in range(tasks_per_user):
+            db.add(Item(title=f"other{i}",content="x",due_date=date(2025,10,30),completed=False,user_id=user_id))
+    db.commit()
+
+def test_find_by_due_他ユーザーのタスクを含まない(client_fixture :TestClient,session_fixture):
+    add_other_users(session_fixture,50,5)
+    response = client_fixture.get("/tasks/?due_date=2025-10-30")
+    assert [item["id"] for item in response.json()] == [2]
+    response = client_fixture.get("/tasks/today?end=0")
+    assert [item["id"] for item in response.json()] == [1]
+
+def test_find_by_due_ページング(client_fixture :TestClient,session_fixture):
+    add_other_users(session_fixture,10,5)
+    for i in range(3):
+        client_fixture.post("/tasks",json={"title":f"task{i}","content":"banana","due_date":"2025-10-31","completed":False})
+    ids = []
+    after = None
+    while True:
+        url = "/tasks/?due_date=2025-10-30&end=1&limit=2" + (f"&after={after}" if after else "")
+        page = client_fixture.get(url).json()
+        assert len(page["items"]) <= 2
+        ids += [item["id"] for item in page["items"]]
+        after = page["next_cursor"]
+        if after is None:
+            break
+    assert ids == [2,53,54,55]
+    assert client_fixture.get("/tasks/today?limit=1&after=invalid").status_code == 400
+    assert client_fixture.get("/tasks/?due_date=2025-13-01").status_code == 400
+
 def test_find_by_id_正常系(client_fixture :TestClient):
     response = client_fixture.get("/tasks/1")
     assert response.status_code == 200
@@ -77,4 +115,395 @@ def test_delete_正常系(client_fixture :TestClient):
 def test_delete_異常系(client_fixture :TestClient):
     response = client_fixture.delete("/tasks/10")
     assert response.status_code == 404
-    assert response.json()["detail"] == "Task not found"
\ No newline at end of file
+    assert response.json()["detail"] == "Task not found"
+
+@pytest.mark.parametrize("returning",[True,False])
+def test_update_delete_RETURNINGの有無(client_fixture :TestClient,monkeypatch,returning :bool):
+    from cruds import task as task_cruds
+    monkeypatch.setattr(task_cruds,"WRITE_RETURNING_ENABLED",returning)
+    response = client_fixture.put("/tasks/1",json={"completed":True})
+    assert response.status_code == 200
+    item = response.json()
+    assert (item["id"],item["title"],item["content"],item["completed"]) == (1,"kaimono1","milk",True)
+    assert client_fixture.put("/tasks/1",json={}).json()["completed"] == True
+    assert client_fixture.put("/tasks/10",json={"completed":True}).status_code == 404
+    response = client_fixture.delete("/tasks/2")
+    assert response.status_code == 200
+    assert response.json()["title"] == "kaimono2"
+    assert client_fixture.delete("/tasks/2").status_code == 404
+    assert client_fixture.post("/tasks/bulk-delete",json={"ids":[1,2]}).json() == {"deleted":[1],"not_found":[2]}
+    assert client_fixture.get("/tasks").json() == []
+
+def test_run_db_async():
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine,async_sessionmaker
+    from database import Base,run_db
+    from models import Item
+    from cruds import task as task_cruds
+
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(bind=engine,expire_on_commit=False)() as db:
+            db.add(Item(title="kaimono1",content="milk",completed=False,user_id=1))
+            await db.commit()
+            items = await run_db(db,task_cruds.find_all,user_id=1)
+        await engine.dispose()
+        return items
+
+    items = asyncio.run(scenario())
+    assert len(items) == 1
+    assert items[0].title == "kaimono1"
+
+def test_find_all_ページング(client_fixture :TestClient):
+    response = client_fixture.get("/tasks?limit=1")
+    assert response.status_code == 200
+    page = response.json()
+    assert [item["id"] for item in page["items"]] == [1]
+    assert page["next_cursor"] is not None
+    response = client_fixture.get(f"/tasks?limit=1&after={page['next_cursor']}")
+    page = response.json()
+    assert [item["id"] for item in page["items"]] == [2]
+    assert page["next_cursor"] is None
+
+def test_find_all_ページング_期限日順(client_fixture :TestClient):
+    client_fixture.post("/tasks",json={"title":"kaimono3","content":"banana","due_date":None,"completed":False})
+    ids = []
+    after = None
+    while True:
+        url = "/tasks?limit=1&order=due_date" + (f"&after={after}" if after else "")
+        page = client_fixture.get(url).json()
+        ids += [item["id"] for item in page["items"]]
+        after = page["next_cursor"]
+        if after is None:
+            break
+    assert ids == [3,2,1]
+
+def test_find_all_ページング_異常系(client_fixture :TestClient):
+    response = client_fixture.get("/tasks?limit=1&after=invalid")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+    import base64,json
+    for value in (123,["2025-10-30"],"2025-13-01"):
+        cursor = base64.urlsafe_b64encode(json.dumps([value,1]).encode()).decode()
+        response = client_fixture.get(f"/tasks?limit=1&sort=due_date&after={cursor}")
+        assert response.status_code == 400
+        assert client_fixture.get(f"/tasks/today?limit=1&after={cursor}").status_code == 400
+
+def test_find_all_絞り込み(client_fixture :TestClient):
+    client_fixture.post("/tasks",json={"title":"souji","content":"100%_off","due_date":"2025-10-31","completed":True})
+    response = client_fixture.get("/tasks?completed=false")
+    assert [item["id"] for item in response.json()] == [1,2]
+    response = client_fixture.get("/tasks?due_after=2025-10-30&due_before=2025-10-31")
+    assert [item["id"] for item in response.json()] == [2,3]
+    response = client_fixture.get("/tasks?completed=false&due_after=2025-10-30&due_before=2025-10-31")
+    assert [item["id"] for item in response.json()] == [2]
+    response = client_fixture.get("/tasks?q=%25_")
+    assert [item["id"] for item in response.json()] == [3]
+    response = client_fixture.get("/tasks?q=KAIMONO2")
+    assert [item["id"] for item in response.json()] == [2]
+
+def test_find_all_並び替え(client_fixture :TestClient):
+    client_fixture.post("/tasks",json={"title":"aaa","content":"banana","due_date":None,"completed":False})
+    response = client_fixture.get("/tasks?sort=title&direction=desc")
+    assert [item["id"] for item in response.json()] == [2,1,3]
+    response = client_fixture.get("/tasks?sort=due_date&direction=desc")
+    assert [item["id"] for item in response.json()] == [1,2,3]
+    ids = []
+    after = None
+    while True:
+        url = "/tasks?limit=1&sort=due_date&direction=desc" + (f"&after={after}" if after else "")
+        page = client_fixture.get(url).json()
+        ids += [item["id"] for item in page["items"]]
+        after = page["next_cursor"]
+        if after is None:
+            break
+    assert ids == [1,2,3]
+
+def test_find_all_絞り込み_異常系(client_fixture :TestClient):
+    assert client_fixture.get("/tasks?due_after=2025-13-01").status_code == 422
+    assert client_fixture.get("/tasks?sort=content").status_code == 422
+    assert client_fixture.get("/tasks?q=").status_code == 422
+
+def test_search(client_fixture :TestClient,session_fixture):
+    from models import User
+    session_fixture.add(User(id=2,username="user2",password="x",salt="x"))
+    session_fixture.add(Item(title="milk",content="other user",user_id=2))
+    session_fixture.commit()
+    client_fixture.post("/tasks",json={"title":"souji","content":"milk tea","due_date":None,"completed":False})
+    client_fixture.post("/tasks",json={"title":"milk","content":"gyunyu","due_date":None,"completed":False})
+    response = client_fixture.get("/tasks/search?q=milk")
+    assert response.status_code == 200
+    ids = [item["id"] for item in response.json()]
+    assert ids[0] == 5 # タイトルの一致が上位
+    assert sorted(ids) == [1,4,5] # 他ユーザーのタスク（id=3）は含まない
+    response = client_fixture.get("/tasks/search?q=kaimo*")
+    assert sorted(item["id"] for item in response.json()) == [1,2]
+    response = client_fixture.get("/tasks/search?q=milk%20tea")
+    assert [item["id"] for item in response.json()] == [4]
+    response = client_fixture.get('/tasks/search?q=milk%20OR%20"pasta')
+    assert response.json() == []
+
+def test_search_更新と削除の反映(client_fixture :TestClient,session_fixture):
+    client_fixture.put("/tasks/1",json={"title":"yasai"})
+    assert client_fixture.get("/tasks/search?q=kaimono1").json() == []
+    assert [item["id"] for item in client_fixture.get("/tasks/search?q=yasai").json()] == [1]
+    client_fixture.post("/tasks/bulk-delete",json={"ids":[1]})
+    assert client_fixture.get("/tasks/search?q=yasai").json() == []
+    import search_index
+    search_index.run("rebuild",engine=session_fixture.get_bind())
+    search_index.run("check",engine=session_fixture.get_bind())
+    assert [item["id"] for item in client_fixture.get("/tasks/search?q=pasta").json()] == [2]
+
+def test_search_日本語の部分一致(client_fixture :TestClient,session_fixture):
+    from models import User
+    session_fixture.add(User(id=11,username="user11",password="x",salt="x"))
+    session_fixture.add(Item(title="牛乳とパンを買う",content="スーパー",user_id=11))
+    session_fixture.commit()
+    client_fixture.post("/tasks",json={"title":"牛乳とパンを買う","content":"駅前のスーパー","due_date":None,"completed":False})
+    client_fixture.post("/tasks",json={"title":"掃除","content":"リビングの掃除機がけ","due_date":None,"completed":False})
+    search = lambda q: [item["id"] for item in client_fixture.get(f"/tasks/search?q={q}").json()]
+    assert search("パンを買") == [4] # 他ユーザー（user_id=11）のタスクは含まない
+    assert search("スーパー 牛乳") == [4]
+    assert search("掃除機") == [5]
+    assert search("掃除") == [5] # 3文字未満は部分一致（LIKE）
+    assert search("パン 掃除") == []
+
+def test_search_異常系(client_fixture :TestClient):
+    assert client_fixture.get("/tasks/search").status_code == 422
+    assert client_fixture.get("/tasks/search?q=").status_code == 422
+    assert client_fixture.get("/tasks/search?q=*").json() == []
+
+def test_find_all_ストリーミング(client_fixture :TestClient):
+    import json
+    response = client_fixture.get("/tasks?stream=true")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert [item["id"] for item in items] == [1,2]
+
+def test_delete_many(client_fixture :TestClient):
+    response = client_fixture.post("/tasks/bulk-delete",json={"ids":[1,10,2]})
+    assert response.status_code == 200
+    assert response.json() == {"deleted":[1,2],"not_found":[10]}
+    response = client_fixture.get("/tasks")
+    assert len(response.json()) == 0
+
+def test_delete_many_異常系(client_fixture :TestClient):
+    response = client_fixture.post("/tasks/bulk-delete",json={"ids":[]})
+    assert response.status_code == 422
+
+def test_find_by_ids(client_fixture :TestClient):
+    response = client_fixture.get("/tasks/batch?ids=2&ids=10&ids=1")
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [1,2]
+
+def test_find_by_ids_異常系(client_fixture :TestClient):
+    response = client_fixture.get("/tasks/batch")
+    assert response.status_code == 422
+
+def test_create_many(client_fixture :TestClient):
+    response = client_fixture.post("/tasks/bulk",json=[
+        {"title":"kaimono3","content":"banana","due_date":"2025-11-04","completed":False},
+        {"title":"kaimono4","content":"apple","due_date":None,"completed":True},
+    ])
+    assert response.status_code == 201
+    items = response.json()
+    assert [item["id"] for item in items] == [3,4]
+    assert items[1]["title"] == "kaimono4"
+    assert items[1]["completed"] == True
+    assert items[1]["user_id"] == 1
+    response = client_fixture.get("/tasks")
+    assert len(response.json()) == 4
+
+def test_create_many_異常系(client_fixture :TestClient):
+    response = client_fixture.post("/tasks/bulk",json=[])
+    assert response.status_code == 422
+
+def test_import_file(session_fixture,tmp_path):
+    from importer import import_file
+    path = tmp_path / "tasks.csv"
+    path.write_text("title,content,due_date,completed\n買い物,牛乳,2025-10-30,False\n勉強,FastAPI,,True\n",encoding="utf-8")
+    count = import_file(str(path),user_id=1,engine=session_fixture.get_bind(),batch_size=1)
+    assert count == 2
+    items = session_fixture.query(Item).filter(Item.title == "勉強").all()
+    assert items[0].completed == True
+    assert items[0].due_date is None
+
+def test_import_file_不正な行は取り込まない(client_fixture :TestClient,session_fixture,tmp_path):
+    from importer import import_file
+    path = tmp_path / "tasks.csv"
+    path.write_text(
+        "title,content,due_date,completed\n"
+        f"{'長' * 47},,,False\n" # タイトルが長すぎ・内容なし
+        "買い物,牛乳,2025/10/30,False\n" # 期限日の形式が不正
+        "勉強,FastAPI,,True\n",
+        encoding="utf-8"
+    )
+    errors = []
+    count = import_file(str(path),user_id=1,engine=session_fixture.get_bind(),on_error=lambda number,error: errors.append(number))
+    assert count == 1
+    assert errors == [1,2]
+    response = client_fixture.get("/tasks")
+    assert response.status_code == 200
+    assert [item["title"] for item in response.json()] == ["kaimono1","kaimono2","勉強"]
+
+def test_find_all_ETag(client_fixture :TestClient):
+    response = client_fixture.get("/tasks")
+    etag = response.headers["etag"]
+    response = client_fixture.get("/tasks",headers={"If-None-Match":etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    client_fixture.put("/tasks/1",json={"completed":True})
+    response = client_fixture.get("/tasks",headers={"If-None-Match":etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert "last-modified" in response.headers
+
+def test_find_all_同じ秒の2回目の変更もIf_Modified_Sinceで304にしない(client_fixture :TestClient,monkeypatch):
+    from datetime import datetime
+    class FixedDatetime(datetime):
+        @classmethod
+        def now(cls,tz=None):
+            return datetime(2025,10,26,9,30,0,500000,tzinfo=tz)
+    monkeypatch.setattr(task_cruds,"datetime",FixedDatetime) # 2回の変更を同じ秒にする
+    client_fixture.post("/tasks",json={"title":"kaimono3","content":"banana","due_date":None,"completed":False})
+    response = client_fixture.get("/tasks")
+    last_modified = response.headers["last-modified"]
+    client_fixture.post("/tasks",json={"title":"kaimono4","content":"egg","due_date":None,"completed":False})
+    response = client_fixture.get("/tasks",headers={"If-Modified-Since":last_modified})
+    assert response.status_code == 200
+    assert len(response.json()) == 4
+    assert response.headers["last-modified"] == last_modified == "Sun, 26 Oct 2025 09:30:00 GMT"
+
+def test_find_by_id_ETag(client_fixture :TestClient):
+    etag = client_fixture.get("/tasks/1").headers["etag"]
+    assert etag != client_fixture.get("/tasks/2").headers["etag"]
+    response = client_fixture.get("/tasks/1",headers={"If-None-Match":etag})
+    assert response.status_code == 304
+    client_fixture.delete("/tasks/2")
+    response = client_fixture.get("/tasks/1",headers={"If-None-Match":etag})
+    assert response.status_code == 200
+
+
+def test_summary(client_fixture :TestClient):
+    # task1: 今日が期限、task2: 2025-10-30（期限切れ）
+    response = client_fixture.get("/tasks/summary")
+    assert response.status_code == 200
+    assert response.json() == {"total":2,"completed":0,"open":2,"overdue":1,"due_today":1,"due_within":1,"days":7}
+
+def test_summary_作成更新削除に追従(client_fixture :TestClient,session_fixture):
+    from datetime import date,timedelta
+    soon = (date.today() + timedelta(days=3)).isoformat()
+    client_fixture.post("/tasks",json={"title":"kaimono3","content":"banana","due_date":soon,"completed":False})
+    client_fixture.post("/tasks/bulk",json=[{"title":"kaimono4","content":"egg","due_date":None,"completed":True}] * 3)
+    client_fixture.put("/tasks/2",json={"completed":True})
+    client_fixture.put("/tasks/1",json={"due_date":soon})
+    client_fixture.post("/tasks/bulk-delete",json={"ids":[4]})
+    expected = {"total":5,"completed":3,"open":2,"overdue":0,"due_today":0,"due_within":2,"days":7}
+    assert client_fixture.get("/tasks/summary").json() == expected
+    assert task_cruds.summary(session_fixture,user_id=1,from_tasks=True) == expected
+    assert client_fixture.get("/tasks/summary?days=2").json()["due_within"] == 0
+    assert task_cruds.find_summary_drift(session_fixture) == []
+
+def test_summary_他ユーザーのタスクを含まない(client_fixture :TestClient,session_fixture):
+    add_other_users(session_fixture,5,3)
+    assert client_fixture.get("/tasks/summary").json()["total"] == 2
+
+def test_summary_異常系(client_fixture :TestClient):
+    assert client_fixture.get("/tasks/summary?days=-1").status_code == 422
+    assert client_fixture.get("/tasks/summary?days=366").status_code == 422
+
+def test_summary_集計表のずれを検査して作り直す(client_fixture :TestClient,session_fixture):
+    from sqlalchemy import text
+    session_fixture.execute(text("UPDATE task_summaries SET completed = 2 WHERE user_id = 1"))
+    session_fixture.execute(text("DELETE FROM task_due_counts"))
+    session_fixture.commit()
+    assert task_cruds.find_summary_drift(session_fixture) == [1]
+    task_cruds.rebuild_summary(session_fixture,[1])
+    assert task_cruds.find_summary_drift(session_fixture) == []
+    assert client_fixture.get("/tasks/summary").json()["overdue"] == 1
+
+def test_summary_集計表を使わない場合(client_fixture :TestClient,monkeypatch):
+    monkeypatch.setattr(task_cruds,"SUMMARY_TABLE_ENABLED",False)
+    assert client_fixture.get("/tasks/summary").json()["total"] == 2
+
+def test_changes(client_fixture :TestClient):
+    response = client_fixture.get("/tasks/changes")
+    assert response.json() == {"items":[],"deleted":[],"revision":0,"cursor":"0","has_more":False}
+    client_fixture.post("/tasks",json={"title":"kaimono3","content":"banana","due_date":None,"completed":False})
+    client_fixture.put("/tasks/1",json={"completed":True})
+    client_fixture.delete("/tasks/2")
+    response = client_fixture.get("/tasks/changes?since=0")
+    assert response.status_code == 200
+    changes = response.json()
+    assert [(item["id"],item["revision"]) for item in changes["items"]] == [(3,1),(1,2)]
+    assert changes["items"][1]["completed"] == True
+    assert changes["items"][1]["updated_at"] is not None
+    assert changes["deleted"] == [2]
+    assert (changes["revision"],changes["has_more"]) == (3,False)
+    changes = client_fixture.get("/tasks/changes?since=2").json()
+    assert (changes["items"],changes["deleted"],changes["revision"]) == ([],[2],3)
+    response = client_fixture.get("/tasks/changes?since=3")
+    assert response.json() == {"items":[],"deleted":[],"revision":3,"cursor":"3","has_more":False}
+    assert client_fixture.get("/tasks/changes?since=3",headers={"If-None-Match":response.headers["etag"]}).status_code == 304
+
+def test_changes_ページング(client_fixture :TestClient):
+    client_fixture.post("/tasks/bulk",json=[{"title":"kaimono4","content":"egg","due_date":None,"completed":False}] * 3)
+    client_fixture.put("/tasks/1",json={"title":"kaimono9"})
+    client_fixture.post("/tasks/bulk-delete",json={"ids":[2]})
+    pages = []
+    since = 0
+    while True:
+        changes = client_fixture.get(f"/tasks/changes?since={since}&limit=2").json()
+        pages.append(([item["id"] for item in changes["items"]],changes["deleted"],changes["cursor"]))
+        since = changes["cursor"]
+        if not changes["has_more"]:
+            break
+    # 一括作成（変更番号1）の3件は変更番号の途中でページを分ける
+    assert pages == [([3,4],[],"1:0:4"),([5,1],[],"2"),([],[2],"3")]
+
+def test_changes_1つの変更番号がlimitより多い(client_fixture :TestClient):
+    client_fixture.post("/tasks/bulk",json=[{"title":"kaimono4","content":"egg","due_date":None,"completed":False}] * 25)
+    client_fixture.post("/tasks/bulk-delete",json={"ids":list(range(1,13))})
+    pages = []
+    since = "0"
+    while True:
+        changes = client_fixture.get(f"/tasks/changes?since={since}&limit=10").json()
+        pages.append(([item["id"] for item in changes["items"]],changes["deleted"],changes["revision"],changes["cursor"]))
+        since = changes["cursor"]
+        if not changes["has_more"]:
+            break
+    # 一括作成（変更番号1）・一括削除（変更番号2）の途中でも limit 件ずつに分ける
+    assert pages == [
+        (list(range(13,23)),[],0,"1:0:22"),
+        (list(range(23,28)),list(range(1,6)),1,"2:5:0"),
+        ([],list(range(6,13)),2,"2"),
+    ]
+
+def test_changes_異常系(client_fixture :TestClient):
+    assert client_fixture.get("/tasks/changes?since=-1").status_code == 422
+    assert client_fixture.get("/tasks/changes?limit=0").status_code == 422
+    assert client_fixture.get("/tasks/changes?since=5").status_code == 410
+    assert client_fixture.get("/tasks/changes?since=1:2").status_code == 422
+    assert client_fixture.get("/tasks/changes?since=0:1:1").status_code == 400
+
+def test_changes_他ユーザーの変更を含まない(client_fixture :TestClient,session_fixture):
+    from schemas import ItemCreate
+    add_other_users(session_fixture,3,2)
+    task_cruds.create(ItemCreate(title="other",content="task",completed=False),db=session_fixture,user_id=2)
+    client_fixture.post("/tasks/bulk-delete",json={"ids":[1,3]})
+    task_cruds.delete(4,db=session_fixture,user_id=2)
+    changes = client_fixture.get("/tasks/changes").json()
+    assert (changes["items"],changes["deleted"]) == ([],[1])
+
+def test_import_file_差分同期に含まれる(client_fixture :TestClient,session_fixture,tmp_path):
+    from importer import import_file
+    path = tmp_path / "tasks.ndjson"
+    path.write_text('{"title":"買い物","content":"牛乳","due_date":"2025-10-30","completed":false}\n',encoding="utf-8")
+    import_file(str(path),user_id=1,engine=session_fixture.get_bind())
+    changes = client_fixture.get("/tasks/changes?since=0").json()
+    assert [item["title"] for item in changes["items"]] == ["買い物"]
+    assert changes["revision"] == 1
@@ -0,0 +1,72 @@
+import re
+import pytest
+from fastapi.testclient import TestClient
+import metrics
+from main import app
+from cruds.auth import get_current_user
+
+
+@pytest.fixture()
+def metrics_fixture():
+    for histogram in metrics.HISTOGRAMS:
+        histogram.clear()
+    yield
+    for histogram in metrics.HISTOGRAMS:
+        histogram.clear()
+
+
+def parse_server_timing(value :str):
+    """Server-Timing ヘッダーを {名前: (ミリ秒, desc)} に変換"""
+    timings = {}
+    for part in value.split(","):
+        name,*params = [param.strip() for param in part.split(";")]
+        params = dict(param.split("=",1) for param in params)
+        timings[name] = (float(params["dur"]),params.get("desc","").strip('"'))
+    return timings
+
+
+def test_server_timing(client_fixture :TestClient,metrics_fixture):
+    response = client_fixture.get("/tasks?completed=false")
+    timings = parse_server_timing(response.headers["server-timing"])
+    assert timings["db"][1] == "2 queries" # 変更番号の取得 + タスクの取得
+    assert timings["db"][0] > 0
+    assert timings["total"][0] >= timings["db"][0]
+
+
+def test_metrics_ルートごとの集計(client_fixture :TestClient,metrics_fixture):
+    client_fixture.get("/tasks/1")
+    client_fixture.get("/tasks/2")
+    client_fixture.get("/tasks/10")
+    client_fixture.get("/no-such-path")
+    body = client_fixture.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/tasks/{id}",status="200"} 2' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/tasks/{id}",status="404"} 1' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="unmatched",status="404"} 1' in body
+    assert 'http_request_db_statements_bucket{method="GET",route="/tasks/{id}",le="2"} 3' in body
+    assert re.search(r'^http_request_db_seconds_sum\{method="GET",route="/tasks/\{id\}"\} [0-9.e-]+$',body,re.M)
+
+
+def test_server_timing_認証時間(client_fixture :TestClient,metrics_fixture,monkeypatch):
+    from cruds import auth as auth_cruds
+    from datetime import timedelta
+    monkeypatch.setattr(auth_cruds,"SECRET_KEY","test-secret")
+    del app.dependency_overrides[get_current_user]
+    token = auth_cruds.create_access_token("user1",1,timedelta(minutes=20))
+    response = client_fixture.get("/tasks/1",headers={"Authorization":f"Bearer {token}"})
+    assert response.status_code == 200
+    assert "auth" in parse_server_timing(response.headers["server-timing"])
+    auth_cruds.invalidate_token(token)
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram("test_seconds","テスト",("route",),(0.1,1.0))
+    histogram.observe(('/a"b',),0.5)
+    assert histogram.render() == [
+        "# HELP test_seconds テスト",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="/a\\"b",le="0.1"} 0',
+        'test_seconds_bucket{route="/a\\"b",le="1.0"} 1',
+        'test_seconds_bucket{route="/a\\"b",le="+Inf"} 1',
+        'test_seconds_sum{route="/a\\"b"} 0.5',
+        'test_seconds_count{route="/a\\"b"} 1',
+    ]
@@ -0,0 +1,80 @@
+import logging
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from routers.task import router
+from routers import task as task_router
+from cruds import task as task_cruds
+from query_guard import QueryBudgetExceeded
+
+NEW_TASK = {"title":"kaimono3","content":"banana","due_date":"2025-10-31","completed":False}
+
+# routers/task.py の全ルートと、1リクエストで実行してよいSQL文の数
+# 条件付きGETに対応したルートは、タスクの読み込みの前に変更番号（users.task_version）を1回取得する
+# 書き込みは本体の1文と、変更番号を進めるUPDATE users の1文（削除は削除記録のINSERTを加えた3文）
+ROUTE_BUDGETS = [
+    ("GET","/tasks","/tasks",None,2),
+    ("GET","/tasks","/tasks?completed=false&sort=due_date",None,2),
+    ("GET","/tasks","/tasks?limit=1",None,2),
+    ("GET","/tasks","/tasks?stream=true",None,2),
+    ("GET","/tasks/","/tasks/?due_date=2025-10-30&end=7",None,1),
+    ("GET","/tasks/today","/tasks/today?end=7",None,1),
+    ("GET","/tasks/search","/tasks/search?q=kaimono",None,2),
+    ("GET","/tasks/batch","/tasks/batch?ids=1&ids=2",None,2),
+    ("GET","/tasks/summary","/tasks/summary?days=7",None,1), # 集計表の1文
+    ("GET","/tasks/changes","/tasks/changes?since=0",None,3), # 変更番号 + tasks + 削除記録
+    ("GET","/tasks/events","/tasks/events?since=0",None,4), # 変更番号（検証・購読後）+ 差分同期（tasks + 削除記録）
+    ("GET","/tasks/{id}","/tasks/1",None,2),
+    ("POST","/tasks","/tasks",NEW_TASK,3), # INSERT + UPDATE users + commit後の再読み込み
+    ("POST","/tasks/bulk","/tasks/bulk",[NEW_TASK] * 50,2),
+    ("PUT","/tasks/{id}","/tasks/1",{"title":"kaimono9"},2),
+    ("DELETE","/tasks/{id}","/tasks/1",None,3),
+    ("POST","/tasks/bulk-delete","/tasks/bulk-delete",{"ids":[1,2,10]},3),
+]
+
+
+def test_全ルートに上限がある():
+    routes = {(method,route.path) for route in router.routes for method in route.methods}
+    assert routes == {(method,path) for method,path,*_ in ROUTE_BUDGETS}
+
+
+@pytest.mark.parametrize("method,path,url,body,budget",ROUTE_BUDGETS)
+def test_ルートごとのSQL文の数(client_fixture :TestClient,query_guard,monkeypatch,method,path,url,body,budget):
+    monkeypatch.setattr(task_router,"EVENTS_MAX_SECONDS",0) # SSEは初回の送信後に終了させる
+    with query_guard(max_statements=budget) as guard:
+        response = client_fixture.request(method,url,json=body)
+    assert response.status_code < 400,response.text
+    assert guard.count <= budget
+
+
+def test_キャッシュ済みの全件取得は1文(client_fixture :TestClient,query_guard):
+    client_fixture.get("/tasks")
+    with query_guard(max_statements=1):
+        client_fixture.get("/tasks")
+
+
+def test_N1の検出(session_fixture :Session,query_guard):
+    with pytest.raises(QueryBudgetExceeded) as e:
+        with query_guard():
+            for id in (1,2):
+                task_cruds.find_by_id(id,db=session_fixture,user_id=1)
+    assert "repeated 2 times" in str(e.value)
+
+
+def test_低速クエリのログ(session_fixture :Session,query_guard,caplog):
+    with caplog.at_level(logging.WARNING,logger="query_guard"):
+        with query_guard(slow_seconds=0) as guard:
+            task_cruds.find_filtered(session_fixture,1,order="due_date",completed=False)
+    assert guard.slow
+    statement,seconds,plan = guard.slow[0]
+    assert "ix_tasks_user_id_completed_due_date" in plan
+    assert "slow query" in caplog.text
+
+
+def test_ミドルウェア(client_fixture :TestClient,caplog):
+    from main import app
+    from query_guard import QueryGuardMiddleware
+    client = TestClient(QueryGuardMiddleware(app,max_statements=1))
+    with caplog.at_level(logging.WARNING,logger="query_guard"):
+        assert client.get("/tasks/1").status_code == 200
+    assert "GET /tasks/{id}: 2 statements (max 1)" in caplog.text
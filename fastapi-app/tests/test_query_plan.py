@@ -0,0 +1,143 @@
+import re
+import pytest
+from datetime import date
+from sqlalchemy import event,text
+from sqlalchemy.orm import Session
+from cruds import task as task_cruds
+from schemas import ItemUpdate
+
+
+def capture_plans(db :Session,fn,*args,**kwargs):
+    """fnが発行したSELECT文と、tasksへのUPDATE/DELETE文ごとにEXPLAIN QUERY PLANの結果を集める"""
+    engine = db.get_bind()
+    statements = []
+
+    def before_cursor_execute(conn,cursor,statement,parameters,context,executemany):
+        verb = statement.lstrip().split(None,1)[0].upper()
+        if verb == "SELECT" or (verb in ("UPDATE","DELETE") and re.search(r"\btasks\b",statement)):
+            statements.append((statement,parameters))
+
+    event.listen(engine,"before_cursor_execute",before_cursor_execute)
+    try:
+        fn(*args,db=db,**kwargs)
+    finally:
+        event.remove(engine,"before_cursor_execute",before_cursor_execute)
+
+    plans = []
+    connection = db.connection()
+    for statement,parameters in statements:
+        rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement,parameters).fetchall()
+        plans.append(" / ".join(row[-1] for row in rows))
+    return plans
+
+
+@pytest.mark.parametrize("fn,args,kwargs",[
+    (task_cruds.find_all,(),{"user_id":1}),
+    (task_cruds.find_page,(),{"user_id":1,"limit":10}),
+    (task_cruds.find_page,(),{"user_id":1,"limit":10,"order":"due_date"}),
+    (task_cruds.find_page,(),{"user_id":1,"limit":10,"order":"title","direction":"desc"}),
+    (task_cruds.find_filtered,(),{"user_id":1,"order":"due_date","completed":False,"due_after":date(2025,10,27),"due_before":date(2025,11,2)}),
+    (task_cruds.find_filtered,(),{"user_id":1,"completed":True}),
+    (task_cruds.find_filtered,(),{"user_id":1,"q":"kai"}),
+    (task_cruds.find_by_due,(),{"user_id":1,"due_date":"2025-10-30","end":7}),
+    (task_cruds.find_by_due_fromtoday,(),{"user_id":1,"end":None}),
+    (task_cruds.find_by_id,(1,),{"user_id":1}),
+    (task_cruds.find_by_ids,([1,2],),{"user_id":1}),
+    (task_cruds.update,(ItemUpdate(title="kaimono9"),1),{"user_id":1}),
+    (task_cruds.delete,(2,),{"user_id":1}),
+])
+def test_query_plan_インデックス使用(session_fixture :Session,fn,args,kwargs):
+    plans = capture_plans(session_fixture,fn,*args,**kwargs)
+    assert plans
+    for plan in plans:
+        assert "SCAN tasks" not in plan,plan
+        assert "USE TEMP B-TREE" not in plan,plan
+        assert "SEARCH tasks USING" in plan,plan
+
+
+def test_query_plan_全文検索(session_fixture :Session):
+    plans = capture_plans(session_fixture,task_cruds.search,user_id=1,q="kaimono")
+    assert len(plans) == 1
+    assert "VIRTUAL TABLE" in plans[0],plans[0]
+    assert "SEARCH tasks USING INTEGER PRIMARY KEY" in plans[0],plans[0]
+
+
+def count_vm_steps(db :Session,fn,*args,**kwargs):
+    """fnの実行中にSQLiteの仮想マシンが実行した命令数（クエリのコストの目安）を数える"""
+    steps = 0
+
+    def progress():
+        nonlocal steps
+        steps += 1
+        return 0
+
+    dbapi_connection = db.connection().connection.dbapi_connection
+    dbapi_connection.set_progress_handler(progress,1)
+    try:
+        fn(*args,db=db,**kwargs)
+    finally:
+        dbapi_connection.set_progress_handler(None,1)
+    return steps
+
+
+def test_find_by_due_コストが他ユーザーのタスク数に依存しない(session_fixture :Session):
+    from models import Item,User
+
+    def add_users(start :int,count :int):
+        for user_id in range(start,start + count):
+            session_fixture.add(User(id=user_id,username=f"user{user_id}",password="x",salt="x"))
+            session_fixture.add_all([Item(title=f"t{i}",content="x",due_date=date(2025,10,30 + i % 2),user_id=user_id) for i in range(20)])
+        session_fixture.commit()
+
+    kwargs = {"user_id":1,"due_date":"2025-10-30","end":1}
+    add_users(2,10)
+    steps_small = count_vm_steps(session_fixture,task_cruds.find_by_due,**kwargs)
+    add_users(12,200)
+    steps_large = count_vm_steps(session_fixture,task_cruds.find_by_due,**kwargs)
+    assert len(task_cruds.find_by_due(session_fixture,**kwargs)) == 1
+    assert steps_large <= steps_small * 1.1
+
+
+def test_update_delete_1文で実行(session_fixture :Session):
+    engine = session_fixture.get_bind()
+    statements = []
+
+    def before_cursor_execute(conn,cursor,statement,parameters,context,executemany):
+        if re.search(r"\btasks\b",statement):
+            statements.append(statement.lstrip().split(None,1)[0].upper())
+
+    event.listen(engine,"before_cursor_execute",before_cursor_execute)
+    try:
+        task_cruds.update(ItemUpdate(title="kaimono9"),1,db=session_fixture,user_id=1)
+        task_cruds.delete(2,db=session_fixture,user_id=1)
+    finally:
+        event.remove(engine,"before_cursor_execute",before_cursor_execute)
+    assert statements == ["UPDATE","DELETE"]
+
+
+def test_summary_コストがタスク数に依存しない(session_fixture :Session,monkeypatch):
+    from models import Item
+    monkeypatch.setattr(task_cruds,"SUMMARY_TABLE_ENABLED",True)
+
+    def add_tasks(count :int):
+        session_fixture.add_all([Item(title=f"t{i}",content="x",due_date=date(2025,10,30 + i % 2),completed=i % 3 == 0,user_id=1) for i in range(count)])
+        session_fixture.commit()
+
+    add_tasks(10)
+    steps_small = count_vm_steps(session_fixture,task_cruds.summary,user_id=1)
+    add_tasks(2000)
+    steps_large = count_vm_steps(session_fixture,task_cruds.summary,user_id=1)
+    assert task_cruds.summary(session_fixture,user_id=1) == task_cruds.summary(session_fixture,user_id=1,from_tasks=True)
+    assert steps_large <= steps_small * 1.1
+    plans = capture_plans(session_fixture,task_cruds.summary,user_id=1)
+    assert "tasks" not in re.sub(r"task_(summaries|due_counts)","",plans[0]),plans[0]
+
+
+@pytest.mark.parametrize("since",["0","1:2:3"])
+def test_changes_変更番号のインデックスで検索(session_fixture :Session,since :str):
+    plans = capture_plans(session_fixture,task_cruds.find_changes,user_id=1,since=since,limit=10)
+    assert len(plans) == 2
+    assert re.search(r"SEARCH tasks USING INDEX ix_tasks_user_id_revision \(user_id=\? AND revision>=?\?\)",plans[0]),plans[0]
+    assert re.search(r"SEARCH task_tombstones USING INDEX ix_task_tombstones_user_id_revision \(user_id=\? AND revision>=?\?\)",plans[1]),plans[1]
+    for plan in plans:
+        assert "USE TEMP B-TREE" not in plan,plan
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from fastapi.testclient import TestClient
+from rate_limit import TokenBucketLimiter,ConcurrencyLimitMiddleware,create_limiter
+from routers import task as task_router,auth as auth_router
+from cruds import auth as auth_cruds
+
+
+def test_トークンバケット(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(time,"monotonic",lambda: now)
+    limiter = TokenBucketLimiter(rate=2,burst=3)
+    assert [limiter.acquire("1") for _ in range(3)] == [0,0,0]
+    assert limiter.acquire("1") == 0.5
+    assert limiter.acquire("2") == 0
+    now += 1
+    assert [limiter.acquire("1") for _ in range(3)] == [0,0,0.5]
+    now += 100
+    assert limiter.acquire("1",cost=3) == 0
+    assert (limiter.allowed,limiter.rejected) == (7,2)
+
+def test_トークンバケット_キー数の上限():
+    limiter = TokenBucketLimiter(rate=1,burst=1,maxsize=2)
+    for key in ("1","2","3"):
+        limiter.acquire(key)
+    assert list(limiter._buckets) == ["2","3"]
+    assert limiter.acquire("1") == 0
+
+def test_create_limiter():
+    assert create_limiter("off",rate=1,burst=1) is None
+    assert create_limiter("memory",rate=0,burst=1) is None
+    assert isinstance(create_limiter("memory",rate=1,burst=1),TokenBucketLimiter)
+
+def test_ユーザーごとのレート制限(client_fixture :TestClient,monkeypatch):
+    monkeypatch.setattr(task_router,"user_limiter",TokenBucketLimiter(rate=0.5,burst=2))
+    assert [client_fixture.get("/tasks").status_code for _ in range(2)] == [200,200]
+    response = client_fixture.post("/tasks",json={"title":"kaimono3","content":"banana","due_date":None,"completed":False})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    task_router.user_limiter.clear()
+    assert len(client_fixture.get("/tasks").json()) == 2 # 429のリクエストは処理しない
+
+def test_ログインのレート制限はハッシュの計算前に断る(client_fixture :TestClient,monkeypatch):
+    monkeypatch.setattr(auth_router,"login_limiter",TokenBucketLimiter(rate=10 / 60,burst=1))
+    calls = []
+    async def login(username,password,db):
+        calls.append(username)
+        return None
+    monkeypatch.setattr(auth_cruds,"login",login)
+    assert client_fixture.post("/auth/login",data={"username":"user1","password":"x"}).status_code == 401
+    response = client_fixture.post("/auth/login",data={"username":"user1","password":"x"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "6"
+    assert client_fixture.post("/auth/signup",json={"username":"user2","password":"x"}).status_code == 429
+    assert calls == ["user1"]
+
+
+def test_同時実行数の制限():
+    release = asyncio.Event()
+
+    async def app(scope,receive,send):
+        await release.wait()
+        await send({"type":"http.response.start","status":200,"headers":[]})
+        await send({"type":"http.response.body","body":b""})
+
+    async def call(middleware,path = "/tasks"):
+        statuses = []
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+        await middleware({"type":"http","method":"GET","path":path,"headers":[]},None,send)
+        return statuses[0]
+
+    async def main():
+        middleware = ConcurrencyLimitMiddleware(app,max_concurrent=1,max_waiting=1,wait_seconds=0.05,exempt=("/tasks/events",))
+        first = asyncio.create_task(call(middleware))
+        second = asyncio.create_task(call(middleware))
+        await asyncio.sleep(0)
+        assert (middleware.active,middleware.waiting) == (1,1)
+        assert await call(middleware) == 503 # 待ちの列が満杯
+        assert await second == 503 # 待ち時間を過ぎた
+        third = asyncio.create_task(call(middleware))
+        events = asyncio.create_task(call(middleware,"/tasks/events"))
+        await asyncio.sleep(0)
+        assert middleware.waiting == 1
+        release.set()
+        assert await asyncio.gather(first,third,events) == [200,200,200]
+        assert (middleware.active,middleware.waiting,middleware.shed) == (0,0,2)
+    asyncio.run(main())
@@ -0,0 +1,208 @@
+"""FastAPI呼び出し用のHTTPクライアント
+
+Flaskの各画面からFastAPIを呼び出すときに使う共通クライアントです。
+モジュール全体で1つの requests.Session を共有し、Keep-Aliveの
+コネクションプールを使い回すことで、リクエストごとのTCP接続確立を省きます。
+
+- 各リクエストにタイムアウト（接続, 読み込み）を設定
+- 冪等なメソッド（GET/PUT/DELETE など）のみ、接続エラーや 502/503/504 を回数制限付きで再試行
+- GETの結果をETagと一緒に保持し、次回は If-None-Match で再検証（304なら保持した結果を使う）
+- 呼び出しごとの時間を metrics に記録（FastAPI側の処理時間と通信時間を分けて集計）
+- 401（アクセストークンの期限切れ）のとき、token_refresher で新しいトークンを取得して1回だけ再送信
+- タスクの変更通知（Server-Sent Events）をストリーミングで受信
+"""
+
+import os
+import hashlib
+import threading
+import time
+import requests
+import metrics
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FASTAPI_URL = os.getenv("FASTAPI_URL") # FastAPIのURL
+
+# タイムアウト秒数（接続, 読み込み）
+CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT","3.05"))
+READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT","10"))
+# 変更通知の読み込みタイムアウト秒数（FastAPIのハートビート TASK_EVENTS_HEARTBEAT より長くする）
+EVENTS_READ_TIMEOUT = float(os.getenv("API_EVENTS_READ_TIMEOUT","60"))
+
+# コネクションプールの上限（Flaskのスレッド数に合わせて調整）
+POOL_MAXSIZE = int(os.getenv("API_POOL_MAXSIZE","20"))
+
+# 再試行の上限回数
+MAX_RETRIES = int(os.getenv("API_MAX_RETRIES","2"))
+
+# ETag付きで保持するGET結果の最大件数
+RESPONSE_CACHE_SIZE = int(os.getenv("API_RESPONSE_CACHE_SIZE","1000"))
+
+# 同じリフレッシュトークンでの更新結果を再利用する秒数（同時に401になったリクエストで二重に交換しない）
+REFRESH_REUSE_SECONDS = float(os.getenv("API_REFRESH_REUSE_SECONDS","30"))
+
+# 401のときに呼び出し、古いアクセストークンから新しいアクセストークン（更新できない場合はNone）を返す関数
+# app.py でセッションのリフレッシュトークンを使う関数を設定します
+token_refresher = None
+
+def create_session():
+    """コネクションプールと再試行設定を持つSessionを作成
+
+    Returns:
+        requests.Session: FastAPI呼び出し用のセッション
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=0.1,
+        status_forcelist=(502,503,504),
+        allowed_methods=frozenset({"GET","HEAD","OPTIONS","PUT","DELETE"}),# POSTは二重登録を避けるため再試行しない
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1,pool_maxsize=POOL_MAXSIZE,max_retries=retry,pool_block=False)
+    session = requests.Session()
+    session.mount("http://",adapter)
+    session.mount("https://",adapter)
+    return session
+
+_session = create_session()
+
+def request(method :str,path :str,token :str = None,**kwargs):
+    """FastAPIへリクエストを送信
+
+    Args:
+        method: HTTPメソッド
+        path: FastAPIのパス（例: /tasks）
+        token: JWTアクセストークン（指定時はBearer認証ヘッダーを付与）
+        **kwargs: requests に渡す引数（json, data, params など）
+
+    Returns:
+        requests.Response: FastAPIのレスポンス
+    """
+    headers = kwargs.pop("headers",{})
+    if token is not None:
+        headers["Authorization"] = f"Bearer {token}"
+    kwargs.setdefault("timeout",(CONNECT_TIMEOUT,READ_TIMEOUT))
+    response = _send(method,path,headers,kwargs)
+    if response.status_code == 401 and token is not None and token_refresher is not None:
+        # 認証で拒否されたリクエストは処理されていないため、POSTでも再送信できる
+        new_token = token_refresher(token)
+        if new_token is not None:
+            headers["Authorization"] = f"Bearer {new_token}"
+            response = _send(method,path,headers,kwargs)
+    return response
+
+def _send(method :str,path :str,headers :dict,kwargs :dict):
+    """リクエストを1回送信し、時間を metrics に記録"""
+    start = time.perf_counter()
+    try:
+        response = _session.request(method,f"{FASTAPI_URL}{path}",headers=headers,**kwargs)
+    except requests.RequestException:
+        metrics.record_api_call(method,path,0,time.perf_counter() - start)
+        raise
+    metrics.record_api_call(method,path,response.status_code,time.perf_counter() - start,response.headers.get("Server-Timing"))
+    return response
+
+def get(path :str,token :str = None,**kwargs):
+    """GETリクエストを送信"""
+    return request("GET",path,token,**kwargs)
+
+def post(path :str,token :str = None,**kwargs):
+    """POSTリクエストを送信"""
+    return request("POST",path,token,**kwargs)
+
+def put(path :str,token :str = None,**kwargs):
+    """PUTリクエストを送信"""
+    return request("PUT",path,token,**kwargs)
+
+def delete(path :str,token :str = None,**kwargs):
+    """DELETEリクエストを送信"""
+    return request("DELETE",path,token,**kwargs)
+
+_refresh_lock = threading.Lock()
+_refreshed = OrderedDict()
+
+def refresh(refresh_token :str):
+    """リフレッシュトークンで新しいトークンを取得（POST /auth/refresh）
+
+    リフレッシュトークンは1回しか使えないため、同じトークンでの更新はプロセス内で1回だけ行い、
+    REFRESH_REUSE_SECONDS 秒以内に同じトークンで呼ばれた場合はその結果を返します。
+
+    Args:
+        refresh_token: リフレッシュトークン
+
+    Returns:
+        dict: access_token, refresh_token などを含むレスポンス（更新できない場合はNone）
+    """
+    key = hashlib.sha256(refresh_token.encode()).hexdigest()
+    with _refresh_lock:
+        cached = _refreshed.get(key)
+        if cached is not None and time.monotonic() - cached[0] < REFRESH_REUSE_SECONDS:
+            return cached[1]
+        response = post('/auth/refresh',json={'refresh_token':refresh_token})
+        if response.status_code != 200:
+            return None
+        tokens = response.json()
+        _refreshed[key] = (time.monotonic(),tokens)
+        while len(_refreshed) > RESPONSE_CACHE_SIZE:
+            _refreshed.popitem(last=False)
+        return tokens
+
+def open_events(token :str,last_event_id :str = None):
+    """タスクの変更通知（GET /tasks/events）に接続
+
+    Args:
+        token: JWTアクセストークン
+        last_event_id: 最後に受信したイベントID（再接続時、それより後の変更から受信する）
+
+    Returns:
+        requests.Response: stream=True のレスポンス（iter_content で読み、終了時に close する）
+    """
+    headers = {"Last-Event-ID":last_event_id} if last_event_id else {}
+    return get('/tasks/events',token,headers=headers,stream=True,timeout=(CONNECT_TIMEOUT,EVENTS_READ_TIMEOUT))
+
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+def get_json(path :str,token :str = None,**kwargs):
+    """GETリクエストの結果（JSON）を取得
+
+    前回の結果をETagと一緒にトークン（ログインセッション）ごとに保持し、
+    次回は If-None-Match を付けて再検証します。
+    FastAPIが304を返した場合は、保持している結果をそのまま返します。
+
+    Args:
+        path: FastAPIのパス（例: /tasks）
+        token: JWTアクセストークン
+        **kwargs: requests に渡す引数（params など）
+
+    Returns:
+        JSONをデコードした値
+    """
+    params = kwargs.get("params")
+    key = (hashlib.sha256((token or "").encode()).hexdigest(),path,repr(sorted(params.items()) if isinstance(params,dict) else params))
+    with _response_cache_lock:
+        cached = _response_cache.get(key)
+    headers = kwargs.pop("headers",{})
+    if cached is not None:
+        headers["If-None-Match"] = cached[0]
+    response = get(path,token,headers=headers,**kwargs)
+    if response.status_code == 304 and cached is not None:
+        with _response_cache_lock:
+            if key in _response_cache:
+                _response_cache.move_to_end(key)
+        return cached[1]
+    data = response.json()
+    etag = response.headers.get("ETag")
+    with _response_cache_lock:
+        if response.status_code == 200 and etag:
+            _response_cache[key] = (etag,data)
+            _response_cache.move_to_end(key)
+            while len(_response_cache) > RESPONSE_CACHE_SIZE:
+                _response_cache.popitem(last=False)
+        else:
+            _response_cache.pop(key,None)
+    return data
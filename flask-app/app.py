@@ -1,17 +1,56 @@
-from flask import Flask,render_template,g,session,url_for
+from flask import Flask,render_template,g,session,url_for,has_request_context,Response
 from flask import request,redirect
 import sqlite3
 import os
 import requests
+import api_client as api
+import metrics
 from dotenv import load_dotenv
 
 app = Flask(__name__)
 load_dotenv()
+metrics.init_app(app) # 画面ごとの処理時間とFastAPI呼び出しの時間を計測（GET /metrics）
 
-FASTAPI_URL = os.getenv("FASTAPI_URL") # FastAPIのURL
 app.secret_key = os.getenv("FLASK_SECRET_KEY")
 DATABASE = os.path.join(os.path.dirname(os.path.dirname(__file__)),"database.db")
 
+def renew_token(token :str):
+    """アクセストークンの期限切れ（FastAPIが401）のときに、リフレッシュトークンで更新
+
+    api_client から呼び出されます。パスワードでのログインをやり直さずに、
+    セッションのアクセストークン・リフレッシュトークンを新しいものに置き換えます。
+    更新できない場合はセッションからトークンを削除し、次の画面でログイン画面へ移動させます。
+
+    Args:
+        token: 401になったアクセストークン
+
+    Returns:
+        str: 新しいアクセストークン（更新できない場合はNone）
+    """
+    if not has_request_context():
+        return None
+    if session.get('jwt_token') not in (None,token): # 同じ画面の処理中に更新済み
+        return session['jwt_token']
+    refresh_token = session.get('refresh_token')
+    tokens = api.refresh(refresh_token) if refresh_token else None
+    if tokens is None:
+        session.pop('jwt_token',None)
+        session.pop('refresh_token',None)
+        return None
+    session['jwt_token'] = tokens['access_token']
+    session['refresh_token'] = tokens['refresh_token']
+    return tokens['access_token']
+
+api.token_refresher = renew_token
+
+def client_headers():
+    """利用者のIPアドレスをFastAPIへ渡すヘッダー
+
+    FastAPIはログイン・ユーザー登録をIPアドレスごとに回数制限するため、
+    Flaskのアドレスではなく利用者のアドレスを X-Forwarded-For で渡します。
+    """
+    return {'X-Forwarded-For': request.remote_addr} if request.remote_addr else {}
+
 @app.route('/')
 def root():
     """ルート分岐
@@ -39,9 +78,10 @@ def login():
         print(f"Username: {username}")  
         print(f"Password: {password}")
     
-        response = requests.post(
-            f'{FASTAPI_URL}/auth/login',# fastapiのauthエンドポイントにprefixがついているため
-            data={'username': username, 'password': password}
+        response = api.post(
+            '/auth/login',# fastapiのauthエンドポイントにprefixがついているため
+            data={'username': username, 'password': password},
+            headers=client_headers()
         )
         print(f"Status Code: {response.status_code}")  
         print(f"Response Body: {response.text}")  
@@ -49,8 +89,11 @@ def login():
         if response.status_code==200:
             token = response.json()['access_token']
             session['jwt_token'] = token
+            session['refresh_token'] = response.json().get('refresh_token')
             session['username'] = username
             return redirect(url_for("top"))
+        elif response.status_code==429:
+            return render_template("login.html",error='ログインの試行回数が多すぎます。しばらく待ってから再度お試しください'),429
         else:
             return render_template("login.html",error='ログイン失敗')
     return render_template("login.html")
@@ -59,10 +102,14 @@ def login():
 def logout():
     """ログアウト処理
     
+    FastAPI側の検証済みトークンのキャッシュを破棄してリフレッシュトークンを無効にし、
     セッションを削除しログイン画面へリダイレクトします。
 
     """
-    session.pop('jwt_token',None)
+    token = session.pop('jwt_token',None)
+    refresh_token = session.pop('refresh_token',None)
+    if token is not None:
+        api.post('/auth/logout',token,json={'refresh_token':refresh_token} if refresh_token else None)
     return redirect(url_for('login'))
 
 # ユーザー登録画面
@@ -77,9 +124,10 @@ def signup():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
-        response= requests.post(
-            f'{FASTAPI_URL}/auth/signup',# fastapiのauthエンドポイントにprefixがついているため
-                json={'username': username, 'password': password}
+        response= api.post(
+            '/auth/signup',# fastapiのauthエンドポイントにprefixがついているため
+                json={'username': username, 'password': password},
+                headers=client_headers()
         )
         if response.status_code==201:
             return redirect(url_for('login'))
@@ -88,6 +136,9 @@ def signup():
     return render_template("signup.html")
 
 
+# タスク一覧の絞り込み・並び替えでFastAPIへそのまま渡すクエリパラメータ
+TASK_FILTER_KEYS = ("completed","due_after","due_before","q","sort","direction")
+
 # タスク一覧画面
 @app.route("/task_list")
 def top():
@@ -98,15 +149,49 @@ def top():
     
     # task_list =get_db().execute("select id,title,content,due_date,completed from tasks").fetchall()
     token = session.get('jwt_token')
-    response = requests.get(
-            f'{FASTAPI_URL}/tasks',
-            headers={'Authorization':f'Bearer {token}'}
-        )
-    task_list = response.json()
+    # 絞り込み・並び替えはFastAPI側（SQL）で行う
+    filters = {key:request.args.get(key) for key in TASK_FILTER_KEYS if request.args.get(key)}
+    task_list = api.get_json('/tasks',token,params=filters)
+    if 'jwt_token' not in session: # アクセストークンを更新できなかった（リフレッシュトークンの期限切れなど）
+        return redirect(url_for('login'))
+    if not isinstance(task_list,list): # 日付の形式が不正な場合など
+        task_list = []
+    # 件数は一覧からではなくFastAPIの集計（GET /tasks/summary）から取得する
+    summary = api.get('/tasks/summary',session.get('jwt_token'))
+    summary = summary.json() if summary.status_code == 200 else None
     username = session.get('username')
 
-    return render_template("index.html",task_list=task_list,username=username)
+    return render_template("index.html",task_list=task_list,username=username,filters=filters,summary=summary)
     
+#--- タスクの変更通知 ---
+@app.route("/task_events")
+def task_events():
+    """タスクの変更通知（Server-Sent Events）
+
+    ブラウザの EventSource は Authorization ヘッダーを付けられないため、
+    セッションのアクセストークンでFastAPIの GET /tasks/events に接続し、受け取ったイベントをそのまま中継します。
+    タスク一覧画面は tasks イベントを受け取ると再読み込みします。
+    接続中はFlaskのスレッドを1つ使います。
+    """
+    try:
+        response = api.open_events(session.get('jwt_token'),request.headers.get('Last-Event-ID'))
+    except requests.RequestException:
+        return Response(status=503)
+    if response.status_code != 200:
+        response.close()
+        return Response(status=204) # 204 の場合、EventSource は再接続しない
+
+    def relay():
+        try:
+            for chunk in response.iter_content(chunk_size=None):
+                yield chunk
+        except requests.RequestException: # FastAPIの停止・タイムアウト（ブラウザが再接続する）
+            pass
+        finally:
+            response.close()
+
+    return Response(relay(),mimetype='text/event-stream',headers={'Cache-Control':'no-cache','X-Accel-Buffering':'no'})
+
 
 #--- タスク追加 ---
 @app.route("/regist",methods=['GET','POST'])
@@ -126,9 +211,9 @@ def regist():
         # get_db().execute("INSERT INTO tasks (title,content,due_date,completed) values(?,?,?,?)",[title,content,due_date,completed])
         # get_db().commit()
         token = session.get('jwt_token')
-        response = requests.post(
-            f'{FASTAPI_URL}/tasks',
-            headers={'Authorization':f'Bearer {token}'},
+        response = api.post(
+            '/tasks',
+            token,
             # data={'title':title,'content':content,'due_date':due_date,'completed':completed}
             json={
                 'title':title,
@@ -162,9 +247,9 @@ def edit(id):
         # get_db().execute("update tasks set title=?, content=?,due_date=?,completed=? where id=?",[title,content,due_date,completed,id])
         # get_db().commit()
         
-        response = requests.put(
-            f'{FASTAPI_URL}/tasks/{id}',
-            headers={'Authorization':f'Bearer {token}'},
+        response = api.put(
+            f'/tasks/{id}',
+            token,
              json={
                 'title':title,
                 'content':content,
@@ -175,11 +260,7 @@ def edit(id):
         return redirect('/')
     #GETの場合、idを指定してDBから情報を取得し、編集フォームへ表示
     # task =get_db().execute("select id,title,content,due_date,completed from tasks where id=?",(id,)).fetchone()
-    response = requests.get(
-            f'{FASTAPI_URL}/tasks/{id}',
-            headers={'Authorization':f'Bearer {token}'}
-        )
-    task = response.json()
+    task = api.get_json(f'/tasks/{id}',token)
     return render_template("edit.html",task=task)
 
 #--- タスク削除 ---
@@ -195,19 +276,12 @@ def delete(id):
     if request.method=='POST':
         # get_db().execute("delete from tasks where id=?",(id,))
         # get_db().commit()
-        response = requests.delete(
-            f'{FASTAPI_URL}/tasks/{id}',
-            headers={'Authorization':f'Bearer {token}'}
-        )
+        response = api.delete(f'/tasks/{id}',token)
         return redirect('/')
     
     #GETの場合、idを指定してDBから情報を取得し、確認画面表示
     # task =get_db().execute("select id,title,content,due_date,completed from tasks where id=?",(id,)).fetchone()
-    response = requests.get(
-        f'{FASTAPI_URL}/tasks/{id}',
-        headers={'Authorization':f'Bearer {token}'}
-    )
-    task = response.json()
+    task = api.get_json(f'/tasks/{id}',token)
     return render_template("delete.html",task=task)
     
 
@@ -225,15 +299,10 @@ def delete_all():
     task_list=[]
     if request.method=='POST':
         id_list =request.form.getlist('delete_all')#name='delete_allの要素のvalueをリストにして返す
-        if id_list is not None:
+        if id_list:
             token = session.get('jwt_token')
-            for id in id_list:
-                # task_list.append(get_db().execute("select id,title,content,due_date,completed from tasks where id=?",(id,)).fetchone())
-                response = requests.get(
-                    f'{FASTAPI_URL}/tasks/{id}',
-                    headers={'Authorization':f'Bearer {token}'}
-                )
-                task_list.append(response.json())
+            # 選択されたタスクを1回のリクエストでまとめて取得
+            task_list = api.get_json('/tasks/batch',token,params={'ids':id_list})
 
     #GETの場合、task_list=[]の場合のHTMLを表示        
     return render_template("delete_all.html",task_list=task_list)
@@ -243,7 +312,7 @@ def deletes():
     """タスク一括削除処理
 
     - POST: タスク一括削除確認ページのフォームから複数のタスクIDを取得し、
-            ループでそれぞれのタスクを削除。
+            一括削除APIで1回のリクエストでまとめて削除。
             削除完了後はトップページにリダイレクトする。
 
     - GET: URLから直接アクセスの場合は、特に処理せず、トップページにリダイレクトする。
@@ -252,13 +321,12 @@ def deletes():
     if request.method=='POST':
         id_list=request.form.getlist('deletes')
         token = session.get('jwt_token')
-        for id in id_list:
-            # get_db().execute("delete from tasks where id=?",(id,))
-            response = requests.delete(
-                    f'{FASTAPI_URL}/tasks/{id}',
-                    headers={'Authorization':f'Bearer {token}'}
-                )
-        # get_db().commit()
+        if id_list:
+            response = api.post(
+                '/tasks/bulk-delete',
+                token,
+                json={'ids':[int(id) for id in id_list]}
+            )
     
     #GETの場合、TOPページを表示
     return redirect('/')
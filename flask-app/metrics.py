@@ -0,0 +1,126 @@
+"""Flaskアプリの計測（画面ごとのレイテンシ・FastAPI呼び出しの時間）
+
+画面（Flaskのエンドポイント）ごとの処理時間と、api_client からのFastAPI呼び出しの時間を集計し、
+Prometheusのテキスト形式（GET /metrics）と Server-Timing ヘッダーで公開します。
+
+FastAPIのレスポンスの Server-Timing（total）から、FastAPI側の処理時間も記録するため、
+1画面の時間を次のように分けて確認できます。
+
+- api-server: FastAPIでの処理時間
+- network: FastAPI呼び出しのうちFastAPIでの処理以外（通信・接続待ち）の時間
+- frontend: FastAPI呼び出し以外のFlaskでの処理時間（テンプレートの描画など）
+
+集計値はプロセスごとに保持します。
+"""
+
+import re
+import threading
+import time
+from flask import g,has_request_context,request
+
+LATENCY_BUCKETS = (0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5,5.0,10.0)
+
+def _escape(value):
+    return str(value).replace("\\","\\\\").replace("\n","\\n").replace('"','\\"')
+
+class Histogram:
+    """ラベルごとに値の分布を集計するヒストグラム（Prometheusのhistogram型）"""
+
+    def __init__(self,name :str,help :str,labelnames :tuple,buckets :tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self,labels :tuple,value :float):
+        """値を1つ記録"""
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets),0.0,0]
+            for i,bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        """Prometheusのテキスト形式の行のリストを返す"""
+        lines = [f"# HELP {self.name} {self.help}",f"# TYPE {self.name} histogram"]
+        with self._lock:
+            values = sorted((labels,(list(counts),total,count)) for labels,(counts,total,count) in self._values.items())
+        for labels,(counts,total,count) in values:
+            base = ",".join(f'{name}="{_escape(value)}"' for name,value in zip(self.labelnames,labels))
+            for bucket,bucket_count in zip(self.buckets,counts):
+                lines.append(f'{self.name}_bucket{{{base},le="{bucket}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return lines
+
+REQUEST_SECONDS = Histogram("flask_request_duration_seconds","画面の処理時間（秒）",("method","endpoint","status"))
+API_SECONDS = Histogram("flask_api_request_duration_seconds","FastAPI呼び出しの時間（秒、再試行を含む）",("method","path","status"))
+API_SERVER_SECONDS = Histogram("flask_api_server_seconds","FastAPI呼び出しのうちFastAPIでの処理時間（秒、Server-Timingのtotal）",("method","path"))
+HISTOGRAMS = (REQUEST_SECONDS,API_SECONDS,API_SERVER_SECONDS)
+
+_server_total = re.compile(r"(?:^|,)\s*total;dur=([0-9.]+)")
+
+def api_path(path :str):
+    """FastAPIのパスを集計用にまとめる（/tasks/12 → /tasks/{id}、クエリ文字列は除く）"""
+    return re.sub(r"/\d+(?=/|$)","/{id}",path.split("?",1)[0])
+
+def record_api_call(method :str,path :str,status :int,seconds :float,server_timing :str = None):
+    """FastAPI呼び出し1回分を記録
+
+    Args:
+        method: HTTPメソッド
+        path: FastAPIのパス
+        status: ステータスコード（接続エラーの場合は0）
+        seconds: 呼び出しにかかった時間（秒）
+        server_timing: レスポンスの Server-Timing ヘッダー
+    """
+    path = api_path(path)
+    API_SECONDS.observe((method,path,str(status)),seconds)
+    server_seconds = None
+    match = _server_total.search(server_timing or "")
+    if match:
+        server_seconds = float(match.group(1)) / 1000
+        API_SERVER_SECONDS.observe((method,path),server_seconds)
+    if has_request_context():
+        stats = g.setdefault("api_stats",{"calls":0,"seconds":0.0,"server_seconds":0.0})
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["server_seconds"] += server_seconds or 0.0
+
+def init_app(app):
+    """Flaskアプリに計測処理と GET /metrics を登録"""
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def add_server_timing(response):
+        start = g.get("request_start")
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        REQUEST_SECONDS.observe((request.method,request.endpoint or "unmatched",str(response.status_code)),total)
+        stats = g.get("api_stats",{"calls":0,"seconds":0.0,"server_seconds":0.0})
+        network = max(stats["seconds"] - stats["server_seconds"],0.0)
+        response.headers["Server-Timing"] = ", ".join([
+            f'api;dur={stats["seconds"] * 1000:.2f};desc="{stats["calls"]} calls"',
+            f'api-server;dur={stats["server_seconds"] * 1000:.2f}',
+            f"network;dur={network * 1000:.2f}",
+            f'frontend;dur={(total - stats["seconds"]) * 1000:.2f}',
+            f"total;dur={total * 1000:.2f}",
+        ])
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        """画面・FastAPI呼び出しの集計値をPrometheusのテキスト形式で返す"""
+        body = "\n".join(line for histogram in HISTOGRAMS for line in histogram.render()) + "\n"
+        return body,200,{"Content-Type":"text/plain; version=0.0.4; charset=utf-8"}